@@ -0,0 +1,90 @@
+""" Add the foreign key and lookup indexes
+
+Revision ID: 5f3c1a9e2b7d
+Revises:
+Create Date: 2026-10-19 09:12:44.318512
+"""
+from typing import Any, Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5f3c1a9e2b7d"
+down_revision: str | Sequence[str] | None = None
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# name, table, columns and dialect options of the indexes
+INDEXES: list[tuple[str, str, list[Any], dict[str, Any]]] = [
+    ("ix_wis_sme_module_id", "wis_sme", ["module_id"], {}),
+    ("ix_wis_startups_module_id", "wis_startups", ["module_id"], {}),
+    (
+        "ix_wis_current_situation_module_id",
+        "wis_current_situation",
+        ["module_id"],
+        {},
+    ),
+    (
+        "ix_wis_current_strategy_module_id",
+        "wis_current_strategy",
+        ["module_id"],
+        {},
+    ),
+    (
+        "ix_wis_current_strategy_value_strategy_id",
+        "wis_current_strategy_value",
+        ["strategy_id"],
+        {},
+    ),
+    ("ix_wis_module_user_id", "wis_module", ["user_id"], {}),
+    (
+        "ix_wis_password_history_user_id",
+        "wis_password_history",
+        ["user_id", "created_on"],
+        {},
+    ),
+    ("ix_wis_permission_user_id", "wis_permission", ["user_id"], {}),
+    ("ix_wis_permission_group_id", "wis_permission", ["group_id"], {}),
+    ("ix_wis_user_group_group_id", "wis_user_group", ["group_id"], {}),
+    ("ix_wis_user_email", "wis_user", ["email"], {}),
+    ("ix_wis_user_email_lower", "wis_user", [sa.text("lower(email)")], {}),
+    ("ix_wis_user_email_token", "wis_user", ["email_token"], {}),
+    (
+        "ix_wis_user_active_notifications",
+        "wis_user",
+        ["notifications", "id"],
+        {
+            "postgresql_where": sa.text("deleted IS false"),
+            "sqlite_where": sa.text("deleted IS 0"),
+        },
+    ),
+]
+
+
+def upgrade() -> None:
+    concurrently = op.get_context().dialect.name == "postgresql"
+    # CREATE INDEX CONCURRENTLY does not lock the writes, but cannot run in
+    # a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=concurrently,
+                **options,
+            )
+
+
+def downgrade() -> None:
+    concurrently = op.get_context().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=concurrently,
+            )
@@ -0,0 +1,82 @@
+""" Make the user names and emails unique regardless of the case
+
+Revision ID: a81d4c7e90f2
+Revises: 5f3c1a9e2b7d
+Create Date: 2026-10-19 14:03:27.551904
+"""
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a81d4c7e90f2"
+down_revision: str | Sequence[str] | None = "5f3c1a9e2b7d"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+KEYS = {"name": "uq_wis_user_name_lower", "email": "uq_wis_user_email_lower"}
+
+
+def _check_duplicates() -> None:
+    """
+    Fails on the users sharing a name or an email that only differs by the
+    case, which must be renamed first.
+    """
+    connection = op.get_bind()
+    for column in KEYS:
+        duplicates = connection.execute(
+            sa.text(
+                f"SELECT lower({column}) FROM wis_user"
+                f" WHERE {column} IS NOT NULL"
+                f" GROUP BY lower({column}) HAVING count(*) > 1"
+            )
+        ).scalars()
+        values = sorted(duplicates)
+        if values:
+            raise ValueError(
+                f"Users share the {column} {', '.join(values[:10])}"
+                + (f" and {len(values) - 10} more" if len(values) > 10 else "")
+            )
+
+
+def upgrade() -> None:
+    concurrently = op.get_context().dialect.name == "postgresql"
+    if not op.get_context().as_sql:
+        _check_duplicates()
+    with op.get_context().autocommit_block():
+        for column, name in KEYS.items():
+            op.create_index(
+                name,
+                "wis_user",
+                [sa.text(f"lower({column})")],
+                unique=True,
+                if_not_exists=True,
+                postgresql_concurrently=concurrently,
+            )
+        # replaced by the unique index
+        op.drop_index(
+            "ix_wis_user_email_lower",
+            table_name="wis_user",
+            if_exists=True,
+            postgresql_concurrently=concurrently,
+        )
+
+
+def downgrade() -> None:
+    concurrently = op.get_context().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_wis_user_email_lower",
+            "wis_user",
+            [sa.text("lower(email)")],
+            if_not_exists=True,
+            postgresql_concurrently=concurrently,
+        )
+        for column, name in KEYS.items():
+            op.drop_index(
+                name,
+                table_name="wis_user",
+                if_exists=True,
+                postgresql_concurrently=concurrently,
+            )
@@ -0,0 +1,45 @@
+""" Add the outbox of the emails
+
+Revision ID: b3d5e9a07c12
+Revises: a81d4c7e90f2
+Create Date: 2026-10-19 16:21:53.704118
+"""
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b3d5e9a07c12"
+down_revision: str | Sequence[str] | None = "a81d4c7e90f2"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "wis_email_outbox",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("recipient", sa.String(256), nullable=False),
+        sa.Column("subject", sa.String(998), nullable=False),
+        sa.Column("body", sa.Text, nullable=False),
+        sa.Column("status", sa.String(16), nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime, nullable=False),
+        sa.Column("last_error", sa.Text),
+        sa.Column("created_on", sa.DateTime, nullable=False),
+        sa.Column("sent_on", sa.DateTime),
+    )
+    # the table is new, no need to build the index concurrently
+    op.create_index(
+        "ix_wis_email_outbox_status_next",
+        "wis_email_outbox",
+        ["status", "next_attempt_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_wis_email_outbox_status_next", table_name="wis_email_outbox"
+    )
+    op.drop_table("wis_email_outbox")
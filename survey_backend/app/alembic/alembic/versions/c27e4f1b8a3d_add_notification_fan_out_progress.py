@@ -0,0 +1,43 @@
+""" Track the progress of the notification fan-outs
+
+Revision ID: c27e4f1b8a3d
+Revises: e6a1f03d9b54
+Create Date: 2026-10-19 17:42:08.310295
+"""
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c27e4f1b8a3d"
+down_revision: str | Sequence[str] | None = "e6a1f03d9b54"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # the existing notifications were fanned out in their request
+    with op.batch_alter_table("wis_notification") as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "status",
+                sa.String(16),
+                nullable=False,
+                server_default="done",
+            )
+        )
+        batch_op.add_column(
+            sa.Column(
+                "last_user_id", sa.Integer, nullable=False, server_default="0"
+            )
+        )
+    with op.batch_alter_table("wis_notification") as batch_op:
+        batch_op.alter_column("status", server_default=None)
+        batch_op.alter_column("last_user_id", server_default=None)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("wis_notification") as batch_op:
+        batch_op.drop_column("last_user_id")
+        batch_op.drop_column("status")
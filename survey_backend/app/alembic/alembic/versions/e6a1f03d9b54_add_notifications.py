@@ -0,0 +1,52 @@
+""" Add the notifications and link the outbox emails to them
+
+Revision ID: e6a1f03d9b54
+Revises: b3d5e9a07c12
+Create Date: 2026-10-19 17:05:31.927460
+"""
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e6a1f03d9b54"
+down_revision: str | Sequence[str] | None = "b3d5e9a07c12"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "wis_notification",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("subject", sa.String(998), nullable=False),
+        sa.Column("body", sa.Text, nullable=False),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("wis_user.id")),
+        sa.Column("recipients", sa.Integer, nullable=False),
+        sa.Column("created_on", sa.DateTime, nullable=False),
+    )
+    # SQLite rebuilds the table to add the foreign key
+    with op.batch_alter_table("wis_email_outbox") as batch_op:
+        batch_op.add_column(sa.Column("notification_id", sa.Integer))
+        batch_op.create_foreign_key(
+            "fk_wis_email_outbox_notification_id",
+            "wis_notification",
+            ["notification_id"],
+            ["id"],
+        )
+    op.create_index(
+        "ix_wis_email_outbox_notification",
+        "wis_email_outbox",
+        ["notification_id", "status"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_wis_email_outbox_notification", table_name="wis_email_outbox"
+    )
+    # its foreign key goes with it, SQLite rebuilds the table
+    with op.batch_alter_table("wis_email_outbox") as batch_op:
+        batch_op.drop_column("notification_id")
+    op.drop_table("wis_notification")
@@ -0,0 +1,30 @@
+""" Add the version of the question catalog
+
+Revision ID: f8c2a6d41e97
+Revises: c27e4f1b8a3d
+Create Date: 2026-10-19 18:36:12.482071
+"""
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f8c2a6d41e97"
+down_revision: str | Sequence[str] | None = "c27e4f1b8a3d"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # the workers build the first snapshot of the catalog without a row
+    op.create_table(
+        "wis_catalog_version",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("version", sa.Integer, nullable=False),
+        sa.Column("updated_on", sa.DateTime, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("wis_catalog_version")
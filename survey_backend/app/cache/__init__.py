@@ -0,0 +1,60 @@
+""" Cache package """
+
+from .bus import (
+    InMemoryBroker,
+    InvalidationBus,
+    InvalidationEvent,
+    LocalBus,
+    PostgresBus,
+    RedisBus,
+)
+from .backends import InMemoryRedis, LocalLRU, RedisBackend, RemoteBackend
+from .codecs import Codec, OrmCodec, PickleCodec
+from .core import (
+    MISSING,
+    Cache,
+    CacheStats,
+    SingleFlight,
+    attach_remote_tier,
+    cached,
+    caches,
+    clear_caches,
+)
+from .invalidation import (
+    ALL_KEYS,
+    mark_changed,
+    mark_invalidated,
+    start_invalidation_bus,
+    stop_invalidation_bus,
+    track_invalidations,
+)
+
+__all__ = [
+    "ALL_KEYS",
+    "MISSING",
+    "Cache",
+    "CacheStats",
+    "Codec",
+    "InMemoryBroker",
+    "InMemoryRedis",
+    "InvalidationBus",
+    "InvalidationEvent",
+    "LocalBus",
+    "LocalLRU",
+    "OrmCodec",
+    "PickleCodec",
+    "PostgresBus",
+    "RedisBackend",
+    "RedisBus",
+    "RemoteBackend",
+    "SingleFlight",
+    "attach_remote_tier",
+    "cached",
+    "caches",
+    "clear_caches",
+    "mark_changed",
+    "mark_invalidated",
+    "start_invalidation_bus",
+    "stop_invalidation_bus",
+    "track_invalidations",
+]
@@ -0,0 +1,201 @@
+""" Cache storage tiers """
+
+import logging
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Awaitable, Callable, Protocol
+
+from redis.exceptions import RedisError
+
+logger = logging.getLogger("auth_logger")
+
+
+class LocalLRU:
+    """
+    In-process LRU storage with per-entry TTL, bounded by number of entries
+    and total size of the stored payloads.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int | None = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        # key -> (expires_at, payload)
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at <= monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def set(self, key: str, payload: bytes, ttl: float) -> None:
+        if key in self._entries:
+            self._pop(key)
+        if self.max_bytes is not None and len(payload) > self.max_bytes:
+            return
+        self._entries[key] = (monotonic() + ttl, payload)
+        self.size += len(payload)
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self.size > self.max_bytes
+        ):
+            self._pop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            if key in self._entries:
+                self._pop(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def _pop(self, key: str) -> None:
+        _, payload = self._entries.pop(key)
+        self.size -= len(payload)
+
+
+class RemoteBackend(Protocol):
+    """
+    Interface of a shared cache tier.
+    """
+
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    async def set(self, key: str, payload: bytes, ttl: float) -> None:
+        ...
+
+    async def delete(self, *keys: str) -> None:
+        ...
+
+    async def counter(self, key: str) -> int | None:
+        """
+        Returns the value of a counter, 0 if unset and None on failure.
+        """
+
+    async def incr(self, key: str) -> int | None:
+        """
+        Increments a counter, returning its new value or None on failure.
+        """
+
+
+class RedisBackend:
+    """
+    Shared cache tier stored in Redis.
+
+    Redis failures are logged and handled as cache misses, so an unavailable
+    Redis only costs the DB round trip.
+    """
+
+    def __init__(self, client, prefix: str = "wis:cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        try:
+            return await self.client.get(self.prefix + key)
+        except RedisError as err:
+            logger.warning(f"Redis cache get failed: {err}")
+            return None
+
+    async def set(self, key: str, payload: bytes, ttl: float) -> None:
+        try:
+            await self.client.set(
+                self.prefix + key, payload, px=max(int(ttl * 1000), 1)
+            )
+        except RedisError as err:
+            logger.warning(f"Redis cache set failed: {err}")
+
+    async def delete(self, *keys: str) -> None:
+        if not keys:
+            return
+        try:
+            await self.client.delete(*[self.prefix + key for key in keys])
+        except RedisError as err:
+            logger.warning(f"Redis cache delete failed: {err}")
+
+    async def counter(self, key: str) -> int | None:
+        try:
+            return int(await self.client.get(self.prefix + key) or 0)
+        except RedisError as err:
+            logger.warning(f"Redis cache counter get failed: {err}")
+            return None
+
+    async def incr(self, key: str) -> int | None:
+        try:
+            return await self.client.incr(self.prefix + key)
+        except RedisError as err:
+            logger.warning(f"Redis cache counter increment failed: {err}")
+            return None
+
+
+class InMemoryRedis:
+    """
+    Minimal in-memory stand-in for the asyncio Redis client, for tests and
+    local runs without a Redis server.
+    """
+
+    # Python stand-ins of the Lua scripts registered by the app, by source
+    scripts: dict[str, Callable[..., Awaitable[Any]]] = {}
+
+    def __init__(self):
+        # key -> (expires_at | None, value)
+        self._data: dict[str, tuple[float | None, Any]] = {}
+
+    def _get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Any:
+        return self._get(key)
+
+    async def set(self, key: str, value: Any, px: int | None = None) -> bool:
+        expires_at = monotonic() + px / 1000 if px is not None else None
+        self._data[key] = (expires_at, value)
+        return True
+
+    async def incr(self, key: str) -> int:
+        expires_at, value = self._data.get(key, (None, 0))
+        value = int(value) + 1
+        self._data[key] = (expires_at, str(value).encode())
+        return value
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                deleted += 1
+        return deleted
+
+    def register_script(self, script: str) -> Callable[..., Awaitable[Any]]:
+        emulation = self.scripts[script]
+
+        async def run(keys=(), args=(), client=None) -> Any:
+            # pylint: disable = unused-argument
+            return await emulation(self, list(keys), list(args))
+
+        return run
+
+    async def flushdb(self) -> bool:
+        self._data.clear()
+        return True
+
+    async def close(self) -> None:
+        self._data.clear()
@@ -0,0 +1,226 @@
+""" Cross-worker cache invalidation bus """
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from time import time
+from typing import Callable
+from uuid import uuid4
+
+import asyncpg
+import orjson
+from redis.exceptions import RedisError
+
+logger = logging.getLogger("auth_logger")
+
+# Postgres rejects NOTIFY payloads larger than 8000 bytes
+_PG_MAX_EVENTS_PER_NOTIFY = 50
+
+
+@dataclass(frozen=True)
+class InvalidationEvent:
+    """
+    Tells subscribers to drop `key` from the cache named `cache`.
+    """
+
+    cache: str
+    key: str
+    origin: str
+    published_at: float
+
+
+def _encode(events: list[InvalidationEvent]) -> bytes:
+    return orjson.dumps(
+        [[e.cache, e.key, e.origin, e.published_at] for e in events]
+    )
+
+
+def _decode(payload: bytes | str) -> list[InvalidationEvent]:
+    return [InvalidationEvent(*item) for item in orjson.loads(payload)]
+
+
+class InvalidationBus:
+    """
+    Base bus: delivers published events to the subscribers of this process.
+    """
+
+    def __init__(self):
+        # identifies this worker on the bus
+        self.worker_id = uuid4().hex
+        self.published = 0
+        self.received = 0
+        self.max_lag_ms = 0.0
+        self._subscribers: list[Callable[[InvalidationEvent], None]] = []
+
+    def subscribe(self, handler: Callable[[InvalidationEvent], None]) -> None:
+        self._subscribers.append(handler)
+
+    def _dispatch(self, events: list[InvalidationEvent]) -> None:
+        now = time()
+        for event in events:
+            # events of this worker have already been applied locally
+            if event.origin == self.worker_id:
+                continue
+            self.received += 1
+            self.max_lag_ms = max(
+                self.max_lag_ms, (now - event.published_at) * 1000
+            )
+            for handler in self._subscribers:
+                handler(event)
+
+    def events(self, keys: list[tuple[str, str]]) -> list[InvalidationEvent]:
+        """
+        Builds the events for a list of (cache name, key) pairs.
+        """
+        now = time()
+        return [
+            InvalidationEvent(cache, key, self.worker_id, now)
+            for cache, key in keys
+        ]
+
+    async def publish(self, events: list[InvalidationEvent]) -> None:
+        self.published += len(events)
+        self._dispatch(events)
+
+    async def start(self) -> None:
+        """
+        Starts receiving events from the other workers.
+        """
+
+    async def stop(self) -> None:
+        """
+        Stops receiving events.
+        """
+
+    def metrics(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "published": self.published,
+            "received": self.received,
+            "max_lag_ms": round(self.max_lag_ms, 3),
+        }
+
+
+class InMemoryBroker:
+    """
+    In-process stand-in for a pub/sub server, connecting LocalBus instances.
+    """
+
+    def __init__(self):
+        self.buses: list["LocalBus"] = []
+
+    def publish(self, payload: bytes) -> None:
+        for bus in self.buses:
+            # decode per bus, like a real broker delivering a copy
+            # pylint: disable-next = protected-access
+            bus._dispatch(_decode(payload))
+
+
+class LocalBus(InvalidationBus):
+    """
+    Bus exchanging events through an in-memory broker, for single-process
+    deployments and tests.
+    """
+
+    def __init__(self, broker: InMemoryBroker | None = None):
+        super().__init__()
+        self.broker = broker or InMemoryBroker()
+
+    async def start(self) -> None:
+        if self not in self.broker.buses:
+            self.broker.buses.append(self)
+
+    async def stop(self) -> None:
+        if self in self.broker.buses:
+            self.broker.buses.remove(self)
+
+    async def publish(self, events: list[InvalidationEvent]) -> None:
+        self.published += len(events)
+        self.broker.publish(_encode(events))
+
+
+class RedisBus(InvalidationBus):
+    """
+    Bus on Redis pub/sub.
+    """
+
+    def __init__(self, client, channel: str = "wis:cache:invalidate"):
+        super().__init__()
+        self.client = client
+        self.channel = channel
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub) -> None:
+        try:
+            while True:
+                try:
+                    message = await pubsub.get_message(timeout=1.0)
+                except RedisError as err:
+                    logger.warning(f"Invalidation bus receive failed: {err}")
+                    await asyncio.sleep(1)
+                    continue
+                if message and message["type"] == "message":
+                    self._dispatch(_decode(message["data"]))
+        finally:
+            await pubsub.unsubscribe(self.channel)
+            await pubsub.close()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, events: list[InvalidationEvent]) -> None:
+        self.published += len(events)
+        try:
+            await self.client.publish(self.channel, _encode(events))
+        except RedisError as err:
+            logger.warning(f"Invalidation bus publish failed: {err}")
+
+
+class PostgresBus(InvalidationBus):
+    """
+    Bus on Postgres LISTEN/NOTIFY, over a dedicated asyncpg connection.
+    """
+
+    def __init__(self, dsn: str, channel: str = "wis_cache_invalidate"):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._conn: asyncpg.Connection | None = None
+        # an asyncpg connection runs one statement at a time
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        self._conn = await asyncpg.connect(self.dsn)
+        await self._conn.add_listener(self.channel, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._dispatch(_decode(payload))
+
+    async def stop(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def publish(self, events: list[InvalidationEvent]) -> None:
+        self.published += len(events)
+        if self._conn is None:
+            return
+        async with self._lock:
+            for i in range(0, len(events), _PG_MAX_EVENTS_PER_NOTIFY):
+                chunk = events[i : i + _PG_MAX_EVENTS_PER_NOTIFY]
+                await self._conn.execute(
+                    "SELECT pg_notify($1, $2)",
+                    self.channel,
+                    _encode(chunk).decode(),
+                )
@@ -0,0 +1,96 @@
+""" Cache value codecs """
+
+import pickle
+from typing import Any, Generic, Protocol, TypeVar
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+T = TypeVar("T")
+
+
+class Codec(Protocol[T]):
+    """
+    Converts cached values to and from bytes.
+    """
+
+    def encode(self, value: T) -> bytes:
+        ...
+
+    def decode(self, payload: bytes) -> T:
+        ...
+
+
+class PickleCodec(Generic[T]):
+    """
+    Codec for plain Python values.
+    """
+
+    def encode(self, value: T) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, payload: bytes) -> T:
+        return pickle.loads(payload)
+
+
+class OrmCodec(Generic[T]):
+    """
+    Codec for ORM instances.
+
+    Only column attributes and the listed relationships are stored, so a
+    cached row never drags along whatever the eager loaders attached to it.
+    Decoded instances are detached, ready to be merged into a session with
+    `load=False`.
+    """
+
+    def __init__(self, model: type[T], relationships: tuple[str, ...] = ()):
+        self.model = model
+        self.relationships = relationships
+
+    @staticmethod
+    def _columns(obj: Any) -> dict[str, Any]:
+        state = inspect(obj)
+        return {
+            attr.key: state.dict[attr.key]
+            for attr in state.mapper.column_attrs
+            if attr.key in state.dict
+        }
+
+    @staticmethod
+    def _detached(model: type, columns: dict[str, Any]) -> Any:
+        obj = model(**columns)
+        make_transient_to_detached(obj)
+        return obj
+
+    def encode(self, value: T) -> bytes:
+        data = {"columns": self._columns(value), "relationships": {}}
+        for name in self.relationships:
+            related = getattr(value, name)
+            if isinstance(related, list):
+                data["relationships"][name] = [
+                    self._columns(item) for item in related
+                ]
+            else:
+                data["relationships"][name] = (
+                    self._columns(related) if related is not None else None
+                )
+        return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, payload: bytes) -> T:
+        data = pickle.loads(payload)
+        mapper = inspect(self.model)
+        obj = self._detached(self.model, data["columns"])
+        for name, related in data["relationships"].items():
+            target = mapper.relationships[name].mapper.class_
+            if isinstance(related, list):
+                value = [self._detached(target, item) for item in related]
+            else:
+                value = (
+                    self._detached(target, related)
+                    if related is not None
+                    else None
+                )
+            # bypass attribute events so that backrefs are left unloaded
+            set_committed_value(obj, name, value)
+        return obj
@@ -0,0 +1,372 @@
+""" Tiered cache with single-flight loading """
+
+import asyncio
+import functools
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import NoInspectionAvailable
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import settings
+from app.metrics import register_metrics_source
+
+from .backends import LocalLRU, RemoteBackend
+from .codecs import Codec, PickleCodec
+
+T = TypeVar("T")
+
+# payload marking a cached "not found" result
+NEGATIVE = b""
+
+
+class _Missing:
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+# returned by Cache.get when the key is not cached at all
+MISSING: Any = _Missing()
+
+# result of a flight whose caller was cancelled, its followers retry
+_RETRY: Any = _Missing()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into a single execution.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights: dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Detaches the running call with `key`, if any: the callers already
+        waiting for it still get its result, later callers run `fn` again.
+        """
+        self._flights.pop(key, None)
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[T]]
+    ) -> tuple[T, bool]:
+        """
+        Runs `fn` unless a call with the same key is already running, in
+        which case its result is awaited instead.
+
+        The cancellation of the caller running `fn` is not passed on: its
+        followers retry, one of them running `fn` in turn.
+
+        Returns the result and True if this caller ran `fn`.
+        """
+        self.calls += 1
+        flight = self._flights.get(key)
+        while flight is not None:
+            self.coalesced += 1
+            # shield the flight from the cancellation of a follower
+            result = await asyncio.shield(flight)
+            if result is not _RETRY:
+                return result, False
+            flight = self._flights.get(key)
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            flight.set_result(_RETRY)
+            raise
+        except BaseException as exc:
+            flight.set_exception(exc)
+            # the exception is re-raised here, mark it as retrieved
+            flight.exception()
+            raise
+        else:
+            flight.set_result(result)
+            return result, True
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+
+@dataclass
+class CacheStats:
+    """
+    Counters of a cache.
+    """
+
+    hits: int = 0
+    remote_hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    loads: int = 0
+    coalesced: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class Cache(Generic[T]):
+    """
+    Two-tier cache: a local LRU in front of an optional shared tier.
+
+    Values are stored encoded, so every reader gets its own copy. A `None`
+    value is cached as a negative entry with its own (shorter) TTL.
+
+    The shared keys carry the generation of the cache, which `flush` bumps
+    to drop all of its shared entries at once.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        codec: Codec[T] | None = None,
+        ttl: float = settings.CACHE_TTL,
+        negative_ttl: float = settings.CACHE_NEGATIVE_TTL,
+        max_entries: int = settings.CACHE_MAX_ENTRIES,
+        max_bytes: int | None = settings.CACHE_MAX_BYTES,
+        remote: RemoteBackend | None = None,
+        remote_ttl: float | None = None,
+    ):
+        self.name = name
+        self.codec: Codec[T] = codec or PickleCodec()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local = LocalLRU(max_entries=max_entries, max_bytes=max_bytes)
+        self.remote = remote
+        self.remote_ttl = remote_ttl or ttl
+        self.stats = CacheStats()
+        self._flight = SingleFlight()
+        # generation of the shared keys, None until read from the tier
+        self._generation: int | None = None
+        caches[name] = self
+
+    def _decode(self, payload: bytes) -> T | None:
+        if payload == NEGATIVE:
+            self.stats.negative_hits += 1
+            return None
+        return self.codec.decode(payload)
+
+    async def _remote_key(self, key: str) -> str | None:
+        """
+        Returns the shared key of `key`, None if its generation is unknown.
+        """
+        if self.remote is None:
+            return None
+        if self._generation is None:
+            self._generation = await self.remote.counter(
+                f"{self.name}:generation"
+            )
+            if self._generation is None:
+                return None
+        return f"{self.name}:{self._generation}:{key}"
+
+    async def get(self, key: str) -> T | None:
+        """
+        Returns the cached value, None for a negative entry and MISSING if
+        the key is not cached.
+        """
+        payload = self.local.get(key)
+        if (
+            payload is None
+            and (remote_key := await self._remote_key(key)) is not None
+        ):
+            payload = await self.remote.get(remote_key)  # type: ignore
+            if payload is not None:
+                self.stats.remote_hits += 1
+                self.local.set(
+                    key,
+                    payload,
+                    self.negative_ttl if payload == NEGATIVE else self.ttl,
+                )
+        if payload is None:
+            self.stats.misses += 1
+            return MISSING
+        self.stats.hits += 1
+        return self._decode(payload)
+
+    async def _store(self, key: str, payload: bytes) -> None:
+        negative = payload == NEGATIVE
+        self.local.set(
+            key, payload, self.negative_ttl if negative else self.ttl
+        )
+        if (remote_key := await self._remote_key(key)) is not None:
+            await self.remote.set(  # type: ignore
+                remote_key,
+                payload,
+                self.negative_ttl if negative else self.remote_ttl,
+            )
+
+    async def set(self, key: str, value: T | None) -> None:
+        """
+        Stores a value, or a negative entry if value is None.
+        """
+        await self._store(
+            key, NEGATIVE if value is None else self.codec.encode(value)
+        )
+
+    async def delete(self, *keys: str) -> None:
+        """
+        Removes keys from both tiers.
+        """
+        self.local.delete(*keys)
+        remote_keys = [await self._remote_key(key) for key in keys]
+        if self.remote is not None and None not in remote_keys:
+            await self.remote.delete(*remote_keys)
+
+    async def flush(self) -> None:
+        """
+        Empties both tiers, the entries of the shared one left to expire
+        under their old generation.
+        """
+        if self.remote is not None:
+            self._generation = await self.remote.incr(
+                f"{self.name}:generation"
+            )
+        self.local.clear()
+
+    def forget_generation(self) -> None:
+        """
+        Reads the generation of the shared keys again on their next use,
+        after another worker flushed the cache.
+        """
+        self._generation = None
+
+    def evict_local(self, *keys: str) -> None:
+        """
+        Removes keys from the local tier only.
+        """
+        self.local.delete(*keys)
+
+    def clear(self) -> None:
+        """
+        Empties the local tier.
+        """
+        self.local.clear()
+
+    async def get_or_load(
+        self, key: str, loader: Callable[[], Awaitable[T | None]]
+    ) -> T | None:
+        """
+        Returns the cached value or loads it with `loader`.
+
+        Concurrent misses on the same key share one call to `loader`. The
+        caller which ran the loader gets its result as is, the others get a
+        decoded copy.
+        """
+        value = await self.get(key)
+        if value is not MISSING:
+            return value
+
+        async def load() -> tuple[T | None, bytes]:
+            self.stats.loads += 1
+            loaded = await loader()
+            payload = NEGATIVE if loaded is None else self.codec.encode(loaded)
+            await self._store(key, payload)
+            return loaded, payload
+
+        (loaded, payload), leader = await self._flight.do(key, load)
+        if leader:
+            return loaded
+        self.stats.coalesced += 1
+        return None if payload == NEGATIVE else self.codec.decode(payload)
+
+    def metrics(self) -> dict[str, Any]:
+        return asdict(self.stats) | {
+            "hit_rate": round(self.stats.hit_rate, 4),
+            "entries": len(self.local),
+            "bytes": self.local.size,
+            "evictions": self.local.evictions,
+        }
+
+
+# registry of the caches defined by the app
+caches: dict[str, Cache] = {}
+
+
+def attach_remote_tier(
+    remote: RemoteBackend | None, ttl: float | None = None
+) -> None:
+    """
+    Sets (or removes) the shared tier of all registered caches.
+    """
+    for cache in caches.values():
+        cache.remote = remote
+        cache.remote_ttl = ttl or cache.ttl
+        cache.forget_generation()
+
+
+def clear_caches() -> None:
+    """
+    Empties the local tier of all registered caches.
+    """
+    for cache in caches.values():
+        cache.clear()
+
+
+def _find_session(args: tuple, kwargs: dict) -> AsyncSession | None:
+    for arg in (*args, *kwargs.values()):
+        if isinstance(arg, AsyncSession):
+            return arg
+    return None
+
+
+async def _attach(value: Any, session: AsyncSession | None) -> Any:
+    """
+    Returns the instance of `value` bound to `session` if value is a
+    detached ORM instance, the value itself otherwise.
+    """
+    if value is None or session is None:
+        return value
+    try:
+        state = inspect(value)
+    except NoInspectionAvailable:
+        return value
+    if state.session is not None or state.key is None:
+        return value
+    # prefer the instance already loaded in the session, if any
+    existing = session.identity_map.get(state.key)
+    if existing is not None:
+        return existing
+    return await session.merge(value, load=False)
+
+
+def cached(cache: Cache[T], key: Callable[..., str]):
+    """
+    Decorator caching the result of an async loader.
+
+    `key` receives the loader arguments and returns the cache key. When the
+    loader receives an AsyncSession, cached ORM instances are merged into
+    it without a DB round trip.
+    """
+
+    def decorator(fn: Callable[..., Awaitable[T | None]]):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs) -> T | None:
+            if not settings.CACHE_ENABLED:
+                return await fn(*args, **kwargs)
+
+            value = await cache.get_or_load(
+                key(*args, **kwargs), lambda: fn(*args, **kwargs)
+            )
+            return await _attach(value, _find_session(args, kwargs))
+
+        wrapper.cache = cache  # type: ignore
+        return wrapper
+
+    return decorator
+
+
+register_metrics_source(
+    "caches", lambda: {name: cache.metrics() for name, cache in caches.items()}
+)
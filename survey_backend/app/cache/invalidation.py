@@ -0,0 +1,185 @@
+""" Invalidation of cached ORM rows after commit """
+
+import asyncio
+import logging
+from typing import Any, Callable
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import settings
+from app.metrics import register_metrics_source
+
+from .bus import (
+    InvalidationBus,
+    InvalidationEvent,
+    LocalBus,
+    PostgresBus,
+    RedisBus,
+)
+from .core import Cache, caches
+
+logger = logging.getLogger("auth_logger")
+
+# key invalidating a whole cache
+ALL_KEYS = "*"
+
+# session.info entry collecting the (cache name, key) pairs to invalidate
+_INFO_KEY = "cache_invalidations"
+
+# model -> caches holding its rows, with the function computing the key
+_tracked: dict[type, list[tuple[Cache, Callable[[Any], str]]]] = {}
+
+# keep a reference to the propagation tasks until they are done
+_background: set[asyncio.Task] = set()
+
+invalidation_bus: InvalidationBus = LocalBus()
+
+
+def track_invalidations(
+    model: type,
+    cache: Cache,
+    key: Callable[[Any], str] = lambda obj: str(obj.id),
+) -> None:
+    """
+    Invalidates the `cache` entry of every `model` instance inserted, updated
+    or deleted by a committed session.
+    """
+    _tracked.setdefault(model, []).append((cache, key))
+
+
+def mark_invalidated(
+    session: Session | AsyncSession, cache: Cache, key: str
+) -> None:
+    """
+    Invalidates a cache entry when `session` commits, for changes made with
+    bulk statements which bypass the unit of work.
+    """
+    sync_session = getattr(session, "sync_session", session)
+    sync_session.info.setdefault(_INFO_KEY, set()).add((cache.name, key))
+
+
+def mark_changed(session: Session | AsyncSession, obj: Any) -> None:
+    """
+    Invalidates the entries of every cache tracking `obj` when `session`
+    commits, for an instance changed with a bulk statement.
+    """
+    for cache, key in _tracked.get(type(obj), ()):
+        mark_invalidated(session, cache, key(obj))
+
+
+def _evict_local(cache_name: str, key: str) -> None:
+    cache = caches.get(cache_name)
+    if cache is None:
+        return
+    if key == ALL_KEYS:
+        cache.clear()
+        # the worker which flushed the cache bumped its generation
+        cache.forget_generation()
+    else:
+        cache.evict_local(key)
+
+
+def _on_event(inv_event: InvalidationEvent) -> None:
+    _evict_local(inv_event.cache, inv_event.key)
+
+
+async def _propagate(keys: list[tuple[str, str]]) -> None:
+    try:
+        for cache_name, key in keys:
+            cache = caches.get(cache_name)
+            if cache is None:
+                continue
+            if key == ALL_KEYS:
+                await cache.flush()
+            else:
+                await cache.delete(key)
+        await invalidation_bus.publish(invalidation_bus.events(keys))
+    except Exception:  # pylint: disable = broad-exception-caught
+        logger.exception("Cache invalidation failed")
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_invalidations(session: Session, flush_context) -> None:
+    if not _tracked:
+        return
+    pending = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        for cache, key in _tracked.get(type(obj), ()):
+            if pending is None:
+                pending = session.info.setdefault(_INFO_KEY, set())
+            pending.add((cache.name, key(obj)))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session: Session) -> None:
+    pending = session.info.pop(_INFO_KEY, None)
+    if not pending:
+        return
+    keys = sorted(pending)
+    # this worker stops serving the entries right away
+    for cache_name, key in keys:
+        _evict_local(cache_name, key)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # sync session outside of the event loop, e.g. in a CLI script
+        return
+    task = loop.create_task(_propagate(keys))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session) -> None:
+    session.info.pop(_INFO_KEY, None)
+
+
+async def start_invalidation_bus(
+    backend: str,
+    *,
+    redis_client=None,
+    database_uri=None,
+    workers: int = settings.WEB_CONCURRENCY,
+) -> InvalidationBus:
+    """
+    Replaces the invalidation bus with one of the given backend (`local`,
+    `redis` or `postgres`) and starts it.
+
+    The local bus only reaches its own process: it is refused for several
+    `workers` with the cache enabled, which would serve stale rows.
+    """
+    global invalidation_bus  # pylint: disable = global-statement
+
+    if backend == "local" and workers > 1 and settings.CACHE_ENABLED:
+        raise ValueError(
+            f"The local cache invalidation bus cannot reach {workers}"
+            " workers, set CACHE_INVALIDATION_BACKEND to redis or postgres,"
+            " or CACHE_ENABLED to false."
+        )
+
+    match backend:
+        case "redis":
+            bus: InvalidationBus = RedisBus(redis_client)
+        case "postgres":
+            dsn = make_url(database_uri).set(drivername="postgresql")
+            bus = PostgresBus(dsn.render_as_string(hide_password=False))
+        case _:
+            bus = LocalBus()
+
+    bus.subscribe(_on_event)
+    await bus.start()
+    invalidation_bus = bus
+    return bus
+
+
+async def stop_invalidation_bus() -> None:
+    """
+    Stops the invalidation bus.
+    """
+    await invalidation_bus.stop()
+
+
+register_metrics_source("invalidation_bus", lambda: invalidation_bus.metrics())
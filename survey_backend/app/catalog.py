@@ -0,0 +1,312 @@
+""" Versioned, memory-mapped question catalog """
+
+import asyncio
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any, Callable
+
+import orjson
+from sqlalchemy import Column, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import settings
+from app.db.database import DBManager
+from app.db.models import (
+    SME,
+    CatalogVersion,
+    CurrentSituation,
+    CurrentStrategy,
+    Startups,
+)
+
+logger = logging.getLogger("auth_logger")
+
+# catalog file layout:
+#   header  - magic, catalog version, length of the index
+#   index   - JSON {kind: {module_id: [offset, length]}}
+#   payload - one JSON array of rows per (kind, module_id)
+CATALOG_MAGIC = b"WISCAT01"
+_HEADER = struct.Struct("<8sQI")
+
+# question tables served by the catalog
+CATALOG_TABLES = {
+    "sme": SME,
+    "startup": Startups,
+    "strategy": CurrentStrategy,
+    "situation": CurrentSituation,
+}
+
+# columns of the catalog tables holding the answers, always read from the
+# DB and left out of the snapshot
+ANSWER_COLUMNS: dict[str, tuple[str, ...]] = {
+    "sme": ("selected_value",),
+    "startup": ("selected_option",),
+    "strategy": (),
+    "situation": ("selected_value", "descriptions"),
+}
+
+
+_CATALOG_VERSION_ID = 1
+
+
+def _question_columns(kind: str) -> list[Column]:
+    table = CATALOG_TABLES[kind].__table__
+    return [
+        column for column in table.c if column.name not in ANSWER_COLUMNS[kind]
+    ]
+
+
+async def get_catalog_version(session: AsyncSession) -> int:
+    """
+    Returns the current version of the question catalog stored in the DB
+    """
+    version = await session.scalar(
+        select(CatalogVersion.version).where(
+            CatalogVersion.id == _CATALOG_VERSION_ID
+        )
+    )
+    return version or 0
+
+
+async def bump_catalog_version(session: AsyncSession) -> int:
+    """
+    Increments the question catalog version, returning the new one.
+
+    Must be called within the transaction that modifies one of the
+    catalog tables, so the new version is committed with the data.
+    """
+    version = await session.scalar(
+        update(CatalogVersion)
+        .where(CatalogVersion.id == _CATALOG_VERSION_ID)
+        .values(version=CatalogVersion.version + 1)
+        .returning(CatalogVersion.version)
+    )
+    if version is None:
+        version = 1
+        session.add(CatalogVersion(id=_CATALOG_VERSION_ID, version=version))
+    return version
+
+
+async def build_catalog(
+    session: AsyncSession, path: str | Path, version: int
+) -> None:
+    """
+    Builds the catalog file from the questions of the catalog tables,
+    without their answers.
+
+    The file is written next to the target and atomically moved in place,
+    so workers which have mapped the previous snapshot keep reading it
+    until they notice the new one.
+    """
+    index: dict[str, dict[str, tuple[int, int]]] = {}
+    blobs: list[bytes] = []
+    offset = 0
+    for kind, model in CATALOG_TABLES.items():
+        table = model.__table__
+        result = await session.execute(
+            select(*_question_columns(kind)).order_by(
+                table.c.module_id, table.c.id
+            )
+        )
+        by_module: dict[int, list[dict[str, Any]]] = {}
+        for row in result.mappings():
+            by_module.setdefault(row["module_id"], []).append(dict(row))
+
+        index[kind] = {}
+        for module_id, rows in by_module.items():
+            blob = orjson.dumps(rows)
+            index[kind][str(module_id)] = (offset, len(blob))
+            blobs.append(blob)
+            offset += len(blob)
+
+    j_index = orjson.dumps(index)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(
+        "wb", dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as f_tmp:
+        f_tmp.write(_HEADER.pack(CATALOG_MAGIC, version, len(j_index)))
+        f_tmp.write(j_index)
+        for blob in blobs:
+            f_tmp.write(blob)
+    os.replace(f_tmp.name, path)
+
+
+class QuestionCatalog:
+    """
+    Immutable snapshot of the questions, shared between workers.
+
+    The snapshot lives in a file which every worker maps in memory, so the
+    pages are shared through the OS page cache. Rows are decoded on read,
+    callers always get their own copy.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        # set when the app has synchronized the catalog with the DB
+        self.enabled = False
+        self.version: int | None = None
+        self._mm: mmap.mmap | None = None
+        self._file_id: tuple[int, int] | None = None
+        self._index: dict[str, dict[str, list[int]]] = {}
+        self._payload_offset = 0
+        # module id -> first catalog version holding its last question write
+        self._stale: dict[int, int] = {}
+        self._changed = asyncio.Event()
+
+    def _refresh(self) -> bool:
+        """
+        Maps the catalog file again if it has been replaced.
+
+        Returns True if a snapshot is available.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.close()
+            return False
+
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return True
+
+        with open(self.path, "rb") as f_catalog:
+            mm = mmap.mmap(f_catalog.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_len = _HEADER.unpack_from(mm)
+        if magic != CATALOG_MAGIC:
+            mm.close()
+            raise ValueError(f"{self.path} is not a question catalog.")
+
+        self.close()
+        self._mm = mm
+        self._file_id = file_id
+        self.version = version
+        self._index = orjson.loads(mm[_HEADER.size : _HEADER.size + index_len])
+        self._payload_offset = _HEADER.size + index_len
+        return True
+
+    def rows(self, kind: str, module_id: int) -> list[dict[str, Any]] | None:
+        """
+        Returns the rows of a catalog table for a module.
+
+        Returns None if no snapshot is available, in which case the caller
+        should read from the DB.
+        """
+        if not self.enabled or not self._refresh():
+            return None
+        stale_until = self._stale.get(module_id)
+        if stale_until is not None:
+            if (self.version or 0) < stale_until:
+                return None
+            del self._stale[module_id]
+        entry = self._index.get(kind, {}).get(str(module_id))
+        if entry is None:
+            return []
+        offset, length = entry
+        start = self._payload_offset + offset
+        return orjson.loads(self._mm[start : start + length])
+
+    async def sync(self, session: AsyncSession) -> None:
+        """
+        Rebuilds the snapshot if its version differs from the DB one.
+        """
+        db_version = await get_catalog_version(session)
+        self._refresh()
+        if self.version != db_version:
+            logger.info(f"Building question catalog version {db_version}")
+            await build_catalog(session, self.path, db_version)
+            self._refresh()
+
+    def changed(self, module_ids: set[int], version: int) -> None:
+        """
+        Tells the catalog that the questions of `module_ids` changed in the
+        committed `version`. Their rows are read from the DB until the
+        refresh task has rebuilt the snapshot.
+        """
+        for module_id in module_ids:
+            self._stale[module_id] = max(
+                version, self._stale.get(module_id, 0)
+            )
+        self._changed.set()
+
+    async def refresh_periodically(
+        self, db_manager_factory: Callable[[], DBManager], interval: float
+    ) -> None:
+        """
+        Keeps the snapshot in line with the DB version, rebuilding it after
+        the question writes of this worker and every `interval` seconds for
+        the ones handled by other pods.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            db_manager = db_manager_factory()
+            try:
+                async with db_manager.get_session() as _session:
+                    await self.sync(_session)
+            except Exception:  # pylint: disable = broad-exception-caught
+                logger.exception("Question catalog refresh failed")
+
+    def close(self) -> None:
+        """
+        Releases the mapped snapshot.
+        """
+        if self._mm is not None:
+            self._mm.close()
+        self._mm = None
+        self._file_id = None
+        self.version = None
+        self._index = {}
+        self._stale.clear()
+
+
+async def get_questions(
+    session: AsyncSession, kind: str, module_id: int
+) -> list[dict[str, Any]]:
+    """
+    Returns the rows of a catalog table for a module, the questions coming
+    from the snapshot when available and the answers from the DB, where
+    they are saved.
+    """
+    table = CATALOG_TABLES[kind].__table__
+    rows = question_catalog.rows(kind, module_id)
+    if rows is None:
+        result = await session.execute(
+            select(table)
+            .where(table.c.module_id == module_id)
+            .order_by(table.c.id)
+        )
+        return [dict(row) for row in result.mappings()]
+
+    answer_columns = ANSWER_COLUMNS[kind]
+    if rows and answer_columns:
+        result = await session.execute(
+            select(
+                table.c.id, *(table.c[name] for name in answer_columns)
+            ).where(table.c.module_id == module_id)
+        )
+        answers = {row["id"]: row for row in result.mappings()}
+        for row in rows:
+            answer = answers.get(row["id"], {})
+            for name in answer_columns:
+                row[name] = answer.get(name)
+    return rows
+
+
+def catalog_changed(module_ids: set[int], version: int) -> None:
+    """
+    Schedules the rebuild of the snapshot after committed question writes,
+    the answers not being part of it.
+    """
+    if question_catalog.enabled:
+        question_catalog.changed(module_ids, version)
+
+
+question_catalog = QuestionCatalog(settings.QUESTION_CATALOG_PATH)
@@ -0,0 +1,93 @@
+""" Bulk loading helpers """
+
+from typing import Any, Sequence
+
+from sqlalchemy import Table, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+
+async def _connection(session: AsyncSession | AsyncConnection):
+    if isinstance(session, AsyncSession):
+        return await session.connection()
+    return session
+
+
+async def reserve_ids(
+    session: AsyncSession | AsyncConnection, table: Table, count: int
+) -> list[int]:
+    """
+    Reserves `count` primary keys of `table`, so rows and the rows pointing
+    to them can be loaded without reading the generated keys back.
+
+    On SQLite the keys follow the current maximum, which is only safe
+    while the caller's transaction holds the write lock.
+    """
+    if count <= 0:
+        return []
+    connection = await _connection(session)
+    if connection.dialect.name == "postgresql":
+        result = await connection.execute(
+            text(
+                "SELECT nextval(pg_get_serial_sequence(:table, 'id'))"
+                " FROM generate_series(1, :count)"
+            ),
+            {"table": table.name, "count": count},
+        )
+        return list(result.scalars())
+
+    start = await connection.scalar(
+        select(func.coalesce(func.max(table.c.id), 0))
+    )
+    return list(range(start + 1, start + count + 1))
+
+
+async def copy_rows(
+    session: AsyncSession | AsyncConnection,
+    table: Table,
+    columns: Sequence[str],
+    records: Sequence[Sequence[Any]],
+) -> int:
+    """
+    Loads `records` (tuples of `columns` values) into `table`.
+
+    Uses COPY on Postgres and falls back to an executemany INSERT on the
+    other databases. ORM defaults and events are bypassed, so the records
+    must hold every value to store.
+    """
+    if not records:
+        return 0
+    connection = await _connection(session)
+    if connection.dialect.name == "postgresql":
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name,
+            records=records,
+            columns=list(columns),
+            schema_name=table.schema,
+        )
+    else:
+        await connection.execute(
+            insert(table), [dict(zip(columns, record)) for record in records]
+        )
+    return len(records)
+
+
+async def reset_sequence(
+    session: AsyncSession | AsyncConnection, table: Table
+) -> None:
+    """
+    Moves the id sequence of `table` past its rows, after rows were loaded
+    with explicit ids. SQLite needs nothing, it continues from the maximum.
+    """
+    connection = await _connection(session)
+    if connection.dialect.name != "postgresql" or "id" not in table.c:
+        return
+    await connection.execute(
+        select(
+            func.setval(
+                func.pg_get_serial_sequence(table.name, "id"),
+                func.coalesce(func.max(table.c.id), 0) + 1,
+                False,
+            )
+        )
+    )
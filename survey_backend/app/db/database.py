@@ -9,7 +9,6 @@ from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_scoped_session,
     async_sessionmaker,
-    create_async_engine,
 )
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base, sessionmaker
@@ -17,6 +16,9 @@ from sqlalchemy.sql.ddl import DropTable
 
 from app import settings
 
+from .deadlines import statement_timeout
+from .engines import get_engine, get_slice_engine, pool_slice
+
 
 
 
@@ -25,11 +27,11 @@ class DBHost(str, enum.Enum):
     FOLLOWER = "follower"
 
 
-leader_engine = create_async_engine(
+leader_engine = get_engine(
     settings.LIVE_DATABASE_LEADER_URI,
     **settings.db_settings.leader.engine_options
 )
-follower_engine = create_async_engine(
+follower_engine = get_engine(
     settings.LIVE_DATABASE_FOLLOWER_URI,
     **settings.db_settings.follower.engine_options
 )
@@ -69,7 +71,16 @@ class DBManager:
         )
 
     def get_session(self) -> AsyncSession:
-        session = self.scoped_session()
+        slice_name = pool_slice.get()
+        if (
+            self.host == DBHost.LEADER
+            and slice_name is not None
+            and not self.scoped_session.registry.has()
+        ):
+            # the request uses the leader pool of its bulkhead class
+            session = self.scoped_session(bind=get_slice_engine(slice_name))
+        else:
+            session = self.scoped_session()
         print(f"Spawning session {id(session)}")
         return session
 
@@ -89,5 +100,16 @@ def post_exc(conn, cursor, statement, parameters, context, executemany):
     #     sql_logger.warning("%s = %s", k, v)
 
 
+@event.listens_for(sync_maker, "after_begin")
+def set_statement_timeout(session, transaction, connection):
+    """
+    Stops the statements of a request at its deadline, server side, for the
+    transaction only.
+    """
+    timeout = statement_timeout()
+    if timeout is not None and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout}")
+
+
 # base class for DB models
 Base = declarative_base()
@@ -0,0 +1,32 @@
+""" Deadlines of the requests, passed on to their database work """
+
+from contextvars import ContextVar
+from time import monotonic
+
+# monotonic time by which the current request must be done
+request_deadline: ContextVar[float | None] = ContextVar(
+    "request_deadline", default=None
+)
+
+
+def remaining() -> float | None:
+    """
+    Returns the seconds left until the deadline of the current request, or
+    None without a deadline.
+    """
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - monotonic())
+
+
+def statement_timeout() -> int | None:
+    """
+    Returns the Postgres statement_timeout, in milliseconds, that stops a
+    statement at the deadline of the current request.
+    """
+    seconds = remaining()
+    if seconds is None:
+        return None
+    # 0 would disable the timeout
+    return max(1, int(seconds * 1000))
@@ -0,0 +1,513 @@
+""" Streaming dump and restore of the database """
+
+import asyncio
+import gzip
+import hashlib
+from datetime import date, datetime, time
+from itertools import islice
+from pathlib import Path
+from typing import IO, Any, AsyncIterator, Callable, Iterator
+
+import asyncpg
+import orjson
+from sqlalchemy import URL, Table, delete, insert, make_url, select
+
+from .database import Base
+from .engines import get_engine
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+ARCHIVE_VERSION = 1
+MANIFEST = "manifest.json"
+# encodings of the table data
+PG_BINARY = "pgbinary"
+NDJSON = "ndjson"
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024  # uncompressed bytes per chunk file
+_READ_SIZE = 1024 * 1024
+_NDJSON_BATCH = 1000
+
+
+def default_compression() -> str:
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def _open_chunk(path: Path, mode: str, compression: str) -> IO[bytes]:
+    if compression == "gzip":
+        # favour speed, dumps are mostly text and compress well anyway
+        return gzip.open(path, mode + "b", compresslevel=1)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd archives need the zstandard package.")
+        # pylint: disable = consider-using-with
+        raw = open(path, mode + "b")
+        if mode == "w":
+            return zstandard.ZstdCompressor(level=3).stream_writer(raw)
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+class ChunkWriter:
+    """
+    Writes the data of a table to compressed files of about `chunk_size`
+    uncompressed bytes each.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        table: str,
+        encoding: str,
+        compression: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        self.directory = directory
+        self.table = table
+        self.suffix = f"{'bin' if encoding == PG_BINARY else 'ndjson'}." + (
+            "zst" if compression == "zstd" else "gz"
+        )
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.files: list[str] = []
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._file: IO[bytes] | None = None
+        self._written = 0
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        self._sha256.update(data)
+        # the chunks are concatenated back on restore, cut anywhere
+        view = memoryview(data)
+        while view:
+            if self._file is None or self._written >= self.chunk_size:
+                self._rotate()
+            part = view[: self.chunk_size - self._written]
+            self._file.write(part)  # type: ignore
+            self._written += len(part)
+            view = view[len(part) :]
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        name = f"{self.table}.{len(self.files):04d}.{self.suffix}"
+        self._file = _open_chunk(self.directory / name, "w", self.compression)
+        self.files.append(name)
+        self._written = 0
+
+    def close(self) -> dict[str, Any]:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return {
+            "chunks": self.files,
+            "bytes": self.size,
+            "sha256": self._sha256.hexdigest(),
+        }
+
+
+def _read_chunk_files(
+    directory: Path, files: list[str], compression: str
+) -> Iterator[bytes]:
+    for name in files:
+        with _open_chunk(directory / name, "r", compression) as chunk:
+            while data := chunk.read(_READ_SIZE):
+                yield data
+
+
+async def _iterate_in_thread(
+    iterator: Iterator[Any], batch_size: int = 1
+) -> AsyncIterator[Any]:
+    # decompression blocks, keep it off the event loop
+    def next_batch() -> list[Any]:
+        return list(islice(iterator, batch_size))
+
+    while batch := await asyncio.to_thread(next_batch):
+        for item in batch:
+            yield item
+
+
+def _ndjson_lines(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    rest = b""
+    for data in chunks:
+        lines = (rest + data).split(b"\n")
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+def _converters(table: Table, columns: list[str]) -> list[Callable | None]:
+    # JSON has no date types, parse them back
+    parsers = {
+        datetime: datetime.fromisoformat,
+        date: date.fromisoformat,
+        time: time.fromisoformat,
+    }
+    converters = []
+    for column in columns:
+        try:
+            python_type = table.c[column].type.python_type
+        except NotImplementedError:
+            python_type = None
+        converters.append(parsers.get(python_type))
+    return converters
+
+
+def _decode_rows(
+    table: Table, columns: list[str], lines: Iterator[bytes]
+) -> Iterator[tuple]:
+    converters = _converters(table, columns)
+    for line in lines:
+        values = orjson.loads(line)
+        yield tuple(
+            convert(value) if convert and value is not None else value
+            for convert, value in zip(converters, values)
+        )
+
+
+def table_levels(tables: list[Table]) -> dict[str, int]:
+    """
+    Orders the tables by foreign key dependency: level 0 tables reference
+    no other table, level n tables only reference lower levels.
+    """
+    names = {table.name for table in tables}
+    levels: dict[str, int] = {}
+    for table in Base.metadata.sorted_tables:
+        if table.name not in names:
+            continue
+        levels[table.name] = 1 + max(
+            (
+                levels.get(fk.column.table.name, -1)
+                for fk in table.foreign_keys
+                if fk.column.table is not table
+            ),
+            default=-1,
+        )
+    return levels
+
+
+def _select_tables(names: list[str] | None) -> list[Table]:
+    if not names:
+        return list(Base.metadata.sorted_tables)
+    unknown = set(names) - Base.metadata.tables.keys()
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+    return [t for t in Base.metadata.sorted_tables if t.name in names]
+
+
+def _asyncpg_dsn(url: URL) -> str:
+    return url.set(drivername="postgresql").render_as_string(
+        hide_password=False
+    )
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+async def _pg_dump(
+    url: URL,
+    tables: list[Table],
+    directory: Path,
+    *,
+    jobs: int,
+    compression: str,
+    chunk_size: int,
+) -> list[dict[str, Any]]:
+    dsn = _asyncpg_dsn(url)
+    # every table is read from the snapshot of this transaction
+    main = await asyncpg.connect(dsn)
+    transaction = main.transaction(isolation="repeatable_read", readonly=True)
+    await transaction.start()
+    snapshot = await main.fetchval("SELECT pg_export_snapshot()")
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def dump_table(table: Table) -> dict[str, Any]:
+        columns = [column.name for column in table.columns]
+        writer = ChunkWriter(
+            directory, table.name, PG_BINARY, compression, chunk_size
+        )
+
+        async def output(data: bytes) -> None:
+            await asyncio.to_thread(writer.write, bytes(data))
+
+        async with semaphore:
+            conn = await asyncpg.connect(dsn)
+            try:
+                async with conn.transaction(
+                    isolation="repeatable_read", readonly=True
+                ):
+                    await conn.execute(
+                        f"SET TRANSACTION SNAPSHOT '{snapshot}'"
+                    )
+                    status = await conn.copy_from_table(
+                        table.name,
+                        columns=columns,
+                        schema_name=table.schema,
+                        output=output,
+                        format="binary",
+                    )
+            finally:
+                await conn.close()
+        return {
+            "name": table.name,
+            "columns": columns,
+            "rows": int(status.split()[-1]),
+            **writer.close(),
+        }
+
+    try:
+        return await asyncio.gather(*[dump_table(t) for t in tables])
+    finally:
+        await transaction.rollback()
+        await main.close()
+
+
+async def _sqlite_dump(
+    url: URL,
+    tables: list[Table],
+    directory: Path,
+    *,
+    compression: str,
+    chunk_size: int,
+) -> list[dict[str, Any]]:
+    entries = []
+    engine = get_engine(url)
+    async with engine.connect() as conn, conn.begin():
+        for table in tables:
+            columns = [column.name for column in table.columns]
+            writer = ChunkWriter(
+                directory, table.name, NDJSON, compression, chunk_size
+            )
+            rows = 0
+            result = await conn.stream(
+                select(table).order_by(*table.primary_key.columns)
+            )
+            async for partition in result.partitions(_NDJSON_BATCH):
+                data = b"".join(
+                    orjson.dumps(tuple(row), default=str) + b"\n"
+                    for row in partition
+                )
+                await asyncio.to_thread(writer.write, data)
+                rows += len(partition)
+            entries.append(
+                {"name": table.name, "columns": columns, "rows": rows}
+                | writer.close()
+            )
+    return entries
+
+
+async def dump_database(
+    url: str | URL,
+    directory: Path,
+    *,
+    tables: list[str] | None = None,
+    jobs: int = 4,
+    compression: str | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict[str, Any]:
+    """
+    Dumps the model tables into `directory`: a manifest plus compressed
+    chunk files per table.
+
+    Postgres tables are streamed with binary COPY, `jobs` at a time on
+    separate connections sharing one snapshot. SQLite tables are written
+    as NDJSON in the same layout.
+    """
+    url = make_url(url)
+    compression = compression or default_compression()
+    selected = _select_tables(tables)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    if url.get_backend_name() == "postgresql":
+        encoding = PG_BINARY
+        entries = await _pg_dump(
+            url,
+            selected,
+            directory,
+            jobs=jobs,
+            compression=compression,
+            chunk_size=chunk_size,
+        )
+    else:
+        encoding = NDJSON
+        entries = await _sqlite_dump(
+            url,
+            selected,
+            directory,
+            compression=compression,
+            chunk_size=chunk_size,
+        )
+
+    levels = table_levels(selected)
+    manifest = {
+        "version": ARCHIVE_VERSION,
+        "dialect": url.get_backend_name(),
+        "encoding": encoding,
+        "compression": compression,
+        "created_on": datetime.now().isoformat(),
+        "tables": [
+            entry | {"level": levels[entry["name"]]} for entry in entries
+        ],
+    }
+    (directory / MANIFEST).write_bytes(
+        orjson.dumps(manifest, option=orjson.OPT_INDENT_2)
+    )
+    return manifest
+
+
+def read_manifest(directory: Path) -> dict[str, Any]:
+    manifest = orjson.loads((directory / MANIFEST).read_bytes())
+    if manifest.get("version") != ARCHIVE_VERSION:
+        raise ValueError(
+            f"Unsupported archive version: {manifest.get('version')}"
+        )
+    return manifest
+
+
+def _by_level(entries: list[dict[str, Any]]) -> list[list[dict[str, Any]]]:
+    levels: dict[int, list[dict[str, Any]]] = {}
+    for entry in entries:
+        levels.setdefault(entry["level"], []).append(entry)
+    return [levels[level] for level in sorted(levels)]
+
+
+async def _pg_restore(
+    url: URL,
+    directory: Path,
+    manifest: dict[str, Any],
+    *,
+    jobs: int,
+    truncate: bool,
+) -> None:
+    dsn = _asyncpg_dsn(url)
+    compression = manifest["compression"]
+    entries = manifest["tables"]
+    names = ", ".join(_quote(entry["name"]) for entry in entries)
+
+    if truncate:
+        conn = await asyncpg.connect(dsn)
+        try:
+            await conn.execute(f"TRUNCATE {names} RESTART IDENTITY CASCADE")
+        finally:
+            await conn.close()
+
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def restore_table(entry: dict[str, Any]) -> None:
+        if not entry["chunks"]:
+            return
+        table = Base.metadata.tables[entry["name"]]
+        chunks = _read_chunk_files(directory, entry["chunks"], compression)
+        async with semaphore:
+            conn = await asyncpg.connect(dsn)
+            try:
+                async with conn.transaction():
+                    if manifest["encoding"] == PG_BINARY:
+                        await conn.copy_to_table(
+                            table.name,
+                            source=_iterate_in_thread(chunks),
+                            columns=entry["columns"],
+                            schema_name=table.schema,
+                            format="binary",
+                        )
+                    else:
+                        rows = _decode_rows(
+                            table, entry["columns"], _ndjson_lines(chunks)
+                        )
+                        await conn.copy_records_to_table(
+                            table.name,
+                            records=_iterate_in_thread(rows, _NDJSON_BATCH),
+                            columns=entry["columns"],
+                            schema_name=table.schema,
+                        )
+            finally:
+                await conn.close()
+
+    # referenced tables first, the tables of a level in parallel
+    for level in _by_level(entries):
+        await asyncio.gather(*[restore_table(entry) for entry in level])
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        for entry in entries:
+            table = Base.metadata.tables[entry["name"]]
+            if "id" not in table.c or not table.c.id.autoincrement:
+                continue
+            await conn.execute(
+                "SELECT setval(pg_get_serial_sequence($1, 'id'),"
+                f" coalesce(max(id), 0) + 1, false) FROM {_quote(table.name)}",
+                table.name,
+            )
+    finally:
+        await conn.close()
+
+
+async def _sqlite_restore(
+    url: URL, directory: Path, manifest: dict[str, Any], *, truncate: bool
+) -> None:
+    if manifest["encoding"] != NDJSON:
+        raise ValueError(
+            "Only NDJSON archives can be restored into this database."
+        )
+    compression = manifest["compression"]
+    levels = _by_level(manifest["tables"])
+    engine = get_engine(url)
+    async with engine.begin() as conn:
+        if truncate:
+            for level in reversed(levels):
+                for entry in level:
+                    await conn.execute(
+                        delete(Base.metadata.tables[entry["name"]])
+                    )
+        for level in levels:
+            for entry in level:
+                table = Base.metadata.tables[entry["name"]]
+                columns = entry["columns"]
+                chunks = _read_chunk_files(
+                    directory, entry["chunks"], compression
+                )
+                batch = []
+                rows = _decode_rows(table, columns, _ndjson_lines(chunks))
+                for row in rows:
+                    batch.append(dict(zip(columns, row)))
+                    if len(batch) == _NDJSON_BATCH:
+                        await conn.execute(insert(table), batch)
+                        batch = []
+                if batch:
+                    await conn.execute(insert(table), batch)
+
+
+async def restore_database(
+    url: str | URL,
+    directory: Path,
+    *,
+    jobs: int = 4,
+    truncate: bool = True,
+) -> dict[str, Any]:
+    """
+    Loads an archive written by `dump_database`, emptying the archived
+    tables first unless `truncate` is false.
+
+    The tables are loaded by foreign key level. On Postgres the tables of
+    a level are loaded in parallel with COPY and the id sequences are
+    moved past the restored rows.
+    """
+    url = make_url(url)
+    manifest = read_manifest(directory)
+    names = {entry["name"] for entry in manifest["tables"]}
+    unknown = names - Base.metadata.tables.keys()
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+
+    if url.get_backend_name() == "postgresql":
+        await _pg_restore(
+            url, directory, manifest, jobs=jobs, truncate=truncate
+        )
+    else:
+        await _sqlite_restore(url, directory, manifest, truncate=truncate)
+    return manifest
@@ -0,0 +1,126 @@
+""" Registry of the shared database engines """
+
+from contextvars import ContextVar
+from typing import Any, Awaitable, TypeVar
+
+from sqlalchemy import URL, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app import settings
+from app.metrics import register_metrics_source
+
+from .faults import FaultInjector
+from .pool import SliceAsyncQueuePool, TimedAsyncQueuePool
+
+T = TypeVar("T")
+
+# (URL, options) -> engine
+_engines: dict[tuple[str, str], AsyncEngine] = {}
+
+# bulkhead class of the current request, when it has its own leader pool
+pool_slice: ContextVar[str | None] = ContextVar("pool_slice", default=None)
+
+
+def _registry_key(url: str | URL, options: dict[str, Any]) -> tuple[str, str]:
+    return (
+        make_url(url).render_as_string(hide_password=False),
+        repr(sorted(options.items())),
+    )
+
+
+def get_engine(url: str | URL, **options: Any) -> AsyncEngine:
+    """
+    Returns the engine of `url` created with `options`, creating it on the
+    first call only, so callers share its connection pool.
+
+    The engine gets the latency and disconnects of `DBFaultSettings` when
+    these are enabled. Its queue pool records the waits for a connection.
+    """
+    key = _registry_key(url, options)
+    engine = _engines.get(key)
+    if engine is None:
+        url = make_url(url)
+        if "poolclass" not in options and issubclass(
+            url.get_dialect().get_pool_class(url), AsyncAdaptedQueuePool
+        ):
+            options = options | {"poolclass": TimedAsyncQueuePool}
+        engine = _engines[key] = create_async_engine(url, **options)
+        if settings.db_fault_settings.enabled:
+            FaultInjector.from_settings().attach(engine)
+    return engine
+
+
+def get_slice_engine(name: str) -> AsyncEngine:
+    """
+    Returns the leader engine of the `name` bulkhead class, with a pool of
+    its own whose waits are not an overload of the worker.
+    """
+    bulkhead = settings.bulkhead_settings.classes[name]
+    return get_engine(
+        settings.LIVE_DATABASE_LEADER_URI,
+        **settings.db_settings.leader.engine_options
+        | {
+            "pool_size": bulkhead.pool_size,
+            "max_overflow": bulkhead.max_overflow,
+            "poolclass": SliceAsyncQueuePool,
+        },
+    )
+
+
+def get_session_engine(session: AsyncSession) -> AsyncEngine:
+    """
+    Returns the registered engine the session is bound to, or the shared
+    engine of its URL.
+    """
+    sync_engine = session.get_bind().engine
+    for engine in _engines.values():
+        if engine.sync_engine is sync_engine:
+            return engine
+    return get_engine(sync_engine.url)
+
+
+async def dispose_engines() -> None:
+    """
+    Closes the connection pools of all the engines. An engine used again
+    afterwards opens a new pool.
+    """
+    for engine in list(_engines.values()):
+        await engine.dispose()
+
+
+async def run_and_dispose(awaitable: Awaitable[T]) -> T:
+    """
+    Awaits `awaitable` then disposes the engines, for scripts ending their
+    event loop afterwards.
+    """
+    try:
+        return await awaitable
+    finally:
+        await dispose_engines()
+
+
+def pool_metrics() -> dict[str, dict[str, Any]]:
+    metrics = {}
+    for engine in _engines.values():
+        pool = engine.pool
+        stats: dict[str, Any] = {"pool": type(pool).__name__}
+        # only queue pools keep track of their connections
+        for stat in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, stat):
+                stats[stat] = getattr(pool, stat)()
+        if isinstance(pool, TimedAsyncQueuePool):
+            stats |= pool.waits.metrics()
+        name = engine.url.render_as_string(hide_password=True)
+        # engines of the same URL with different options
+        while name in metrics:
+            name += "'"
+        metrics[name] = stats
+    return metrics
+
+
+register_metrics_source("engines", pool_metrics)
@@ -0,0 +1,128 @@
+""" Latency and disconnect injection, to benchmark against a slow database """
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.exc import MissingGreenlet, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.util import await_only
+
+from app import settings
+from app.metrics import register_metrics_source
+
+
+class InjectedDisconnect(Exception):
+    """
+    Cause of the OperationalError raised for an injected disconnect.
+    """
+
+
+def _sleep(seconds: float) -> None:
+    if seconds <= 0:
+        return
+    try:
+        # async engines run the events in a greenlet, so the other tasks
+        # keep running while the statement is delayed
+        await_only(asyncio.sleep(seconds))
+    except MissingGreenlet:
+        time.sleep(seconds)
+
+
+@dataclass
+class FaultInjector:
+    """
+    Delays every statement by `latency` plus up to `jitter` seconds, every
+    connection checkout by `connect_latency` seconds, and drops the
+    connection before a statement with a probability of `disconnect_rate`.
+    """
+
+    latency: float = 0
+    jitter: float = 0
+    connect_latency: float = 0
+    disconnect_rate: float = 0
+    seed: int | None = None
+    stats: dict[str, Any] = field(
+        default_factory=lambda: {
+            "statements": 0,
+            "checkouts": 0,
+            "disconnects": 0,
+            "delay": 0.0,
+        }
+    )
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def from_settings(
+        cls, config: settings.DBFaultSettings | None = None
+    ) -> "FaultInjector":
+        config = config or settings.db_fault_settings
+        return cls(
+            latency=config.latency_ms / 1000,
+            jitter=config.jitter_ms / 1000,
+            connect_latency=config.connect_latency_ms / 1000,
+            disconnect_rate=config.disconnect_rate,
+            seed=config.seed,
+        )
+
+    def _delay(self, seconds: float) -> None:
+        self.stats["delay"] += seconds
+        _sleep(seconds)
+
+    def before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        # pylint: disable = unused-argument, too-many-arguments
+        self.stats["statements"] += 1
+        if self._rng.random() < self.disconnect_rate:
+            self.stats["disconnects"] += 1
+            conn.invalidate()
+            raise OperationalError(
+                statement,
+                parameters,
+                InjectedDisconnect("connection dropped by the injector"),
+                connection_invalidated=True,
+            )
+        self._delay(self.latency + self._rng.uniform(0, self.jitter))
+
+    def checkout(self, dbapi_connection, connection_record, connection_proxy):
+        # pylint: disable = unused-argument
+        self.stats["checkouts"] += 1
+        self._delay(self.connect_latency)
+
+    def attach(self, engine: AsyncEngine) -> "FaultInjector":
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            self.before_cursor_execute,
+        )
+        event.listen(engine.sync_engine, "checkout", self.checkout)
+        _injectors[engine] = self
+        return self
+
+    def detach(self, engine: AsyncEngine) -> None:
+        event.remove(
+            engine.sync_engine,
+            "before_cursor_execute",
+            self.before_cursor_execute,
+        )
+        event.remove(engine.sync_engine, "checkout", self.checkout)
+        _injectors.pop(engine, None)
+
+
+_injectors: dict[AsyncEngine, FaultInjector] = {}
+
+
+def fault_metrics() -> dict[str, dict[str, Any]]:
+    return {
+        engine.url.render_as_string(hide_password=True): dict(injector.stats)
+        for engine, injector in _injectors.items()
+    }
+
+
+register_metrics_source("db_faults", fault_metrics)
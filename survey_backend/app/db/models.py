@@ -12,11 +12,14 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Table,
     Text,
     UniqueConstraint,
+    func,
+    text,
 )
 from sqlalchemy.orm import Mapped, backref, mapped_column, relationship
 
@@ -48,6 +51,8 @@ user_group = Table(
     Column("user_id", Integer, ForeignKey("wis_user.id")),
     Column("group_id", Integer, ForeignKey("wis_group.id")),
     UniqueConstraint("user_id", "group_id", name="uq_user_group"),
+    # the unique index leads with user_id, so it does not cover group lookups
+    Index("ix_wis_user_group_group_id", "group_id"),
 )
 
 
@@ -79,6 +84,10 @@ class PasswordHistory(Base):
     """
 
     __tablename__ = "wis_password_history"
+    __table_args__ = (
+        # the password checks read the latest entries of a user
+        Index("ix_wis_password_history_user_id", "user_id", "created_on"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int | None] = mapped_column(Integer)
@@ -97,10 +106,25 @@ class User(Base):
     """
 
     __tablename__ = "wis_user"
+    __table_args__ = (
+        # logins are case-insensitive, so are the names and emails
+        Index("uq_wis_user_name_lower", func.lower(text("name")), unique=True),
+        Index(
+            "uq_wis_user_email_lower", func.lower(text("email")), unique=True
+        ),
+        # notification recipients, deleted users are never notified
+        Index(
+            "ix_wis_user_active_notifications",
+            "notifications",
+            "id",
+            postgresql_where=text("deleted IS false"),
+            sqlite_where=text("deleted IS 0"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(256), unique=True, nullable=False)
-    email: Mapped[str | None] = mapped_column(String(256))
+    email: Mapped[str | None] = mapped_column(String(256), index=True)
     email_verified: Mapped[bool] = mapped_column(default=False, nullable=False)
     first_name: Mapped[str | None] = mapped_column(String(128))
     last_name: Mapped[str | None] = mapped_column(String(128))
@@ -113,7 +137,9 @@ class User(Base):
     token_iat: Mapped[datetime] = mapped_column(nullable=True)
     auth_mode: Mapped[str] = mapped_column(default=AuthMode.LOCAL.value)
     external_user_id: Mapped[str] = mapped_column(String(128), nullable=True)
-    email_token: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    email_token: Mapped[str | None] = mapped_column(
+        String(256), nullable=True, index=True
+    )
     token_timestamp: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     groups: Mapped[list[Group]] = relationship(
         "Group",
@@ -149,8 +175,12 @@ class Permission(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     set_id: Mapped[int] = mapped_column(Integer, nullable=False)
-    user_id: Mapped[int | None] = mapped_column(ForeignKey("wis_user.id"))
-    group_id: Mapped[int | None] = mapped_column(ForeignKey("wis_group.id"))
+    user_id: Mapped[int | None] = mapped_column(
+        ForeignKey("wis_user.id"), index=True
+    )
+    group_id: Mapped[int | None] = mapped_column(
+        ForeignKey("wis_group.id"), index=True
+    )
     grant: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
     list: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
     read: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
@@ -200,7 +230,9 @@ class Module(Base):
     __tablename__ = "wis_module"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
-    user_id: Mapped[int | None] = mapped_column(ForeignKey("wis_user.id"))
+    user_id: Mapped[int | None] = mapped_column(
+        ForeignKey("wis_user.id"), index=True
+    )
     module_name: Mapped[str | None] = mapped_column(String)
 
 
@@ -227,7 +259,9 @@ class SME(Base):
     __tablename__ = "wis_sme"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
-    module_id: Mapped[int] = mapped_column(ForeignKey("wis_module.id"))
+    module_id: Mapped[int] = mapped_column(
+        ForeignKey("wis_module.id"), index=True
+    )
     heading: Mapped[str] = mapped_column(String)
     question: Mapped[str] = mapped_column(String)
     value: Mapped[str] = mapped_column(String)
@@ -243,7 +277,9 @@ class Startups(Base):
     __tablename__ = "wis_startups"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
-    module_id: Mapped[int] = mapped_column(ForeignKey("wis_module.id"))
+    module_id: Mapped[int] = mapped_column(
+        ForeignKey("wis_module.id"), index=True
+    )
     question: Mapped[str | None] = mapped_column(String)
     option_1: Mapped[str | None] = mapped_column(String)
     option_2: Mapped[str | None] = mapped_column(String)
@@ -259,7 +295,9 @@ class CurrentStrategy(Base):
     __tablename__ = "wis_current_strategy"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
-    module_id: Mapped[int] = mapped_column(ForeignKey("wis_module.id"))
+    module_id: Mapped[int] = mapped_column(
+        ForeignKey("wis_module.id"), index=True
+    )
     question: Mapped[str] = mapped_column(String)
 
 
@@ -271,7 +309,9 @@ class CurrentStrategyValue(Base):
     __tablename__ = "wis_current_strategy_value"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
-    strategy_id: Mapped[int] = mapped_column(ForeignKey("wis_current_strategy.id"))
+    strategy_id: Mapped[int] = mapped_column(
+        ForeignKey("wis_current_strategy.id"), index=True
+    )
     strategy: Mapped[str] = mapped_column(String)
 
 
@@ -284,9 +324,108 @@ class CurrentSituation(Base):
     __tablename__ = "wis_current_situation"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
-    module_id: Mapped[int] = mapped_column(ForeignKey("wis_module.id"))
+    module_id: Mapped[int] = mapped_column(
+        ForeignKey("wis_module.id"), index=True
+    )
     heading: Mapped[str] = mapped_column(String)
     sub_heading: Mapped[str] = mapped_column(String)
     level_values: Mapped[str] = mapped_column(String)
     selected_value: Mapped[int | None] = mapped_column(Integer)
     descriptions: Mapped[str | None] = mapped_column(String)
+
+
+class EmailStatusEnum(str, Enum):
+    """
+    Delivery status of an outbox email.
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    DEAD = "dead"
+
+
+class FanOutStatusEnum(str, Enum):
+    """
+    Status of the fan-out of a notification to its recipients.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+
+
+class Notification(Base):
+    """
+    Table holding the notifications sent to the opted-in users
+    """
+
+    __tablename__ = "wis_notification"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    subject: Mapped[str] = mapped_column(String(998), nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    created_by: Mapped[int | None] = mapped_column(ForeignKey("wis_user.id"))
+    # recipients enqueued so far
+    recipients: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_on: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.now
+    )
+    status: Mapped[FanOutStatusEnum] = mapped_column(
+        String(16), nullable=False, default=FanOutStatusEnum.QUEUED.value
+    )
+    # id of the last user enqueued, the fan-out resuming after it
+    last_user_id: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0
+    )
+
+    def __repr__(self):
+        return f"<Notification {self.id} recipients={self.recipients}>"
+
+
+class EmailOutbox(Base):
+    """
+    Table holding the emails waiting to be delivered by the outbox worker
+    """
+
+    __tablename__ = "wis_email_outbox"
+    __table_args__ = (
+        Index("ix_wis_email_outbox_status_next", "status", "next_attempt_at"),
+        Index("ix_wis_email_outbox_notification", "notification_id", "status"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    recipient: Mapped[str] = mapped_column(String(256), nullable=False)
+    subject: Mapped[str] = mapped_column(String(998), nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[EmailStatusEnum] = mapped_column(
+        String(16), nullable=False, default=EmailStatusEnum.PENDING.value
+    )
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.now
+    )
+    last_error: Mapped[str | None] = mapped_column(Text)
+    created_on: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.now
+    )
+    sent_on: Mapped[datetime | None] = mapped_column(DateTime)
+    notification_id: Mapped[int | None] = mapped_column(
+        ForeignKey("wis_notification.id")
+    )
+
+    def __repr__(self):
+        return f"<EmailOutbox {self.id} {self.status}>"
+
+
+class CatalogVersion(Base):
+    """
+    Single-row table holding the version of the question catalog
+    """
+
+    __tablename__ = "wis_catalog_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_on: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.now, onupdate=datetime.now, nullable=False
+    )
@@ -0,0 +1,106 @@
+""" Connection pool timing the waits for a connection """
+
+import itertools
+import weakref
+from time import monotonic
+from typing import Any
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+
+class PoolWaits:
+    """
+    Waits of the checkouts of a pool: the ones in progress, and a moving
+    average of the completed ones that expires after `window` seconds
+    without checkouts.
+    """
+
+    def __init__(self, smoothing: float = 0.2, window: float = 5.0):
+        self.smoothing = smoothing
+        self.window = window
+        self.average = 0.0
+        self.last = 0.0
+        self.checkouts = 0
+        self._ids = itertools.count()
+        # id -> start of the checkouts waiting
+        self._waiting: dict[int, float] = {}
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def start(self) -> int:
+        wait_id = next(self._ids)
+        self._waiting[wait_id] = monotonic()
+        return wait_id
+
+    def end(self, wait_id: int) -> None:
+        now = monotonic()
+        seconds = now - self._waiting.pop(wait_id)
+        self.average += self.smoothing * (seconds - self.average)
+        self.last = now
+        self.checkouts += 1
+
+    def current(self) -> float:
+        """
+        Seconds a checkout currently waits: the longest wait in progress or
+        the recent average.
+        """
+        now = monotonic()
+        average = self.average if now - self.last < self.window else 0.0
+        if not self._waiting:
+            return average
+        return max(average, now - min(self._waiting.values()))
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "waiting": self.waiting,
+            "wait_ms": round(self.current() * 1000, 3),
+            "checkouts": self.checkouts,
+        }
+
+
+# pools of the engines, to read their waits
+_pools: weakref.WeakSet = weakref.WeakSet()
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool recording how long the checkouts wait for a connection,
+    including the connection and the checkout events.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.waits = PoolWaits()
+        _pools.add(self)
+
+    def connect(self) -> PoolProxiedConnection:
+        wait_id = self.waits.start()
+        try:
+            return super().connect()
+        finally:
+            self.waits.end(wait_id)
+
+
+class SliceAsyncQueuePool(TimedAsyncQueuePool):
+    """
+    Pool of a bulkhead class. Its requests queue for its few connections
+    by design, the bulkhead bounding their wait.
+    """
+
+
+def pool_wait() -> float:
+    """
+    Returns the longest current wait for a connection of the pools shared
+    by all the requests, in seconds. The waits of the pool slices are left
+    out, they would shed the requests of the other classes.
+    """
+    return max(
+        (
+            pool.waits.current()
+            for pool in _pools
+            if not isinstance(pool, SliceAsyncQueuePool)
+        ),
+        default=0.0,
+    )
@@ -0,0 +1,18 @@
+""" Redis connection """
+
+from redis import asyncio as aioredis
+
+from app import settings
+
+
+def create_redis_client() -> aioredis.Redis:
+    """
+    Creates the Redis client from the settings
+    """
+    redis_settings = settings.redis_settings
+    return aioredis.Redis(
+        host=redis_settings.host,
+        port=redis_settings.port,
+        db=redis_settings.db,
+        password=redis_settings.password or None,
+    )
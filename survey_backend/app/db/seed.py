@@ -0,0 +1,206 @@
+""" Declarative loader of the seed data """
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import orjson
+from sqlalchemy import Table, bindparam, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.catalog import CATALOG_TABLES, bump_catalog_version
+
+from .database import Base
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+
+@dataclass
+class SeedResult:
+    """
+    Rows of a fixture inserted, updated and left unchanged.
+    """
+
+    table: str
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+def read_fixtures(path: Path = FIXTURES_DIR) -> list[dict[str, Any]]:
+    """
+    Reads the fixture files of a directory, in file name order.
+
+    A fixture holds the rows of one table:
+
+        {
+            "table": "wis_sme",
+            "key": ["module_id", "question"],
+            "refs": {
+                "module_id": {
+                    "table": "wis_module",
+                    "key": "module_name",
+                    "scope": {"user_id": "testadmin"},
+                    "refs": {"user_id": {"table": "wis_user", "key": "name"}}
+                }
+            },
+            "update": true,
+            "rows": [{"module_id": "sme", "question": "...", ...}]
+        }
+
+    `key` is the natural key identifying a row, `refs` gives the natural
+    key used in place of a foreign key, and `update` false only inserts
+    the missing rows. The `scope` of a ref restricts the rows it looks up,
+    for natural keys only unique within it, its values being resolved with
+    the `refs` of the ref.
+    """
+    return [
+        orjson.loads(fixture.read_bytes())
+        for fixture in sorted(path.glob("*.json"))
+    ]
+
+
+def _group_by_columns(rows: list[dict]) -> list[list[dict]]:
+    # an executemany needs the same columns in every row
+    groups: dict[tuple, list[dict]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return list(groups.values())
+
+
+def _index_by_key(
+    table: Table, key: list[str], db_rows: Any
+) -> dict[tuple, Any]:
+    # natural key -> row, refusing the keys matching several rows
+    index: dict[tuple, Any] = {}
+    for db_row in db_rows:
+        natural_key = tuple(db_row[k] for k in key)
+        if natural_key in index:
+            raise ValueError(
+                f"{table.name}: several rows for {', '.join(key)}"
+                f" {natural_key}"
+            )
+        index[natural_key] = db_row
+    return index
+
+
+async def _resolve_refs(
+    session: AsyncSession, fixture: dict[str, Any]
+) -> list[dict[str, Any]]:
+    rows = [dict(row) for row in fixture["rows"]]
+    for column, ref in fixture.get("refs", {}).items():
+        table = Base.metadata.tables[ref["table"]]
+        natural_key = table.c[ref["key"]]
+        values = {row[column] for row in rows if row.get(column) is not None}
+        query = select(natural_key, table.c.id).where(natural_key.in_(values))
+        if ref.get("scope"):
+            (scope,) = await _resolve_refs(
+                session,
+                {
+                    "table": ref["table"],
+                    "rows": [ref["scope"]],
+                    "refs": ref.get("refs", {}),
+                },
+            )
+            query = query.where(
+                *(table.c[name] == value for name, value in scope.items())
+            )
+        result = await session.execute(query)
+        ids = {
+            value: db_row["id"]
+            for (value,), db_row in _index_by_key(
+                table, [ref["key"]], result.mappings()
+            ).items()
+        }
+        missing = values - ids.keys()
+        if missing:
+            raise ValueError(
+                f"{fixture['table']}.{column}: unknown {ref['table']}"
+                f" {', '.join(map(str, sorted(missing)))}"
+            )
+        for row in rows:
+            if row.get(column) is not None:
+                row[column] = ids[row[column]]
+    return rows
+
+
+async def load_fixture(
+    session: AsyncSession, fixture: dict[str, Any]
+) -> SeedResult:
+    """
+    Inserts the missing rows of a fixture and updates the changed ones,
+    with one statement per set of columns.
+    """
+    table = Base.metadata.tables[fixture["table"]]
+    key = fixture["key"]
+    seed_result = SeedResult(table.name)
+    rows = await _resolve_refs(session, fixture)
+    if not rows:
+        return seed_result
+
+    columns = {column for row in rows for column in row}
+    if "id" in table.c:
+        columns.add("id")
+    result = await session.execute(
+        select(*[table.c[column] for column in sorted(columns)]).where(
+            *(table.c[k].in_({row[k] for row in rows}) for k in key)
+        )
+    )
+    existing = _index_by_key(table, key, result.mappings())
+
+    new_rows, changed_rows = [], []
+    for row in rows:
+        db_row = existing.get(tuple(row[k] for k in key))
+        if db_row is None:
+            new_rows.append(row)
+        elif any(db_row[column] != value for column, value in row.items()):
+            changed_rows.append(
+                {f"v_{column}": value for column, value in row.items()}
+                | {"v_id": db_row["id"]}
+            )
+        else:
+            seed_result.unchanged += 1
+
+    for group in _group_by_columns(new_rows):
+        await session.execute(insert(table), group)
+    seed_result.inserted = len(new_rows)
+
+    if not fixture.get("update", True):
+        seed_result.unchanged += len(changed_rows)
+        return seed_result
+    for group in _group_by_columns(changed_rows):
+        await session.execute(
+            update(table)
+            .where(table.c.id == bindparam("v_id"))
+            .values(
+                {
+                    name[2:]: bindparam(name)
+                    for name in group[0]
+                    if name != "v_id"
+                }
+            ),
+            group,
+        )
+    seed_result.updated = len(changed_rows)
+    return seed_result
+
+
+async def load_fixtures(
+    session: AsyncSession, path: Path = FIXTURES_DIR
+) -> list[SeedResult]:
+    """
+    Loads the fixtures of a directory in the session transaction.
+
+    Loading the same fixtures again only applies the differences. The
+    caller commits.
+    """
+    results = [
+        await load_fixture(session, fixture) for fixture in read_fixtures(path)
+    ]
+    catalog_tables = {model.__tablename__ for model in CATALOG_TABLES.values()}
+    if any(
+        result.table in catalog_tables and (result.inserted or result.updated)
+        for result in results
+    ):
+        await bump_catalog_version(session)
+    return results
@@ -0,0 +1,32 @@
+""" Email delivery """
+
+from .fanout import (
+    FanOutProgress,
+    FanOutWorker,
+    create_notification,
+    delivery_status,
+    fan_out,
+    fan_out_chunk,
+    fan_out_worker,
+    start_fan_out_worker,
+)
+from .outbox import build_message, enqueue_email
+from .smtp import SMTPTransport
+from .worker import OutboxWorker, RateLimiter, start_outbox_worker
+
+__all__ = [
+    "FanOutProgress",
+    "FanOutWorker",
+    "OutboxWorker",
+    "RateLimiter",
+    "SMTPTransport",
+    "build_message",
+    "create_notification",
+    "delivery_status",
+    "enqueue_email",
+    "fan_out",
+    "fan_out_chunk",
+    "fan_out_worker",
+    "start_fan_out_worker",
+    "start_outbox_worker",
+]
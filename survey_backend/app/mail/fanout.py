@@ -0,0 +1,234 @@
+""" Notification fan-out to the opted-in users """
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import settings
+from app.db.database import DBManager
+from app.db.models import (
+    EmailOutbox,
+    EmailStatusEnum,
+    FanOutStatusEnum,
+    Notification,
+    User,
+)
+from app.metrics import register_metrics_source
+
+logger = logging.getLogger("auth_logger")
+
+
+@dataclass
+class FanOutProgress:
+    """
+    Progress of a notification fan-out, reported after each chunk.
+    """
+
+    notification_id: int
+    enqueued: int
+    done: bool
+
+
+def recipients_query():
+    """
+    Ids and emails of the users who opted in to notifications.
+    """
+    return (
+        select(User.id, User.email)
+        .where(User.notifications.is_(True))
+        .where(User.deleted.is_(False))
+        .where(User.email.is_not(None))
+        .order_by(User.id)
+    )
+
+
+async def create_notification(
+    session: AsyncSession,
+    subject: str,
+    body: str,
+    *,
+    created_by: int | None = None,
+) -> Notification:
+    """
+    Queues a notification, fanned out to its recipients by `fan_out_chunk`.
+    """
+    notification = Notification(
+        subject=subject, body=body, created_by=created_by
+    )
+    session.add(notification)
+    await session.commit()
+    return notification
+
+
+async def fan_out_chunk(
+    session: AsyncSession,
+    chunk_size: int = settings.email_outbox_settings.fanout_chunk_size,
+    notification_id: int | None = None,
+) -> FanOutProgress | None:
+    """
+    Enqueues the next `chunk_size` recipients of the oldest notification
+    not fanned out yet, or of `notification_id`, in one transaction.
+
+    The notification is locked with FOR UPDATE SKIP LOCKED, so several
+    workers can run the fan-outs, and its progress is committed with the
+    chunk, so a fan-out resumes where it stopped.
+
+    Returns the progress of the notification, None if none is left.
+    """
+    query = (
+        select(Notification)
+        .where(
+            Notification.status.in_(
+                [FanOutStatusEnum.QUEUED.value, FanOutStatusEnum.RUNNING.value]
+            )
+        )
+        .order_by(Notification.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if notification_id is not None:
+        query = query.where(Notification.id == notification_id)
+    notification = await session.scalar(query)
+    if notification is None:
+        await session.rollback()
+        return None
+
+    result = await session.execute(
+        recipients_query()
+        .where(User.id > notification.last_user_id)
+        .limit(chunk_size)
+    )
+    chunk = result.all()
+    if chunk:
+        await session.execute(
+            insert(EmailOutbox),
+            [
+                {
+                    "recipient": recipient.email,
+                    "subject": notification.subject,
+                    "body": notification.body,
+                    "notification_id": notification.id,
+                }
+                for recipient in chunk
+            ],
+        )
+        notification.recipients += len(chunk)
+        notification.last_user_id = chunk[-1].id
+    done = len(chunk) < chunk_size
+    notification.status = (
+        FanOutStatusEnum.DONE.value if done else FanOutStatusEnum.RUNNING.value
+    )
+    await session.commit()
+    if done:
+        logger.info(
+            f"Notification {notification.id} enqueued for"
+            f" {notification.recipients} users"
+        )
+    return FanOutProgress(notification.id, notification.recipients, done)
+
+
+async def fan_out(
+    session: AsyncSession,
+    subject: str,
+    body: str,
+    *,
+    created_by: int | None = None,
+    chunk_size: int = settings.email_outbox_settings.fanout_chunk_size,
+    on_progress: Callable[[FanOutProgress], None] | None = None,
+) -> Notification:
+    """
+    Enqueues one email per opted-in user in the outbox, a chunk per
+    transaction.
+    """
+    notification = await create_notification(
+        session, subject, body, created_by=created_by
+    )
+    while True:
+        progress = await fan_out_chunk(session, chunk_size, notification.id)
+        if progress is None:
+            break
+        if on_progress is not None:
+            on_progress(progress)
+        if progress.done:
+            break
+    return notification
+
+
+class FanOutWorker:
+    """
+    Runs the queued notification fan-outs in the background, waking up on
+    `notify` or every `poll_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = settings.email_outbox_settings.fanout_chunk_size,
+        poll_interval: float = settings.email_outbox_settings.poll_interval,
+    ):
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.chunks = 0
+        self._wakeup = asyncio.Event()
+
+    def notify(self) -> None:
+        """
+        Tells the worker a notification was queued.
+        """
+        self._wakeup.set()
+
+    async def run(self, db_manager_factory: Callable[[], DBManager]) -> None:
+        """
+        Fans out the queued notifications until cancelled.
+        """
+        while True:
+            progress = None
+            db_manager = db_manager_factory()
+            try:
+                async with db_manager.get_session() as _session:
+                    progress = await fan_out_chunk(_session, self.chunk_size)
+            except Exception:  # pylint: disable = broad-exception-caught
+                logger.exception("Notification fan-out failed")
+            if progress is not None:
+                self.chunks += 1
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def metrics(self) -> dict[str, int]:
+        return {"chunks": self.chunks}
+
+
+fan_out_worker = FanOutWorker()
+
+
+def start_fan_out_worker(
+    db_manager_factory: Callable[[], DBManager]
+) -> asyncio.Task:
+    """
+    Starts the fan-out worker of this process as a background task.
+    """
+    register_metrics_source("notification_fan_out", fan_out_worker.metrics)
+    return asyncio.create_task(fan_out_worker.run(db_manager_factory))
+
+
+async def delivery_status(
+    session: AsyncSession, notification_id: int
+) -> dict[str, int]:
+    """
+    Counts the emails of a notification per delivery status.
+    """
+    result = await session.execute(
+        select(EmailOutbox.status, func.count())
+        .where(EmailOutbox.notification_id == notification_id)
+        .group_by(EmailOutbox.status)
+    )
+    counts = {status.value: 0 for status in EmailStatusEnum}
+    counts.update({status: count for status, count in result.all()})
+    return counts
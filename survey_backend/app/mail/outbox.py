@@ -0,0 +1,34 @@
+""" Email outbox """
+
+from email.message import EmailMessage
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import settings
+from app.db.models import EmailOutbox
+
+
+def enqueue_email(
+    session: AsyncSession, recipient: str, subject: str, body: str
+) -> EmailOutbox:
+    """
+    Adds an email to the outbox.
+
+    The email is committed with the caller's transaction and delivered
+    later by the outbox worker.
+    """
+    email = EmailOutbox(recipient=recipient, subject=subject, body=body)
+    session.add(email)
+    return email
+
+
+def build_message(email: EmailOutbox) -> EmailMessage:
+    """
+    Builds the MIME message of an outbox email.
+    """
+    message = EmailMessage()
+    message["From"] = settings.EMAIL_FROM
+    message["To"] = email.recipient
+    message["Subject"] = email.subject
+    message.set_content(email.body)
+    return message
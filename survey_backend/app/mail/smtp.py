@@ -0,0 +1,89 @@
+""" Reusable SMTP connection """
+
+import asyncio
+import smtplib
+import ssl
+from email.message import EmailMessage
+
+from app import settings
+
+
+class SMTPTransport:
+    """
+    Sends emails over one SMTP connection, kept open between batches.
+
+    smtplib is blocking, so every call runs in a worker thread; a transport
+    must not be used by two tasks at the same time.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        *,
+        use_ssl: bool = True,
+        username: str | None = None,
+        password: str | None = None,
+        timeout: float = 30,
+    ):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.connections = 0
+        self._server: smtplib.SMTP | None = None
+
+    @classmethod
+    def from_settings(cls) -> "SMTPTransport":
+        smtp_settings = settings.smtp_settings
+        return cls(
+            smtp_settings.host,
+            smtp_settings.port,
+            use_ssl=smtp_settings.use_ssl,
+            username=smtp_settings.username or settings.EMAIL_FROM,
+            password=smtp_settings.password or settings.EMAIL_PASS,
+            timeout=smtp_settings.timeout,
+        )
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            server: smtplib.SMTP = smtplib.SMTP_SSL(
+                self.host,
+                self.port,
+                timeout=self.timeout,
+                context=ssl.create_default_context(),
+            )
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.username:
+            server.login(self.username, self.password or "")
+        self.connections += 1
+        return server
+
+    def _send(self, message: EmailMessage) -> None:
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # the server closed the idle connection, reconnect once
+            self._server = self._connect()
+            self._server.send_message(message)
+
+    def _close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        finally:
+            self._server = None
+
+    async def send(self, message: EmailMessage) -> None:
+        await asyncio.to_thread(self._send, message)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._close)
@@ -0,0 +1,258 @@
+""" Email outbox worker """
+
+import asyncio
+import logging
+import random
+import smtplib
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Any, Callable, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import settings
+from app.db.database import DBManager
+from app.db.models import EmailOutbox, EmailStatusEnum
+from app.metrics import register_metrics_source
+
+from .outbox import build_message
+from .smtp import SMTPTransport
+
+logger = logging.getLogger("auth_logger")
+
+# errors which will not go away by retrying
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+
+class RateLimiter:
+    """
+    Spaces out calls to at most `rate` per second, 0 for no limit.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class OutboxWorker:
+    """
+    Delivers the outbox emails in batches over reused SMTP connections.
+
+    Each transport sends one email at a time, so the number of transports
+    bounds the delivery concurrency; `rate_limit` caps the emails sent per
+    second across all of them.
+
+    Failed emails are retried with exponential backoff and moved to the
+    dead-letter state after `max_attempts` attempts. Batches are claimed
+    with FOR UPDATE SKIP LOCKED and leased for `lease` seconds in a short
+    transaction, so several workers can drain the same outbox. The emails
+    are sent outside of any transaction, each result being saved in its
+    own, and a batch whose results are lost is retried after its lease.
+    """
+
+    def __init__(
+        self,
+        transports: SMTPTransport | Sequence[SMTPTransport],
+        *,
+        batch_size: int = settings.email_outbox_settings.batch_size,
+        max_attempts: int = settings.email_outbox_settings.max_attempts,
+        backoff_base: float = settings.email_outbox_settings.backoff_base,
+        backoff_max: float = settings.email_outbox_settings.backoff_max,
+        rate_limit: float = 0,
+        lease: float = settings.email_outbox_settings.lease,
+    ):
+        if isinstance(transports, SMTPTransport):
+            transports = [transports]
+        self.transports = list(transports)
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+
+    def _backoff(self, attempts: int) -> timedelta:
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        # spread the retries of a failed batch
+        return timedelta(seconds=delay * random.uniform(0.9, 1.1))
+
+    async def _claim(
+        self, session: AsyncSession
+    ) -> list[tuple[int, int, EmailMessage]]:
+        """
+        Leases a batch of due emails, counting their attempt.
+
+        Returns the id, attempts and message of the emails claimed.
+        """
+        result = await session.execute(
+            select(EmailOutbox)
+            .where(EmailOutbox.status == EmailStatusEnum.PENDING.value)
+            .where(EmailOutbox.next_attempt_at <= datetime.now())
+            .order_by(EmailOutbox.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        lease_end = datetime.now() + timedelta(seconds=self.lease)
+        batch = []
+        for email in result.scalars():
+            email.attempts += 1
+            # due again if the result of the delivery is lost
+            email.next_attempt_at = lease_end
+            batch.append((email.id, email.attempts, build_message(email)))
+        await session.commit()
+        return batch
+
+    async def _deliver(
+        self,
+        transport: SMTPTransport,
+        email_id: int,
+        attempts: int,
+        message: EmailMessage,
+    ) -> dict[str, Any]:
+        """
+        Sends an email, returning the columns recording the result.
+        """
+        await self.rate_limiter.wait()
+        try:
+            await transport.send(message)
+        except PERMANENT_ERRORS as err:
+            self.dead += 1
+            return {
+                "status": EmailStatusEnum.DEAD.value,
+                "last_error": str(err),
+            }
+        except (smtplib.SMTPException, OSError) as err:
+            logger.warning(f"Email {email_id} delivery failed: {err}")
+            # start over with a new connection
+            await transport.close()
+            self.failed += 1
+            if attempts >= self.max_attempts:
+                self.dead += 1
+                return {
+                    "status": EmailStatusEnum.DEAD.value,
+                    "last_error": str(err),
+                }
+            return {
+                "next_attempt_at": datetime.now() + self._backoff(attempts),
+                "last_error": str(err),
+            }
+        self.sent += 1
+        return {
+            "status": EmailStatusEnum.SENT.value,
+            "sent_on": datetime.now(),
+            "last_error": None,
+        }
+
+    async def _record(
+        self, session: AsyncSession, email_id: int, values: dict[str, Any]
+    ) -> None:
+        try:
+            await session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id == email_id)
+                .values(values)
+            )
+            await session.commit()
+        except SQLAlchemyError:
+            # the email is delivered again once its lease ends
+            logger.exception(f"Email {email_id} delivery result not saved")
+            await session.rollback()
+
+    async def drain(self, session: AsyncSession) -> int:
+        """
+        Delivers one batch of due emails.
+
+        Returns the number of emails processed.
+        """
+        batch = await self._claim(session)
+        queue: asyncio.Queue[tuple[int, int, EmailMessage]] = asyncio.Queue()
+        for claimed in batch:
+            queue.put_nowait(claimed)
+        # the session is shared by the transports
+        session_lock = asyncio.Lock()
+
+        async def consume(transport: SMTPTransport) -> None:
+            while not queue.empty():
+                email_id, attempts, message = queue.get_nowait()
+                values = await self._deliver(
+                    transport, email_id, attempts, message
+                )
+                async with session_lock:
+                    await self._record(session, email_id, values)
+
+        await asyncio.gather(
+            *[consume(transport) for transport in self.transports]
+        )
+        return len(batch)
+
+    async def run(
+        self,
+        db_manager_factory: Callable[[], DBManager],
+        poll_interval: float = settings.email_outbox_settings.poll_interval,
+    ) -> None:
+        """
+        Drains the outbox until cancelled.
+        """
+        try:
+            while True:
+                processed = 0
+                db_manager = db_manager_factory()
+                try:
+                    async with db_manager.get_session() as _session:
+                        processed = await self.drain(_session)
+                except Exception:  # pylint: disable = broad-exception-caught
+                    logger.exception("Email outbox drain failed")
+                if processed < self.batch_size:
+                    await asyncio.sleep(poll_interval)
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """
+        Closes the SMTP connections.
+        """
+        for transport in self.transports:
+            await transport.close()
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "dead": self.dead,
+            "connections": sum(t.connections for t in self.transports),
+        }
+
+
+def start_outbox_worker(
+    db_manager_factory: Callable[[], DBManager]
+) -> asyncio.Task:
+    """
+    Starts the outbox worker of this process as a background task.
+    """
+    outbox_settings = settings.email_outbox_settings
+    worker = OutboxWorker(
+        [
+            SMTPTransport.from_settings()
+            for _ in range(outbox_settings.concurrency)
+        ],
+        rate_limit=outbox_settings.rate_limit,
+    )
+    register_metrics_source("email_outbox", worker.metrics)
+    return asyncio.create_task(worker.run(db_manager_factory))
@@ -1,5 +1,6 @@
 """Main App"""
 
+import asyncio
 from datetime import datetime
 from time import perf_counter
 from typing import Annotated
@@ -14,7 +15,6 @@ from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from jose import jwt
 from pydantic import ValidationError
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
@@ -23,8 +23,33 @@ from app.schemas.validation_exception_handler import (
 )
 
 from . import settings
+from .cache import (
+    RedisBackend,
+    attach_remote_tier,
+    start_invalidation_bus,
+    stop_invalidation_bus,
+)
+from .catalog import question_catalog
+from .db.engines import dispose_engines
+from .db.redis import create_redis_client
 from .db.models import AuthMode, User
-from .dependencies import dbManager
+from .dependencies import dbManager, init_db_manager
+from .mail import start_fan_out_worker, start_outbox_worker
+from .metrics import collect_metrics
+from .middleware import (
+    AdmissionMiddleware,
+    BulkheadMiddleware,
+    DeadlineMiddleware,
+    RateLimitMiddleware,
+    RedisBuckets,
+    TrafficRecorderMiddleware,
+    admission_controller,
+    bulkheads,
+    deadlines,
+    rate_limiter,
+    start_recorder,
+    stop_recorder,
+)
 
 from .routers import auth_router
 
@@ -41,11 +66,24 @@ from .utils import (
     create_access_token,
     create_refresh_token,
     increment_login_attempts_and_get_error_message,
+    is_locked_out,
+    login_query,
+    remember_lockout,
     verify_refresh_token,
 )
+from .user_import import hash_pool
 
 # pylint: disable = invalid-name
 
+LOCKED_OUT_MESSAGE = {
+    "password": (
+        "You have entered the wrong password too many times. "
+        "Please try again later use this {{LINK}} if you have forgotten"
+        " your password."
+    ),
+    "disable_login": True,
+}
+
 
 # create main app
 app = FastAPI(
@@ -70,6 +108,19 @@ async def add_process_time_header(request: Request, call_next):
     return response
 
 
+# within CORS, so the browsers can read the rejections
+if settings.bulkhead_settings.enabled:
+    # outside of the timing middleware, so the route handlers see the pool
+    # slice of their class
+    app.add_middleware(BulkheadMiddleware, bulkheads=bulkheads)
+if settings.deadline_settings.enabled:
+    # the deadline includes the wait in the bulkhead queue
+    app.add_middleware(DeadlineMiddleware, deadlines=deadlines)
+if settings.rate_limit_settings.enabled:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+if settings.admission_settings.enabled:
+    app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # Add CORS Middleware
 app.add_middleware(CORSMiddleware, **settings.CORSSettings().dict())
 
@@ -77,6 +128,15 @@ app.add_middleware(CORSMiddleware, **settings.CORSSettings().dict())
 app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MIN_SIZE)
 app.add_exception_handler(ValidationError, validation_exception_handler)
 
+if settings.traffic_recorder_settings.enabled:
+    # added last, so the outermost middleware timing the whole request
+    app.add_middleware(
+        TrafficRecorderMiddleware,
+        sample_rate=settings.traffic_recorder_settings.sample_rate,
+        capture_bodies=settings.traffic_recorder_settings.capture_bodies,
+        max_body_bytes=settings.traffic_recorder_settings.max_body_bytes,
+    )
+
 
 @app.get("/openapi.json", include_in_schema=False)
 async def get_openapi_spec(x_api_key: Annotated[str | None, Header()] = None):
@@ -107,6 +167,17 @@ async def get_api_docs(x_api_key: Annotated[str | None, Header()] = None):
     )
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(x_api_key: Annotated[str | None, Header()] = None):
+    if settings.SYSTEM_API_KEY and x_api_key == settings.SYSTEM_API_KEY:
+        return collect_metrics()
+
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail={"global": "You are not authorized to see the metrics."},
+    )
+
+
 app.include_router(auth_router)
 app.include_router(auth_router)
 
@@ -120,10 +191,15 @@ async def token(
     """Authenticate user and generates an authentication token on success"""
     # load user from database
     _session: AsyncSession
+    # locked out accounts are rejected before the lookup and the hashing
+    if await is_locked_out(form_data.username):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=LOCKED_OUT_MESSAGE,
+        )
+
     async with db_manager.get_session() as _session:
-        username = form_data.username.lower()
-        stmt = select(User).where((User.email == username) | (User.name == username))
-        result = await _session.execute(stmt)
+        result = await _session.execute(login_query(form_data.username))
         user: User = result.scalars().first()
 
         email_verified = True
@@ -145,15 +221,10 @@ async def token(
             )
 
         if user.enabled is False:
+            await remember_lockout(form_data.username)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={
-                    "password": (
-                        "You have entered the wrong password too many times. "
-                        "Please try again later use this {{LINK}} if you have forgotten your password."
-                    ),
-                    "disable_login": True,
-                },
+                detail=LOCKED_OUT_MESSAGE,
             )
 
         if user.auth_mode == AuthMode.LOCAL:
@@ -304,7 +375,64 @@ async def token_verification_exception_handler(
     )
 
 
+@app.on_event("startup")
+async def startup_event():
+    if settings.traffic_recorder_settings.enabled:
+        start_recorder()
+    if settings.admission_settings.enabled:
+        admission_controller.loop_lag.start()
+    if settings.redis_settings.enabled:
+        # use Redis as shared cache tier
+        app.state.redis_client = create_redis_client()  # type: ignore
+        attach_remote_tier(
+            RedisBackend(app.state.redis_client),  # type: ignore
+            ttl=settings.redis_settings.ttl,
+        )
+        if settings.rate_limit_settings.backend == "redis":
+            # buckets shared by the workers
+            rate_limiter.backend = RedisBuckets(
+                app.state.redis_client  # type: ignore
+            )
+    hash_pool.start()
+    if settings.email_outbox_settings.worker_enabled:
+        app.state.email_outbox_task = start_outbox_worker(  # type: ignore
+            init_db_manager
+        )
+        app.state.fan_out_task = start_fan_out_worker(  # type: ignore
+            init_db_manager
+        )
+    await start_invalidation_bus(
+        settings.CACHE_INVALIDATION_BACKEND,
+        redis_client=getattr(app.state, "redis_client", None),
+        database_uri=settings.LIVE_DATABASE_LEADER_URI,
+    )
+    if settings.QUESTION_CATALOG_ENABLED:
+        # load (or build) the question catalog snapshot
+        db_manager = init_db_manager()
+        async with db_manager.get_session() as _session:
+            await question_catalog.sync(_session)
+        question_catalog.enabled = True
+        app.state.catalog_refresh_task = asyncio.create_task(  # type: ignore
+            question_catalog.refresh_periodically(
+                init_db_manager, settings.QUESTION_CATALOG_REFRESH_INTERVAL
+            )
+        )
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
+    if hasattr(app.state, "catalog_refresh_task"):  # type: ignore
+        app.state.catalog_refresh_task.cancel()  # type: ignore
+    if hasattr(app.state, "email_outbox_task"):  # type: ignore
+        app.state.email_outbox_task.cancel()  # type: ignore
+    if hasattr(app.state, "fan_out_task"):  # type: ignore
+        app.state.fan_out_task.cancel()  # type: ignore
+    question_catalog.close()
+    hash_pool.shutdown()
+    await stop_invalidation_bus()
     if hasattr(app.state, "redis_client"):  # type: ignore
-        await app.state.redis_client.disconnect()  # type: ignore
+        attach_remote_tier(None)
+        await app.state.redis_client.close()  # type: ignore
+    await admission_controller.loop_lag.stop()
+    await dispose_engines()
+    stop_recorder()
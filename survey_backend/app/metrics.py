@@ -0,0 +1,20 @@
+""" Runtime metrics """
+
+from typing import Any, Callable
+
+# name -> callable returning the current metrics of a component
+_sources: dict[str, Callable[[], Any]] = {}
+
+
+def register_metrics_source(name: str, source: Callable[[], Any]) -> None:
+    """
+    Registers a component reporting its metrics under `name`
+    """
+    _sources[name] = source
+
+
+def collect_metrics() -> dict[str, Any]:
+    """
+    Returns the current metrics of all registered components
+    """
+    return {name: source() for name, source in _sources.items()}
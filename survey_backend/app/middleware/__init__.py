@@ -0,0 +1,50 @@
+""" ASGI middlewares """
+
+from .admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    LoopLagMonitor,
+    admission_controller,
+)
+from .bulkhead import Bulkhead, BulkheadMiddleware, Bulkheads, bulkheads
+from .deadline import DeadlineMiddleware, Deadlines, deadlines
+from .ratelimit import (
+    LocalBuckets,
+    RateLimiter,
+    RateLimitMiddleware,
+    RedisBuckets,
+    rate_limiter,
+)
+from .recorder import (
+    TrafficRecorderMiddleware,
+    record,
+    sanitize,
+    shape,
+    start_recorder,
+    stop_recorder,
+)
+
+__all__ = [
+    "AdmissionController",
+    "AdmissionMiddleware",
+    "Bulkhead",
+    "BulkheadMiddleware",
+    "Bulkheads",
+    "DeadlineMiddleware",
+    "Deadlines",
+    "LocalBuckets",
+    "LoopLagMonitor",
+    "RateLimitMiddleware",
+    "RateLimiter",
+    "RedisBuckets",
+    "TrafficRecorderMiddleware",
+    "admission_controller",
+    "bulkheads",
+    "deadlines",
+    "rate_limiter",
+    "record",
+    "sanitize",
+    "shape",
+    "start_recorder",
+    "stop_recorder",
+]
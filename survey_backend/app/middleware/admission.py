@@ -0,0 +1,164 @@
+""" Admission control, shedding the load of an overloaded worker """
+
+import asyncio
+import logging
+from fnmatch import fnmatchcase
+from time import monotonic
+from typing import Any, Callable
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app import settings
+from app.db.pool import pool_wait
+from app.metrics import register_metrics_source
+
+logger = logging.getLogger("auth_logger")
+
+OVERLOADED_MESSAGE = "The service is overloaded, try again later."
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop runs a callback scheduled every
+    `interval` seconds, a loop busy with CPU work being late for every
+    request.
+    """
+
+    def __init__(self, interval: float = 0.1, smoothing: float = 0.3):
+        self.interval = interval
+        self.smoothing = smoothing
+        self.lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            start = monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, monotonic() - start - self.interval)
+            self.lag += self.smoothing * (lag - self.lag)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.lag = 0.0
+
+
+class AdmissionController:
+    """
+    Tracks the requests in flight and tells the ones to reject, from the
+    number of requests in flight, the wait for a database connection and
+    the event loop lag.
+    """
+
+    def __init__(
+        self,
+        config: settings.AdmissionSettings | None = None,
+        pool_wait: Callable[[], float] = pool_wait,
+    ):
+        # pylint: disable = redefined-outer-name
+        self.config = config or settings.admission_settings
+        self.pool_wait = pool_wait
+        self.loop_lag = LoopLagMonitor(self.config.loop_lag_interval)
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected: dict[str, int] = {}
+        self.shedding = False
+        self._priority = [
+            route.split(" ", 1) for route in self.config.priority_routes
+        ]
+
+    def is_priority(self, method: str, path: str) -> bool:
+        return any(
+            route_method in ("*", method) and fnmatchcase(path, pattern)
+            for route_method, pattern in self._priority
+        )
+
+    def overload(self, priority: bool = False) -> str | None:
+        """
+        Returns the reason to reject a request, None to admit it.
+        """
+        config = self.config
+        if priority:
+            if self.in_flight >= config.max_priority_in_flight:
+                return "in_flight"
+            return None
+        if self.in_flight >= config.max_in_flight:
+            return "in_flight"
+        if self.pool_wait() * 1000 > config.max_pool_wait_ms:
+            return "pool_wait"
+        if self.loop_lag.lag * 1000 > config.max_loop_lag_ms:
+            return "loop_lag"
+        return None
+
+    def reject(self, reason: str) -> None:
+        if not self.shedding:
+            logger.warning(f"Overloaded ({reason}), shedding the requests")
+            self.shedding = True
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def admit(self, priority: bool = False) -> None:
+        if self.shedding and not priority:
+            logger.info("No longer overloaded")
+            self.shedding = False
+        self.in_flight += 1
+        self.admitted += 1
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "pool_wait_ms": round(self.pool_wait() * 1000, 3),
+            "loop_lag_ms": round(self.loop_lag.lag * 1000, 3),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+
+admission_controller = AdmissionController()
+register_metrics_source("admission", lambda: admission_controller.metrics())
+
+
+class AdmissionMiddleware:
+    """
+    Rejects the requests an overloaded worker would serve too late with a
+    503 and a Retry-After header, so the clients back off instead of
+    piling up in the connection pool queue. The priority routes keep being
+    served.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        controller = self.controller
+        priority = controller.is_priority(scope["method"], scope["path"])
+        reason = controller.overload(priority)
+        if reason is not None:
+            controller.reject(reason)
+            response = JSONResponse(
+                {"detail": {"global": OVERLOADED_MESSAGE}},
+                status_code=503,
+                headers={"Retry-After": str(controller.config.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        controller.admit(priority)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.in_flight -= 1
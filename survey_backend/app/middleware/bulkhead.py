@@ -0,0 +1,162 @@
+""" Bulkheads: concurrency limits per class of routes """
+
+import asyncio
+from fnmatch import fnmatchcase
+from time import perf_counter
+from typing import Any
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app import settings
+from app.db.engines import pool_slice
+from app.metrics import register_metrics_source
+
+BUSY_MESSAGE = "The service is busy, try again later."
+
+
+class Bulkhead:
+    """
+    Semaphore of a class of routes. Past `max_concurrency`, the requests
+    wait for their turn up to `queue_timeout` seconds, and the ones beyond
+    `max_queue` are rejected right away.
+    """
+
+    def __init__(self, name: str, config: settings.BulkheadClass):
+        self.name = name
+        self.config = config
+        self.routes = [route.split(" ", 1) for route in config.routes]
+        self._semaphore = asyncio.Semaphore(config.max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.peak_active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    def matches(self, method: str, path: str) -> bool:
+        return any(
+            route_method in ("*", method) and fnmatchcase(path, pattern)
+            for route_method, pattern in self.routes
+        )
+
+    async def acquire(self) -> bool:
+        """
+        Waits for a free slot, returning False if the request is rejected.
+        """
+        if self._semaphore.locked() and self.waiting >= self.config.max_queue:
+            self.rejected += 1
+            return False
+        start = perf_counter()
+        self.waiting += 1
+        acquired = False
+        try:
+            # the acquire runs in this task, wait_for could lose its permit
+            async with asyncio.timeout(self.config.queue_timeout):
+                await self._semaphore.acquire()
+                acquired = True
+        except BaseException as err:
+            # the permit may be granted as the wait is cancelled
+            if acquired:
+                self._semaphore.release()
+            if not isinstance(err, TimeoutError):
+                raise
+            self.timeouts += 1
+            return False
+        finally:
+            self.waiting -= 1
+            self.wait_seconds += perf_counter() - start
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "max_concurrency": self.config.max_concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "saturation": round(self.active / self.config.max_concurrency, 4),
+            "peak_active": self.peak_active,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "mean_wait_ms": round(
+                self.wait_seconds / (self.admitted + self.timeouts) * 1000, 3
+            )
+            if self.admitted + self.timeouts
+            else 0.0,
+            "pool_slice": self.config.pool_size is not None,
+        }
+
+
+class Bulkheads:
+    """
+    Bulkheads of the route classes, in the order they are matched.
+    """
+
+    def __init__(self, config: settings.BulkheadSettings | None = None):
+        self.config = config or settings.bulkhead_settings
+        self.classes = [
+            Bulkhead(name, bulkhead)
+            for name, bulkhead in self.config.classes.items()
+        ]
+
+    def classify(self, method: str, path: str) -> Bulkhead | None:
+        for bulkhead in self.classes:
+            if bulkhead.matches(method, path):
+                return bulkhead
+        return None
+
+    def metrics(self) -> dict[str, Any]:
+        return {bulkhead.name: bulkhead.metrics() for bulkhead in self.classes}
+
+
+bulkheads = Bulkheads()
+register_metrics_source("bulkheads", lambda: bulkheads.metrics())
+
+
+class BulkheadMiddleware:
+    """
+    Runs each request within the bulkhead of its route class, using the
+    leader pool of the class when it has one. The requests a class cannot
+    take get a 503 with a Retry-After header.
+    """
+
+    def __init__(self, app: ASGIApp, bulkheads: Bulkheads):
+        # pylint: disable = redefined-outer-name
+        self.app = app
+        self.bulkheads = bulkheads
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        bulkhead = None
+        if scope["type"] == "http":
+            bulkhead = self.bulkheads.classify(scope["method"], scope["path"])
+        if bulkhead is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await bulkhead.acquire():
+            response = JSONResponse(
+                {"detail": {"global": BUSY_MESSAGE}},
+                status_code=503,
+                headers={
+                    "Retry-After": str(self.bulkheads.config.retry_after)
+                },
+            )
+            await response(scope, receive, send)
+            return
+
+        token = pool_slice.set(
+            bulkhead.name if bulkhead.config.pool_size is not None else None
+        )
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool_slice.reset(token)
+            bulkhead.release()
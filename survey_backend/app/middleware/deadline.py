@@ -0,0 +1,167 @@
+""" Deadlines of the requests, cancelling the work nobody waits for """
+
+import asyncio
+import logging
+from fnmatch import fnmatchcase
+from time import monotonic
+from typing import Any
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import settings
+from app.db.deadlines import request_deadline
+from app.metrics import register_metrics_source
+
+logger = logging.getLogger("auth_logger")
+
+TIMEOUT_MESSAGE = "The request took too long, try again later."
+
+
+class Deadlines:
+    """
+    Tells the timeout of each request, from its route or the header the
+    client sets, and counts the requests cancelled.
+    """
+
+    def __init__(self, config: settings.DeadlineSettings | None = None):
+        self.config = config or settings.deadline_settings
+        self._routes = [
+            (route.split(" ", 1), seconds)
+            for route, seconds in self.config.routes.items()
+        ]
+        self.timeouts = 0
+        self.disconnects = 0
+
+    def timeout(self, method: str, path: str, headers: Headers) -> float:
+        """
+        Returns the seconds the request is given to complete.
+        """
+        config = self.config
+        timeout = next(
+            (
+                seconds
+                for (route_method, pattern), seconds in self._routes
+                if route_method in ("*", method) and fnmatchcase(path, pattern)
+            ),
+            config.default_timeout,
+        )
+        try:
+            requested = float(headers.get(config.header, ""))
+        except ValueError:
+            return timeout
+        if requested > 0:
+            timeout = min(requested, config.max_timeout)
+        return timeout
+
+    def metrics(self) -> dict[str, Any]:
+        return {"timeouts": self.timeouts, "disconnects": self.disconnects}
+
+
+deadlines = Deadlines()
+register_metrics_source("deadlines", lambda: deadlines.metrics())
+
+
+class DeadlineMiddleware:
+    """
+    Runs each request handler in its own task, cancelled when the client
+    disconnects or the deadline of the request passes, a 504 answering the
+    latter. The deadline is passed on to the database through
+    `request_deadline`, and the queries of a cancelled handler are
+    cancelled server side by asyncpg.
+
+    The body is streamed to the handler as it reads it, never buffered.
+    """
+
+    def __init__(self, app: ASGIApp, deadlines: Deadlines):
+        # pylint: disable = redefined-outer-name
+        self.app = app
+        self.deadlines = deadlines
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timeout = self.deadlines.timeout(
+            scope["method"], scope["path"], Headers(scope=scope)
+        )
+
+        # the watcher is the only reader of the client, one message ahead
+        # of the app, so it sees a disconnect without buffering the body
+        messages: asyncio.Queue[Message] = asyncio.Queue(maxsize=1)
+        disconnected = asyncio.Event()
+        response_started = False
+
+        async def watch_disconnect() -> None:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+                await messages.put(message)
+
+        async def app_receive() -> Message:
+            getter = asyncio.ensure_future(messages.get())
+            waiter = asyncio.ensure_future(disconnected.wait())
+            try:
+                await asyncio.wait(
+                    {getter, waiter}, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                waiter.cancel()
+                if not getter.done():
+                    getter.cancel()
+            if getter.cancelled():
+                return {"type": "http.disconnect"}
+            return getter.result()
+
+        async def app_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        token = request_deadline.set(monotonic() + timeout)
+        try:
+            handler = asyncio.create_task(
+                self.app(scope, app_receive, app_send)
+            )
+        finally:
+            request_deadline.reset(token)
+        watcher = asyncio.create_task(watch_disconnect())
+        disconnect = asyncio.create_task(disconnected.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {handler, disconnect},
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            watcher.cancel()
+            disconnect.cancel()
+            if not handler.done():
+                handler.cancel()
+                # let the handler roll back and release its connection
+                await asyncio.wait({handler})
+
+        if handler in done:
+            handler.result()
+            return
+        if disconnect in done:
+            self.deadlines.disconnects += 1
+            logger.info(
+                "Client disconnected, cancelled"
+                f" {scope['method']} {scope['path']}"
+            )
+            return
+        self.deadlines.timeouts += 1
+        logger.warning(
+            f"Deadline of {timeout}s passed, cancelled"
+            f" {scope['method']} {scope['path']}"
+        )
+        if not response_started:
+            response = JSONResponse(
+                {"detail": {"global": TIMEOUT_MESSAGE}}, status_code=504
+            )
+            await response(scope, app_receive, send)
@@ -0,0 +1,293 @@
+""" Token bucket rate limiting, per client IP, user or API key """
+
+import logging
+import math
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from hashlib import sha256
+from time import monotonic
+from typing import Any, Protocol
+
+from jose import jwt
+from jose.exceptions import JWTError
+from redis.exceptions import RedisError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app import settings
+from app.cache import InMemoryRedis
+from app.metrics import register_metrics_source
+
+logger = logging.getLogger("auth_logger")
+
+# KEYS[1]: bucket, ARGV: rate (tokens per second), burst, cost
+# returns whether the request is allowed and the seconds to wait otherwise,
+# as a string since Redis truncates the Lua numbers to integers
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+def refill(
+    tokens: float,
+    updated: float,
+    now: float,
+    rate: float,
+    burst: float,
+    cost: float = 1,
+) -> tuple[bool, float, float]:
+    """
+    Takes `cost` tokens from a bucket holding `tokens` at time `updated`.
+
+    Returns whether the tokens were taken, the tokens left and the seconds
+    to wait for enough tokens.
+    """
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class BucketBackend(Protocol):
+    """
+    Storage of the token buckets.
+    """
+
+    async def take(
+        self, key: str, rate: float, burst: float, cost: float = 1
+    ) -> tuple[bool, float]:
+        """
+        Returns whether the request is allowed and the seconds to wait
+        otherwise.
+        """
+        ...
+
+
+class LocalBuckets:
+    """
+    Buckets of the worker process, the least recently used ones dropped
+    past `max_buckets`. A dropped bucket is full again, as after a long
+    idle time.
+    """
+
+    def __init__(self, max_buckets: int = 100_000):
+        self.max_buckets = max_buckets
+        # key -> (tokens, updated)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(
+        self, key: str, rate: float, burst: float, cost: float = 1
+    ) -> tuple[bool, float]:
+        now = monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        allowed, tokens, retry_after = refill(
+            tokens, updated, now, rate, burst, cost
+        )
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class RedisBuckets:
+    """
+    Buckets shared by the workers in Redis, updated by a Lua script so
+    concurrent requests never race. Redis failures let the requests
+    through.
+    """
+
+    def __init__(self, client, prefix: str = "wis:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self.errors = 0
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(
+        self, key: str, rate: float, burst: float, cost: float = 1
+    ) -> tuple[bool, float]:
+        try:
+            allowed, retry_after = await self._script(
+                keys=[self.prefix + key], args=[rate, burst, cost]
+            )
+        except RedisError as err:
+            self.errors += 1
+            logger.warning(f"Redis rate limit failed: {err}")
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+
+async def _emulate_token_bucket(
+    redis: InMemoryRedis, keys: list[str], args: list[Any]
+) -> list[Any]:
+    rate, burst, cost = (float(arg) for arg in args)
+    now = monotonic()
+    tokens, updated = await redis.get(keys[0]) or (burst, now)
+    allowed, tokens, retry_after = refill(
+        tokens, updated, now, rate, burst, cost
+    )
+    await redis.set(keys[0], (tokens, now), px=math.ceil(burst / rate * 1000))
+    return [int(allowed), str(retry_after)]
+
+
+InMemoryRedis.scripts[TOKEN_BUCKET_SCRIPT] = _emulate_token_bucket
+
+
+def _client_ip(scope: Scope, headers: dict[str, str], forwarded: bool):
+    if forwarded and "x-forwarded-for" in headers:
+        return headers["x-forwarded-for"].split(",", 1)[0].strip()
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+def _user(headers: dict[str, str]) -> str | None:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        # verified, a forged subject would get a fresh bucket every time
+        claims = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.HASH_ALGORITHM]
+        )
+    except JWTError:
+        return None
+    return claims.get("sub")
+
+
+class RateLimiter:
+    """
+    Applies the rules matching a request, taking a token from the bucket of
+    each of them.
+    """
+
+    def __init__(
+        self,
+        rules: list[settings.RateLimitRule],
+        backend: BucketBackend | None = None,
+        trust_forwarded: bool = False,
+    ):
+        self.rules = rules
+        self.backend: BucketBackend = backend or LocalBuckets()
+        self.trust_forwarded = trust_forwarded
+        self.stats = {
+            self._name(rule): {"allowed": 0, "rejected": 0} for rule in rules
+        }
+
+    @staticmethod
+    def _name(rule: settings.RateLimitRule) -> str:
+        return f"{rule.method} {rule.path} {rule.scope}"
+
+    @classmethod
+    def from_settings(
+        cls, config: settings.RateLimitSettings | None = None
+    ) -> "RateLimiter":
+        config = config or settings.rate_limit_settings
+        return cls(
+            config.rules,
+            LocalBuckets(config.max_buckets),
+            trust_forwarded=config.trust_forwarded,
+        )
+
+    def _identity(
+        self, rule: settings.RateLimitRule, scope: Scope, headers: dict
+    ) -> str | None:
+        """
+        Returns the identity the bucket of the rule is keyed by, the client
+        IP for the requests without a user or API key.
+        """
+        match rule.scope:
+            case "user":
+                user = _user(headers)
+                if user is not None:
+                    return f"user:{user}"
+            case "api_key":
+                key = headers.get("access_key")
+                if key:
+                    # the keys are not stored in the bucket names
+                    return f"api_key:{sha256(key.encode()).hexdigest()[:32]}"
+        ip = _client_ip(scope, headers, self.trust_forwarded)
+        return f"ip:{ip}" if ip is not None else None
+
+    async def check(self, scope: Scope) -> float | None:
+        """
+        Returns the seconds to wait if the request is rejected, None if it
+        is allowed.
+        """
+        headers: dict[str, str] | None = None
+        for rule in self.rules:
+            if rule.method not in ("*", scope["method"]) or not fnmatchcase(
+                scope["path"], rule.path
+            ):
+                continue
+            if headers is None:
+                headers = {
+                    name.decode("latin-1"): value.decode("latin-1")
+                    for name, value in scope["headers"]
+                }
+            identity = self._identity(rule, scope, headers)
+            if identity is None:
+                continue
+            name = self._name(rule)
+            allowed, retry_after = await self.backend.take(
+                f"{name}:{identity}", rule.rate, rule.burst
+            )
+            if not allowed:
+                self.stats[name]["rejected"] += 1
+                return retry_after
+            self.stats[name]["allowed"] += 1
+        return None
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "errors": getattr(self.backend, "errors", 0),
+            "rules": self.stats,
+        }
+
+
+rate_limiter = RateLimiter.from_settings()
+register_metrics_source("rate_limit", lambda: rate_limiter.metrics())
+
+
+class RateLimitMiddleware:
+    """
+    Rejects the requests over their rate limits with a 429 and the seconds
+    to wait in the Retry-After header, before any other work is done.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        retry_after = await self.limiter.check(scope)
+        if retry_after is None:
+            await self.app(scope, receive, send)
+            return
+        response = JSONResponse(
+            {"detail": {"global": "Too many requests, try again later."}},
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,231 @@
+""" Recorder of the served requests, as sanitized NDJSON traces """
+
+import logging
+import queue
+import random
+import re
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any
+from urllib.parse import parse_qsl
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import settings
+
+# values of the matching fields, parameters and headers are not recorded
+SECRET_PATTERN = re.compile(
+    r"pass|secret|token|key|authorization|credential|cookie", re.IGNORECASE
+)
+REDACTED = "***"
+FORM_CONTENT_TYPE = "application/x-www-form-urlencoded"
+
+logger = logging.getLogger("auth_logger")
+_trace_logger = logging.getLogger("traffic_recorder")
+_trace_logger.propagate = False
+_listener: QueueListener | None = None
+
+
+def sanitize(value: Any) -> Any:
+    """
+    Returns `value` with the values of the secret fields redacted, at any
+    depth.
+    """
+    if isinstance(value, dict):
+        return {
+            key: REDACTED
+            if SECRET_PATTERN.search(str(key))
+            else sanitize(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+def shape(value: Any) -> Any:
+    """
+    Describes the structure of a JSON value without its data: the type of
+    each field, and the length and item shape of the arrays.
+    """
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return {
+            "length": len(value),
+            "item": shape(value[0]) if value else None,
+        }
+    return type(value).__name__
+
+
+def _parse_body(content_type: str, body: bytes) -> Any:
+    if content_type.startswith(FORM_CONTENT_TYPE):
+        return dict(parse_qsl(body.decode(errors="replace")))
+    if content_type.startswith("application/json"):
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return None
+    # files are never recorded
+    return None
+
+
+def _auth_scheme(headers: dict[str, str]) -> str | None:
+    if "authorization" in headers:
+        return headers["authorization"].split(" ", 1)[0].lower()
+    if "access_key" in headers:
+        return "api_key"
+    return None
+
+
+def start_recorder(
+    config: settings.TrafficRecorderSettings | None = None,
+) -> None:
+    """
+    Starts writing the recorded requests to the rotating trace files, from
+    a thread so the requests never wait for the disk.
+    """
+    global _listener  # pylint: disable = global-statement
+    if _listener is not None:
+        return
+    config = config or settings.traffic_recorder_settings
+    config.path.parent.mkdir(parents=True, exist_ok=True)
+    file_handler = RotatingFileHandler(
+        config.path,
+        maxBytes=config.max_bytes,
+        backupCount=config.backup_count,
+        encoding="utf-8",
+    )
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _trace_logger.handlers = [QueueHandler(records)]
+    _trace_logger.setLevel(logging.INFO)
+    _listener = QueueListener(records, file_handler)
+    _listener.start()
+    logger.info(f"Recording the requests to {config.path}")
+
+
+def stop_recorder() -> None:
+    """
+    Writes the pending traces and closes the trace file.
+    """
+    global _listener  # pylint: disable = global-statement
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _trace_logger.handlers = []
+    _listener = None
+
+
+def record(trace: dict[str, Any]) -> None:
+    """
+    Queues a trace for writing, if the recorder is started.
+    """
+    if _listener is not None:
+        _trace_logger.info(orjson.dumps(trace).decode())
+
+
+class TrafficRecorderMiddleware:
+    """
+    Records the HTTP requests: route, sanitized parameters and body, body
+    shape, status and duration.
+
+    Secret values are redacted and the Authorization header is reduced to
+    its scheme, so the traces can be shared and replayed against a test
+    instance.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: float = 1.0,
+        capture_bodies: bool = True,
+        max_body_bytes: int = 64 * 1024,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.capture_bodies = capture_bodies
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        chunks: list[bytes] = []
+        request_bytes = 0
+        status = 500
+        response_bytes = 0
+
+        async def receive_and_copy() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                if request_bytes + len(body) <= self.max_body_bytes:
+                    chunks.append(body)
+                request_bytes += len(body)
+            return message
+
+        async def send_and_measure(message: Message) -> None:
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_and_copy, send_and_measure)
+        finally:
+            duration = time.perf_counter() - start
+            # bodies too large are not recorded
+            body = (
+                b"".join(chunks)
+                if request_bytes <= self.max_body_bytes
+                else None
+            )
+            record(
+                self._trace(
+                    scope,
+                    body,
+                    request_bytes=request_bytes,
+                    started=started,
+                    duration=duration,
+                    status=status,
+                    response_bytes=response_bytes,
+                )
+            )
+
+    def _trace(
+        self, scope: Scope, body: bytes | None, **measures: Any
+    ) -> dict[str, Any]:
+        headers = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        content_type = headers.get("content-type", "")
+        data = _parse_body(content_type, body) if body else None
+        # the router stores the matched route in the scope
+        route = scope.get("route")
+        return {
+            "ts": round(measures["started"], 6),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "query": sanitize(
+                dict(parse_qsl(scope["query_string"].decode("latin-1")))
+            ),
+            "auth": _auth_scheme(headers),
+            "content_type": content_type.split(";", 1)[0] or None,
+            "body": sanitize(data) if self.capture_bodies else None,
+            "shape": shape(data) if data is not None else None,
+            "request_bytes": measures["request_bytes"],
+            "status": measures["status"],
+            "response_bytes": measures["response_bytes"],
+            "duration_ms": round(measures["duration"] * 1000, 3),
+        }
@@ -1,4 +1,18 @@
 from . import models
-from .builder import FormMigrationDataBuilder
+from .builder import FormMigrationDataBuilder, TableExport
+from .loader import (
+    MigrationDataError,
+    TableLoad,
+    load_migration_data,
+    read_records,
+)
 
-__all__ = ["FormMigrationDataBuilder", "models"]
+__all__ = [
+    "FormMigrationDataBuilder",
+    "MigrationDataError",
+    "TableExport",
+    "TableLoad",
+    "load_migration_data",
+    "models",
+    "read_records",
+]
@@ -1,57 +1,163 @@
-import json
+import hashlib
+import os
 from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator
+
+import dictdiffer
+import orjson
+from sqlalchemy import Table, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import settings
+from ..db.database import Base
 
-from .models import *
+# tables described by the migration data models
+EXPORT_TABLES = ("wis_group", "wis_user", "wis_user_group")
+MANIFEST = "manifest.json"
+
+
+@dataclass
+class TableExport:
+    """
+    Outcome of the export of a table, the counts being relative to the
+    previous export.
+    """
+
+    table: str
+    rows: int = 0
+    sha256: str = ""
+    added: int = 0
+    removed: int = 0
+    updated: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.updated)
+
+
+def _key_columns(table: Table) -> list:
+    return list(table.primary_key.columns) or list(table.columns)
+
+
+def _previous_rows(path: Path) -> Iterator[tuple[tuple, bytes]]:
+    if not path.exists():
+        return
+    with open(path, "rb") as f_previous:
+        for line in f_previous:
+            key, row = orjson.loads(line)
+            yield tuple(key), orjson.dumps(row)
 
 
 @dataclass
 class FormMigrationDataBuilder:
-    data_dir = settings.BASE_DIR
-    
-
-    def save(self):
-        migration_data_dir = self.data_dir / "migration_tools/data"
-        with open(migration_data_dir / "wis_attribute_prompt.json", "w") as f:
-            json.dump(
-                [row.dict() for row in self.wis_attribute_prompt],
-                f,
-                default=datetime.isoformat,
-                indent=2,
-            )
-        with open(migration_data_dir / "wis_choice.json", "w") as f:
-            json.dump(
-                [row.dict() for row in self.wis_choice],
-                f,
-                default=datetime.isoformat,
-                indent=2,
-            )
-        with open(migration_data_dir / "wis_column_def.json", "w") as f:
-            json.dump(
-                [row.dict() for row in self.wis_column_def],
-                f,
-                default=datetime.isoformat,
-                indent=2,
-            )
-        with open(migration_data_dir / "wis_column_view.json", "w") as f:
-            json.dump(
-                [row.dict() for row in self.wis_column_view],
-                f,
-                default=datetime.isoformat,
-                indent=2,
-            )
-        with open(migration_data_dir / "wis_table_def.json", "w") as f:
-            json.dump(
-                [row.dict() for row in self.wis_table_def],
-                f,
-                default=datetime.isoformat,
-                indent=2,
-            )
-        with open(migration_data_dir / "wis_table_view.json", "w") as f:
-            json.dump(
-                [row.dict() for row in self.wis_table_view],
-                f,
-                default=datetime.isoformat,
-                indent=2,
+    """
+    Exports tables as NDJSON files, one row per line, along with a delta
+    against the previous export.
+
+    Rows are streamed in key order from a server-side cursor and merged
+    with the previous file line by line, so memory does not grow with the
+    table size. Changed rows are described with dictdiffer.
+    """
+
+    # the exports hold the password hashes and tokens of the users, they
+    # are kept out of the source tree
+    data_dir: Path = settings.BASE_DIR.parent / "tmp/migration_data"
+    tables: tuple[str, ...] = EXPORT_TABLES
+    chunk_size: int = 1000
+    exports: dict[str, TableExport] = field(default_factory=dict)
+
+    async def save(self, session: AsyncSession) -> dict[str, TableExport]:
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.exports = {
+            name: await self.export_table(session, Base.metadata.tables[name])
+            for name in self.tables
+        }
+        manifest = {
+            name: {"rows": export.rows, "sha256": export.sha256}
+            for name, export in self.exports.items()
+        }
+        (self.data_dir / MANIFEST).write_bytes(
+            orjson.dumps(manifest, option=orjson.OPT_INDENT_2)
+        )
+        return self.exports
+
+    async def _rows(
+        self, session: AsyncSession, table: Table
+    ) -> AsyncIterator[tuple[tuple, bytes]]:
+        keys = _key_columns(table)
+        result = await session.stream(
+            select(table)
+            .order_by(*keys)
+            .execution_options(yield_per=self.chunk_size)
+        )
+        async for row in result:
+            values = row._asdict()
+            yield tuple(values[c.name] for c in keys), orjson.dumps(
+                # column names are str subclasses
+                values,
+                option=orjson.OPT_NON_STR_KEYS,
             )
+
+    async def export_table(
+        self, session: AsyncSession, table: Table
+    ) -> TableExport:
+        """
+        Writes `<table>.ndjson` and `<table>.delta.ndjson`, the latter
+        listing the rows added, removed or updated since the last export.
+        """
+        path = self.data_dir / f"{table.name}.ndjson"
+        new_path = path.with_suffix(".ndjson.tmp")
+        delta_path = self.data_dir / f"{table.name}.delta.ndjson"
+        export = TableExport(table.name)
+        sha256 = hashlib.sha256()
+
+        previous = _previous_rows(path)
+        previous_row = next(previous, None)
+        with (
+            open(new_path, "wb") as f_new,
+            open(delta_path, "wb") as f_delta,
+        ):
+
+            def write_delta(operation: str, key: tuple, detail: Any) -> None:
+                f_delta.write(
+                    orjson.dumps(
+                        {"op": operation, "key": key, "row": detail},
+                        option=orjson.OPT_APPEND_NEWLINE,
+                    )
+                )
+
+            async for key, row in self._rows(session, table):
+                line = b"[%s,%s]\n" % (orjson.dumps(key), row)
+                f_new.write(line)
+                sha256.update(line)
+                export.rows += 1
+
+                # previous rows before this key were removed
+                while previous_row is not None and previous_row[0] < key:
+                    write_delta("remove", previous_row[0], None)
+                    export.removed += 1
+                    previous_row = next(previous, None)
+                if previous_row is None or previous_row[0] != key:
+                    write_delta("add", key, orjson.loads(row))
+                    export.added += 1
+                    continue
+                if previous_row[1] != row:
+                    diff = dictdiffer.diff(
+                        orjson.loads(previous_row[1]), orjson.loads(row)
+                    )
+                    write_delta("change", key, list(diff))
+                    export.updated += 1
+                previous_row = next(previous, None)
+
+            while previous_row is not None:
+                write_delta("remove", previous_row[0], None)
+                export.removed += 1
+                previous_row = next(previous, None)
+
+        export.sha256 = sha256.hexdigest()
+        if export.changed or not path.exists():
+            os.replace(new_path, path)
+        else:
+            new_path.unlink()
+        return export
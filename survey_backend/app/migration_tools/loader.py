@@ -0,0 +1,178 @@
+""" Bulk loading of the migration data files into the database """
+
+import time
+from dataclasses import dataclass
+from enum import Enum
+from itertools import islice
+from pathlib import Path
+from typing import Any, Iterator
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Table, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db.bulk import copy_rows, reset_sequence
+from ..db.database import Base
+from .models import (
+    WisGroupDataModel,
+    WisUserDataModel,
+    WisUserGroupDataModel,
+)
+
+# tables in load order, referenced tables first
+MIGRATION_MODELS: dict[str, type[BaseModel]] = {
+    "wis_group": WisGroupDataModel,
+    "wis_user": WisUserDataModel,
+    "wis_user_group": WisUserGroupDataModel,
+}
+
+
+class MigrationDataError(ValueError):
+    """
+    Raised when records of a data file do not match their model.
+    """
+
+    def __init__(self, table: str, errors: list[tuple[int, str]]):
+        self.table = table
+        self.errors = errors
+        details = "; ".join(f"record {i}: {error}" for i, error in errors[:10])
+        super().__init__(
+            f"{len(errors)} invalid records in {table}: {details}"
+        )
+
+
+@dataclass
+class TableLoad:
+    """
+    Rows loaded into a table and the time it took.
+    """
+
+    table: str
+    rows: int = 0
+    seconds: float = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return round(self.rows / self.seconds, 1) if self.seconds else 0.0
+
+
+def read_records(data_dir: Path, table: str) -> Iterator[dict[str, Any]]:
+    """
+    Reads the records of a table from `<table>.ndjson`, as written by
+    FormMigrationDataBuilder, or else from a `<table>.json` array.
+    """
+    ndjson = data_dir / f"{table}.ndjson"
+    if ndjson.exists():
+        with open(ndjson, "rb") as f_data:
+            for line in f_data:
+                _, record = orjson.loads(line)
+                yield record
+        return
+    path = data_dir / f"{table}.json"
+    if path.exists():
+        yield from orjson.loads(path.read_bytes())
+
+
+def _column_defaults(table: Table, columns: list[str]) -> dict[str, Any]:
+    # COPY bypasses the column defaults, apply those the models lack
+    defaults = {}
+    for column in table.columns:
+        if column.name in columns or column.default is None:
+            continue
+        if column.default.is_scalar:
+            defaults[column.name] = column.default.arg
+        elif column.default.is_callable:
+            defaults[column.name] = column.default.arg(None)
+    return defaults
+
+
+def _validate_batch(
+    model: type[BaseModel], batch: list[dict[str, Any]], offset: int
+) -> tuple[list[BaseModel], list[tuple[int, str]]]:
+    valid, errors = [], []
+    for i, record in enumerate(batch, offset):
+        try:
+            valid.append(model.parse_obj(record))
+        except ValidationError as err:
+            errors.append((i, str(err).replace("\n", " ")))
+    return valid, errors
+
+
+async def load_table(
+    session: AsyncSession,
+    table: Table,
+    model: type[BaseModel],
+    records: Iterator[dict[str, Any]],
+    batch_size: int,
+) -> TableLoad:
+    """
+    Validates the records by batch and loads them with COPY (executemany
+    on SQLite). Nothing is loaded if any record is invalid.
+    """
+    load = TableLoad(table.name)
+    started = time.perf_counter()
+    columns = [name for name in model.__fields__ if name in table.c]
+    defaults = _column_defaults(table, columns)
+    all_columns = [*columns, *defaults]
+    default_values = tuple(defaults.values())
+
+    errors: list[tuple[int, str]] = []
+    offset = 0
+    while batch := list(islice(records, batch_size)):
+        valid, batch_errors = _validate_batch(model, batch, offset)
+        offset += len(batch)
+        errors += batch_errors
+        if errors:
+            # keep validating to report every invalid record
+            continue
+        rows = [
+            tuple(
+                value.value if isinstance(value, Enum) else value
+                for value in (getattr(item, name) for name in columns)
+            )
+            + default_values
+            for item in valid
+        ]
+        load.rows += await copy_rows(session, table, all_columns, rows)
+
+    if errors:
+        raise MigrationDataError(table.name, errors)
+    await reset_sequence(session, table)
+    load.seconds = time.perf_counter() - started
+    return load
+
+
+async def load_migration_data(
+    session: AsyncSession,
+    data_dir: Path,
+    *,
+    batch_size: int = 5000,
+    replace: bool = False,
+) -> list[TableLoad]:
+    """
+    Loads the migration data files of `data_dir` in one transaction.
+
+    With `replace`, the rows of the migrated tables are deleted first.
+    Either every file is loaded or, on error, none.
+    """
+    tables = [Base.metadata.tables[name] for name in MIGRATION_MODELS]
+    try:
+        if replace:
+            for table in reversed(tables):
+                await session.execute(delete(table))
+        loads = [
+            await load_table(
+                session,
+                table,
+                MIGRATION_MODELS[table.name],
+                read_records(data_dir, table.name),
+                batch_size,
+            )
+            for table in tables
+        ]
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    return loads
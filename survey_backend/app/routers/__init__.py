@@ -5,7 +5,7 @@ Router package
 from fastapi import APIRouter, Depends, status
 from fastapi.security import OAuth2PasswordBearer
 
-from . import users, module
+from . import module, notifications, users
 
 
 # authentication scheme
@@ -18,6 +18,7 @@ auth_router = APIRouter(
 
 auth_router.include_router(users.router)
 auth_router.include_router(module.router)
+auth_router.include_router(notifications.router)
 
 
 __all__ = ["auth_router"]
@@ -0,0 +1,87 @@
+""" Coalescing of identical concurrent read requests """
+
+import functools
+from enum import Enum
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from app import settings
+from app.cache import SingleFlight
+from app.metrics import register_metrics_source
+
+# handler name -> single-flight group of the handler
+_flights: dict[str, SingleFlight] = {}
+
+_KEY_TYPES = (str, int, float, bool, Enum, type(None))
+
+
+def default_key(**kwargs: Any) -> Hashable:
+    """
+    Builds the key from the request parameters, ignoring injected
+    dependencies such as the DB manager.
+    """
+    return tuple(
+        sorted(
+            (name, value)
+            for name, value in kwargs.items()
+            if isinstance(value, _KEY_TYPES)
+        )
+    )
+
+
+def coalesce(key: Callable[..., Hashable] = default_key):
+    """
+    Decorator for idempotent read handlers: concurrent calls with the same
+    key share one execution of the handler and its serialized response.
+
+    `key` receives the handler keyword arguments.
+    """
+
+    def decorator(handler: Callable[..., Awaitable[Any]]):
+        flight = _flights.setdefault(handler.__name__, SingleFlight())
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs) -> Response:
+            if not settings.REQUEST_COALESCING_ENABLED:
+                return await handler(*args, **kwargs)
+
+            async def run() -> bytes:
+                result = await handler(*args, **kwargs)
+                return orjson.dumps(jsonable_encoder(result))
+
+            body, _ = await flight.do(key(**kwargs), run)
+            return Response(content=body, media_type="application/json")
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(handler_name: str, keys: Iterable[Hashable]) -> None:
+    """
+    Keeps the reads of `handler_name` already running for `keys` from being
+    joined, to be called once a write to their data has committed: those
+    reads may have started before the write.
+    """
+    flight = _flights.get(handler_name)
+    if flight is None:
+        return
+    for each in keys:
+        flight.forget(each)
+
+
+def coalescing_metrics() -> dict[str, dict[str, int]]:
+    return {
+        name: {
+            "calls": flight.calls,
+            "coalesced": flight.coalesced,
+            "in_flight": flight.in_flight,
+        }
+        for name, flight in _flights.items()
+    }
+
+
+register_metrics_source("coalescing", coalescing_metrics)
@@ -16,6 +16,8 @@ from app.dependencies import dbManager, get_current_user_from_multiple_auth
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from app.routers.utils import ErrorMessage
+from app.catalog import bump_catalog_version, catalog_changed, get_questions
+from app.routers.coalescing import coalesce, invalidate
 from sqlalchemy import select
 
 
@@ -62,7 +64,9 @@ async def create_sme(db_manager: dbManager, data: List[SmeRequest]) -> SmeRespon
 
                 _session.add(new_sme)
 
+            version = await bump_catalog_version(_session)
             await _session.commit()
+            catalog_changed({sme_data.module_id for sme_data in data}, version)
 
         except SQLAlchemyError as e:
             await _session.rollback()  # Rollback in case of any errors
@@ -72,19 +76,17 @@ async def create_sme(db_manager: dbManager, data: List[SmeRequest]) -> SmeRespon
 
 
 @router.get("/sme", response_model=List[SmeRequest])
+@coalesce(key=lambda module_id, **_: module_id)
 async def list_sme(db_manager: dbManager, module_id: int) -> List[SmeRequest]:
     """Fetch all SME records from the database"""
 
     async with db_manager.get_session() as _session:
         try:
-            result = await _session.execute(
-                select(SME).where(SME.module_id == module_id)
-            )
-            sme_records = result.scalars().all()
+            sme_records = await get_questions(_session, "sme", module_id)
 
-            # Convert each SME object to SmeRequest Pydantic model
+            # Convert each SME row to SmeRequest Pydantic model
 
-            sme_responses = [SmeRequest.from_orm(sme) for sme in sme_records]
+            sme_responses = [SmeRequest(**sme) for sme in sme_records]
 
             return sme_responses
 
@@ -100,6 +102,7 @@ async def save_sme_value(
 ) -> SmeResponse:
     """Create a new SME record in the database"""
     _session: AsyncSession
+    module_ids = set()
     async with db_manager.get_session() as _session:
         for each in data:
             result = await _session.execute(select(SME).where(SME.id == each.sme_id))
@@ -111,8 +114,10 @@ async def save_sme_value(
                     detail={"sme_id": ErrorMessage.USER_NOT_FOUND_MESSAGE},
                 )
             sme.selected_value = each.value
+            module_ids.add(sme.module_id)
             _session.add(sme)
         await _session.commit()
+    invalidate("list_sme", module_ids)
     return {"success": True}
 
 
@@ -134,7 +139,9 @@ async def create_startup(db_manager: dbManager, data: StartupRequest) -> SmeResp
 
                 _session.add(new_data)
 
+            version = await bump_catalog_version(_session)
             await _session.commit()
+            catalog_changed({data.module_id}, version)
 
         except SQLAlchemyError as e:
             await _session.rollback()  # Rollback in case of any errors
@@ -150,6 +157,7 @@ async def save_startup_value(
 ) -> StartupValueResponse:
     """Create a new SME record in the database"""
     _session: AsyncSession
+    module_ids = set()
     async with db_manager.get_session() as _session:
         for each in data:
             result = await _session.execute(
@@ -163,35 +171,37 @@ async def save_startup_value(
                     detail={"startup_id": ErrorMessage.USER_NOT_FOUND_MESSAGE},
                 )
             startup.selected_option = each.value
+            module_ids.add(startup.module_id)
             _session.add(startup)
         await _session.commit()
+    invalidate("list_startup", module_ids)
     return {"success": True}
 
 
 @router.get("/startup", response_model=List[StartupRequest])
+@coalesce(key=lambda module_id, **_: module_id)
 async def list_startup(db_manager: dbManager, module_id: int) -> List[StartupRequest]:
     """Fetch all STARTUP records from the database"""
 
     async with db_manager.get_session() as _session:
         try:
-            result = await _session.execute(
-                select(Startups).where(Startups.module_id == module_id)
+            startup_records = await get_questions(
+                _session, "startup", module_id
             )
-            startup_records = result.scalars().all()
 
-            # Convert each SME object to SmeRequest Pydantic model
+            # Convert each startup row to StartRequestData Pydantic model
 
             start_up_data = []
             mod_id = 0
             for data in startup_records:
-                mod_id = data.module_id
+                mod_id = data["module_id"]
                 start_up_data.append(
                     StartRequestData(
-                        question=data.question,
-                        option_1=data.option_1,
-                        option_2=data.option_2,
-                        option_3=data.option_3,
-                        selected_option=data.selected_option,
+                        question=data["question"],
+                        option_1=data["option_1"],
+                        option_2=data["option_2"],
+                        option_3=data["option_3"],
+                        selected_option=data["selected_option"],
                     )
                 )
             startup_responses = [StartupRequest(module_id=mod_id, data=start_up_data)]
@@ -226,12 +236,14 @@ async def save_current_strategy_value(
             await _session.rollback()  # Rollback in case of any errors
             raise HTTPException(status_code=500, detail=str(e))
 
+    invalidate("list_strategy", {each.strategy_id for each in data})
     return {"success": True}
 
 
 @router.get(
     "/strategy_value",
 )
+@coalesce(key=lambda strategy_id, **_: strategy_id)
 async def list_strategy(db_manager: dbManager, strategy_id: int):
     """Fetch all STARTUP records from the database"""
 
@@ -0,0 +1,110 @@
+"""
+Module for the notifications sent to the opted-in users.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import AuthRole, Notification, User
+from app.dependencies import (
+    RoleAuthorization,
+    dbManager,
+    get_current_user_from_multiple_auth,
+)
+from app.mail import create_notification, delivery_status, fan_out_worker
+from app.schemas.notification import NotificationCreate, NotificationGet
+
+router = APIRouter(
+    prefix="/notifications",
+    tags=["notifications"],
+    responses={status.HTTP_404_NOT_FOUND: {"description": "Not found."}},
+)
+
+
+@router.post(
+    "", response_model=NotificationGet, status_code=status.HTTP_202_ACCEPTED
+)
+async def send_notification(
+    db_manager: dbManager,
+    notification: NotificationCreate,
+    current_user: User = Depends(
+        RoleAuthorization(
+            [
+                AuthRole.ADMIN,
+            ]
+        )
+    ),
+    __=Depends(get_current_user_from_multiple_auth),
+) -> NotificationGet:
+    """
+    Send a notification by email to every user who opted in.
+
+    The notification is queued, then fanned out to the outbox and
+    delivered in the background; its progress is returned by
+    `GET /notifications/{notification_id}`.
+
+    Parameters
+    ----------
+        notification - subject and body of the email
+    Returns
+    -------
+        the queued notification
+    """
+    _session: AsyncSession
+    async with db_manager.get_session() as _session:
+        new_notification = await create_notification(
+            _session,
+            notification.subject,
+            notification.body,
+            created_by=current_user.id,
+        )
+    fan_out_worker.notify()
+    return NotificationGet(
+        id=new_notification.id,
+        subject=new_notification.subject,
+        status=new_notification.status,
+        recipients=new_notification.recipients,
+        created_on=new_notification.created_on,
+    )
+
+
+@router.get("/{notification_id}", response_model=NotificationGet)
+async def get_notification(
+    db_manager: dbManager,
+    notification_id: int,
+    _=Depends(
+        RoleAuthorization(
+            [
+                AuthRole.ADMIN,
+            ]
+        )
+    ),
+    __=Depends(get_current_user_from_multiple_auth),
+) -> NotificationGet:
+    """
+    Return a notification with its fan-out and delivery progress.
+
+    Parameters
+    ----------
+        notification_id - the ID of the notification
+    Returns
+    -------
+        the notification with the number of emails per delivery status
+    """
+    _session: AsyncSession
+    async with db_manager.get_session() as _session:
+        notification = await _session.get(Notification, notification_id)
+        if notification is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={"message": "Notification not found"},
+            )
+        delivery = await delivery_status(_session, notification_id)
+        return NotificationGet(
+            id=notification.id,
+            subject=notification.subject,
+            status=notification.status,
+            recipients=notification.recipients,
+            created_on=notification.created_on,
+            delivery=delivery,
+        )
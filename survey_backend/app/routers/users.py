@@ -4,7 +4,14 @@ Module for user public APIs which do not require authentication.
 
 import json
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Request,
+    UploadFile,
+    status,
+)
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 import secrets
@@ -26,7 +33,9 @@ from app.schemas.user import (
     UserDeleteResponse,
     UserUpdateResponse,
     UserUpdate,
+    UserImportResponse,
 )
+from app.user_import import IMPORT_FORMATS, import_users
 from app.utils import encrypt_password, check_password
 
 from .utils import (
@@ -145,7 +154,7 @@ async def register_user(
     _session: AsyncSession
     async with db_manager.get_session() as _session:
         db_user_by_email = await _session.scalar(
-            select(User).where(User.email == user.email)
+            select(User).where(func.lower(User.email) == user.email.lower())
         )
 
         if db_user_by_email:
@@ -155,7 +164,7 @@ async def register_user(
             )
 
         db_user_by_name = await _session.scalar(
-            select(User).where(User.name == user.name)
+            select(User).where(func.lower(User.name) == user.name.lower())
         )
 
         if db_user_by_name:
@@ -199,14 +208,66 @@ async def register_user(
         )
         _session.add(new_history_entry)
 
+        await send_email(
+            f"its you {new_user.name} please verify",
+            new_user.email_token,
+            new_user.email,
+            session=_session,
+        )
+
         await _session.commit()
 
-    await send_email(
-        f"its you {new_user.name} please verify", new_user.email_token, new_user.email
-    )
     return new_user
 
 
+@router.post("/import", response_model=UserImportResponse)
+async def import_users_file(
+    db_manager: dbManager,
+    file: UploadFile,
+    group: AuthRole = AuthRole.DATA_EXPLORER,
+    _=Depends(
+        RoleAuthorization(
+            [
+                AuthRole.ADMIN,
+            ]
+        )
+    ),
+    __=Depends(get_current_user_from_multiple_auth),
+) -> UserImportResponse:
+    """
+    Create the users listed in a CSV or XLSX file.
+
+    Parameters
+    ----------
+        file - CSV or XLSX file with name, email and password columns,
+            first_name and last_name being optional
+        group - the group of the new users
+    Returns
+    -------
+        the number of users created and the rejected rows
+    """
+    file_format = (file.filename or "").rsplit(".", 1)[-1].lower()
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"file": "Only CSV and XLSX files are supported."},
+        )
+
+    _session: AsyncSession
+    async with db_manager.get_session() as _session:
+        try:
+            report = await import_users(
+                _session, file.file, file_format=file_format, group=group
+            )
+        except ValueError as err:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"file": str(err)},
+            ) from err
+
+    return UserImportResponse.from_orm(report)
+
+
 @router.get("", response_model=PaginatedUserGet)
 async def list_users(
     db_manager: dbManager,
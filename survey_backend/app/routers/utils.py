@@ -1,20 +1,15 @@
 """Utility functions for routers"""
 
 import re
-import ssl
 from datetime import datetime
 from enum import Enum
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-import smtplib
 from fastapi import Depends, HTTPException, status
-from email.mime.base import MIMEBase
-from email import encoders
 from sqlalchemy import desc, select
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from app import settings
 
+from ..cache import ALL_KEYS, Cache, OrmCodec, cached, track_invalidations
+from ..db.engines import get_session_engine
 from ..db.models import (
     Group,
     PasswordHistory,
@@ -22,6 +17,7 @@ from ..db.models import (
     User,
 )
 from ..dependencies import get_current_user
+from ..mail import enqueue_email
 
 from ..utils import check_password, encrypt_password
 
@@ -53,8 +49,60 @@ class ErrorMessage(str, Enum):
     NOT_ALLOWED = "You don't have permission for this action."
 
 
+user_cache: Cache[User] = Cache(
+    "user", codec=OrmCodec(User, relationships=("groups",))
+)
+group_cache: Cache[Group] = Cache("group", codec=OrmCodec(Group))
+permission_cache: Cache[Permission] = Cache(
+    "permission", codec=OrmCodec(Permission)
+)
+
+# drop cached rows when another request commits changes to them
+track_invalidations(User, user_cache)
+track_invalidations(Group, group_cache)
+# cached users embed their groups
+track_invalidations(Group, user_cache, key=lambda group: ALL_KEYS)
+track_invalidations(Permission, permission_cache)
+
+
+@cached(group_cache, key=lambda group_id, session: str(group_id))
+async def find_group(group_id: int, session: AsyncSession) -> Group | None:
+    """
+    Given a group ID, returns the corresponding record from the cache or the
+    DB, None if not found
+    """
+    result = await session.execute(select(Group).where(Group.id == group_id))
+    return result.scalars().first()
 
 
+@cached(
+    permission_cache, key=lambda permission_id, session: str(permission_id)
+)
+async def find_permission(
+    permission_id: int, session: AsyncSession
+) -> Permission | None:
+    """
+    Given a permission ID, returns the corresponding record from the cache or
+    the DB, None if not found
+    """
+    result = await session.execute(
+        select(Permission).where(Permission.id == permission_id)
+    )
+    return result.scalars().first()
+
+
+@cached(user_cache, key=lambda user_id, session: str(user_id))
+async def find_user(user_id: int, session: AsyncSession) -> User | None:
+    """
+    Given a user ID, returns the corresponding record, with groups, from the
+    cache or the DB, None if not found
+    """
+    result = await session.execute(
+        select(User)
+        .options(selectinload(User.groups))
+        .where(User.id == user_id)
+    )
+    return result.scalars().first()
 
 
 async def load_group(group_id: int, session: AsyncSession) -> Group:
@@ -69,8 +117,7 @@ async def load_group(group_id: int, session: AsyncSession) -> Group:
         group data
     """
     # load group
-    result = await session.execute(select(Group).where(Group.id == group_id))
-    group = result.scalars().first()
+    group = await find_group(group_id, session)
     if group is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -94,10 +141,7 @@ async def load_permission(
         permission data
     """
     # load permission
-    result = await session.execute(
-        select(Permission).where(Permission.id == permission_id)
-    )
-    permission = result.scalars().first()
+    permission = await find_permission(permission_id, session)
     if permission is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -122,12 +166,7 @@ async def load_user(user_id: int, session: AsyncSession):
         user data
     """
     # load user
-    result = await session.execute(
-        select(User)
-        .options(selectinload(User.groups))
-        .where(User.id == user_id)
-    )
-    user = result.scalars().first()
+    user = await find_user(user_id, session)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -164,12 +203,8 @@ def get_engine_from_session(session: AsyncSession):
     -------
     current engine
     """
-    # get currently used engine url
-    engine_url = get_url_from_session(session)
-    # create engine
-    engine = create_async_engine(engine_url)
-
-    return engine
+    # reuse the shared engine rather than opening another pool
+    return get_session_engine(session)
 
 
 async def check_admin_access_rights(session: AsyncSession, current_user):
@@ -390,36 +425,19 @@ async def get_updated_user_name_if_same_with_mail(name: str, email: str):
     return name
 
 
-async def send_email(subject, verification_token, email):
-    try:
-        print("sendings email")
-        sender_email = settings.EMAIL_FROM
-        print("Sender email", sender_email)
-        password = settings.EMAIL_PASS
-        # for email in receiver_emails:
-        # Create a multipart message and set headers
-        print(f"Sending email to {email}")
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = ', '.join(email)
-        message["Subject"] = subject
-        # Recommended for mass emails
-        # message["Bcc"] = "any_mail"
-        body = f"Click the following link to verify your email: http://127.0.0.1:8000/users/verify?email={email}&token={verification_token}"
-
-        # Add body to email
-        message.attach(MIMEText(body, "plain"))
-
-        text = message.as_string()
-
-        # Log in to server using secure context and send email
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
-            server.login(sender_email, password)
-            server.sendmail(sender_email, email, text)
-            print(f"Email Send : {email}")
-    except Exception as e:
-        print(f'Exception as {e}')
+async def send_email(
+    subject, verification_token, email, session: AsyncSession
+):
+    """
+    Queues the verification email in the outbox, within the caller's
+    transaction. The outbox worker delivers it.
+    """
+    body = (
+        "Click the following link to verify your email: "
+        "http://127.0.0.1:8000/users/verify"
+        f"?email={email}&token={verification_token}"
+    )
+    enqueue_email(session, recipient=email, subject=subject, body=body)
 
 
 async def time_difference(saved_time):
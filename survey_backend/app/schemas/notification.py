@@ -0,0 +1,39 @@
+""" Notification schemas """
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+# pylint: disable = too-few-public-methods, unsupported-binary-operation
+
+
+class NotificationCreate(BaseModel):
+    """
+    Create schema for Notification
+    """
+
+    subject: str = Field(max_length=998)
+    body: str
+
+
+class NotificationGet(BaseModel):
+    """
+    Notification schema, with the delivery progress
+    """
+
+    id: int
+    subject: str
+    # fan-out status: queued, running or done
+    status: str
+    # recipients enqueued so far
+    recipients: int
+    created_on: datetime
+    # number of emails per delivery status
+    delivery: dict[str, int] = {}
+
+    class Config:
+        """
+        Schema configuration
+        """
+
+        orm_mode = True
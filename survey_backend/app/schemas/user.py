@@ -178,6 +178,41 @@ class UserUpdateResponse(UserGet):
     refresh_token: str | None
 
 
+class UserImportIssue(BaseModel):
+    """
+    Schema for a row rejected by the bulk user import
+    """
+
+    row: int
+    field: str
+    message: str
+
+    class Config:
+        """
+        Schema configuration.
+        """
+
+        orm_mode = True
+
+
+class UserImportResponse(BaseModel):
+    """
+    Schema for response of bulk user import API.
+    """
+
+    imported: int
+    rejected: int
+    seconds: float
+    issues: list[UserImportIssue]
+
+    class Config:
+        """
+        Schema configuration.
+        """
+
+        orm_mode = True
+
+
 class NotificationSignupResponse(BaseModel):
     """
     Response Schema for Notification Sign up API
@@ -3,10 +3,10 @@
 import os
 from datetime import timedelta
 from pathlib import Path
-from typing import Any, Sequence
+from typing import Any, Literal, Sequence
 
 from dotenv import load_dotenv
-from pydantic import BaseSettings, Field
+from pydantic import BaseModel, BaseSettings, Field
 from sqlalchemy import URL
 
 # pylint: disable = too-few-public-methods, unsupported-binary-operation
@@ -31,15 +31,68 @@ HASH_ALGORITHM = "HS256"
 JWT_EXPIRATION_DELTA = timedelta(3600)
 REFRESH_TOKEN_EXPIRATION_DELTA = timedelta(days=1)
 PASSWORD_MAX_LOGIN_ATTEMPTS = 10
+# seconds the locked out logins are rejected without a database lookup
+LOGIN_LOCKOUT_TTL = int(os.getenv("LOGIN_LOCKOUT_TTL", "300"))
 SHOW_API_DOCS = os.getenv("SHOW_API_DOCS", "False").lower() in (
     "true",
     "1",
     "t",
 )
 
+# the configured database is a disposable one, which the HTTP benchmark
+# fills with admin users logging in with a published password
+BENCHMARK_DATABASE = os.getenv("BENCHMARK_DATABASE", "False").lower() in (
+    "true",
+    "1",
+    "t",
+)
+
 EMAIL_FROM = os.getenv("EMAIL_FROM", "")
 EMAIL_PASS = os.getenv("EMAIL_PASS", "")
 
+# cache
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "True").lower() in (
+    "true",
+    "1",
+    "t",
+)
+CACHE_TTL = int(os.getenv("CACHE_TTL", "60"))  # seconds
+CACHE_NEGATIVE_TTL = int(os.getenv("CACHE_NEGATIVE_TTL", "5"))  # seconds
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# how workers tell each other to drop cached rows: redis, postgres, or local
+# for a single worker
+CACHE_INVALIDATION_BACKEND = os.getenv(
+    "CACHE_INVALIDATION_BACKEND", "postgres"
+)
+# worker processes serving the app, as read by uvicorn and gunicorn
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# share one execution between identical concurrent read requests
+REQUEST_COALESCING_ENABLED = os.getenv(
+    "REQUEST_COALESCING_ENABLED", "True"
+).lower() in ("true", "1", "t")
+
+# question catalog (memory-mapped snapshot of the static question tables)
+QUESTION_CATALOG_ENABLED = os.getenv(
+    "QUESTION_CATALOG_ENABLED", "True"
+).lower() in ("true", "1", "t")
+QUESTION_CATALOG_PATH = os.getenv(
+    "QUESTION_CATALOG_PATH", f"{BASE_DIR}/../tmp/question_catalog.bin"
+)
+# seconds between two checks of the catalog version in the DB
+QUESTION_CATALOG_REFRESH_INTERVAL = int(
+    os.getenv("QUESTION_CATALOG_REFRESH_INTERVAL", "30")
+)
+
+# bulk user import
+BULK_IMPORT_CHUNK_SIZE = int(os.getenv("BULK_IMPORT_CHUNK_SIZE", "5000"))
+# processes hashing the imported passwords, 0 to hash in the event loop
+BULK_IMPORT_HASH_WORKERS = int(
+    os.getenv("BULK_IMPORT_HASH_WORKERS", str(os.cpu_count() or 1))
+)
+# imports running at once in a worker, the others wait their turn
+BULK_IMPORT_MAX_CONCURRENT = int(os.getenv("BULK_IMPORT_MAX_CONCURRENT", "1"))
 
 DEFAULT_SA_ENGINE_OPTIONS = {"future": True, "pool_pre_ping": True}
 
@@ -105,6 +158,292 @@ TEST_DATABASE_PATH = f"{BASE_DIR}/../tmp/{db_settings.name_test}.db"
 TEST_DATABASE_URI = f"sqlite+aiosqlite:///{TEST_DATABASE_PATH}"
 
 
+class DBFaultSettings(BaseSettings):
+    """
+    Latency and disconnects injected into the database engines, to see the
+    cost of the round trips on a local database. Never enable in
+    production.
+    """
+
+    enabled: bool = False
+    # added to every statement, plus a random jitter up to jitter_ms
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    # added to every connection checkout from the pool
+    connect_latency_ms: float = 0
+    # probability of dropping the connection before a statement
+    disconnect_rate: float = 0
+    seed: int | None = None
+
+    class Config:
+        env_prefix = "DB_FAULTS_"
+
+
+db_fault_settings = DBFaultSettings()  # type: ignore
+
+
+class RedisSettings(BaseSettings):
+    """
+    Redis settings, used as shared cache tier.
+    """
+
+    enabled: bool = False
+    host: str = "localhost"
+    port: int = 6379
+    db: int = 0
+    password: str | None = None
+    ttl: int = 3600  # seconds
+
+    class Config:
+        env_prefix = "REDIS_"
+
+
+redis_settings = RedisSettings()  # type: ignore
+
+
+class SMTPSettings(BaseSettings):
+    """
+    SMTP server used to deliver the emails of the outbox.
+    """
+
+    host: str = "smtp.gmail.com"
+    port: int = 465
+    use_ssl: bool = True
+    # defaults to EMAIL_FROM / EMAIL_PASS
+    username: str | None = None
+    password: str | None = None
+    timeout: float = 30  # seconds
+
+    class Config:
+        env_prefix = "SMTP_"
+
+
+smtp_settings = SMTPSettings()  # type: ignore
+
+
+class EmailOutboxSettings(BaseSettings):
+    """
+    Email outbox worker settings.
+    """
+
+    worker_enabled: bool = True
+    batch_size: int = 50
+    poll_interval: float = 2  # seconds
+    max_attempts: int = 6
+    backoff_base: float = 30  # seconds, doubled on each attempt
+    backoff_max: float = 3600  # seconds
+    # seconds a claimed email is reserved for its worker, past which it is
+    # delivered again if its result was not saved
+    lease: float = 600
+    # SMTP connections used in parallel by the worker, which bound its
+    # throughput: at about 50 ms per email, 16 connections send some 300
+    # emails/s, a fan-out to 100k recipients being delivered in 5 minutes
+    concurrency: int = 16
+    # maximum emails sent per second by the worker of each process, 0 for
+    # no limit other than the connections, e.g. to stay within the quota of
+    # the SMTP relay
+    rate_limit: float = 0
+    # recipients streamed and inserted at once by the notification fan-out
+    fanout_chunk_size: int = 1000
+
+    class Config:
+        env_prefix = "EMAIL_OUTBOX_"
+
+
+email_outbox_settings = EmailOutboxSettings()  # type: ignore
+
+
+class TrafficRecorderSettings(BaseSettings):
+    """
+    Recording of the served requests, to replay them with
+    `benchmarks/replay.py`.
+    """
+
+    enabled: bool = False
+    path: Path = BASE_DIR.parent / "tmp/traffic/traffic.ndjson"
+    # size of a trace file before it is rotated, and rotated files kept
+    max_bytes: int = 64 * 1024 * 1024
+    backup_count: int = 10
+    # share of the requests recorded
+    sample_rate: float = 1.0
+    # bodies are recorded sanitized, or only their shape
+    capture_bodies: bool = True
+    max_body_bytes: int = 64 * 1024
+
+    class Config:
+        env_prefix = "TRAFFIC_RECORDER_"
+
+
+traffic_recorder_settings = TrafficRecorderSettings()  # type: ignore
+
+
+class RateLimitRule(BaseModel):
+    """
+    Token bucket of the requests matching `method` and the `path` glob,
+    per client IP, authenticated user or API key. The requests without a
+    verified user or an API key take the bucket of their IP.
+    """
+
+    method: str = "*"
+    path: str
+    scope: Literal["ip", "user", "api_key"] = "ip"
+    # tokens added per second, and size of the bucket
+    rate: float
+    burst: int
+
+
+class RateLimitSettings(BaseSettings):
+    """
+    Rate limiting of the expensive routes.
+    """
+
+    enabled: bool = False
+    # local buckets per worker, or shared in Redis
+    backend: Literal["local", "redis"] = "local"
+    # client IP from the first X-Forwarded-For address, behind a proxy only
+    trust_forwarded: bool = False
+    # buckets kept by the local backend
+    max_buckets: int = 100_000
+    rules: list[RateLimitRule] = [
+        # bcrypt on every attempt
+        RateLimitRule(method="POST", path="/token", rate=20 / 60, burst=20),
+        RateLimitRule(method="POST", path="/token/refresh", rate=1, burst=60),
+        RateLimitRule(
+            method="POST",
+            path="/users/register",
+            scope="user",
+            rate=10 / 60,
+            burst=10,
+        ),
+        RateLimitRule(
+            method="POST",
+            path="/users/import",
+            scope="user",
+            rate=1 / 60,
+            burst=2,
+        ),
+        RateLimitRule(
+            method="POST",
+            path="/module/save_*",
+            scope="user",
+            rate=5,
+            burst=100,
+        ),
+        RateLimitRule(path="/*", scope="api_key", rate=20, burst=200),
+    ]
+
+    class Config:
+        env_prefix = "RATE_LIMIT_"
+
+
+rate_limit_settings = RateLimitSettings()  # type: ignore
+
+
+class AdmissionSettings(BaseSettings):
+    """
+    Load shedding: past any of the thresholds, the requests of the routes
+    without priority are rejected with a 503.
+    """
+
+    enabled: bool = False
+    max_in_flight: int = 200
+    # longest wait for a database connection
+    max_pool_wait_ms: float = 500
+    # delay of the event loop in running a scheduled callback
+    max_loop_lag_ms: float = 200
+    loop_lag_interval: float = 0.1  # seconds
+    # the priority routes are only rejected past this number of requests
+    max_priority_in_flight: int = 400
+    # "METHOD path-glob" of the priority routes
+    priority_routes: list[str] = [
+        "POST /token/refresh",
+        "POST /module/save_*",
+    ]
+    retry_after: int = 5  # seconds
+
+    class Config:
+        env_prefix = "ADMISSION_"
+
+
+admission_settings = AdmissionSettings()  # type: ignore
+
+
+class BulkheadClass(BaseModel):
+    """
+    Concurrency limit of a class of routes, and optionally its own slice of
+    leader connections.
+    """
+
+    # "METHOD path-glob" of the routes
+    routes: list[str]
+    max_concurrency: int
+    # requests waiting for their turn, the others are rejected
+    max_queue: int = 100
+    queue_timeout: float = 5  # seconds
+    # size of its own leader pool, None to share the leader pool
+    pool_size: int | None = None
+    max_overflow: int = 0
+
+
+class BulkheadSettings(BaseSettings):
+    """
+    Bulkheads: each request takes the first class matching its route, so a
+    class can never starve the others.
+    """
+
+    enabled: bool = False
+    classes: dict[str, BulkheadClass] = {
+        "auth": BulkheadClass(
+            routes=["POST /token", "POST /token/refresh"],
+            max_concurrency=32,
+            pool_size=4,
+        ),
+        "bulk": BulkheadClass(
+            routes=["GET /users", "POST /users/import", "POST /notifications"],
+            max_concurrency=4,
+            max_queue=20,
+            queue_timeout=10,
+            pool_size=2,
+        ),
+        "interactive_read": BulkheadClass(
+            routes=["GET *", "HEAD *"], max_concurrency=64
+        ),
+        "interactive_write": BulkheadClass(routes=["* *"], max_concurrency=32),
+    }
+    retry_after: int = 1  # seconds
+
+    class Config:
+        env_prefix = "BULKHEAD_"
+
+
+bulkhead_settings = BulkheadSettings()  # type: ignore
+
+
+class DeadlineSettings(BaseSettings):
+    """
+    Deadlines of the requests, past which their handler and its queries are
+    cancelled.
+    """
+
+    enabled: bool = False
+    # seconds by "METHOD path-glob", the first match wins
+    routes: dict[str, float] = {
+        "GET /users": 60,
+        "POST /users/import": 120,
+        "POST /module/save_*": 30,
+    }
+    default_timeout: float = 30  # seconds
+    # header a client sets its own deadline with, in seconds
+    header: str = "X-Request-Timeout"
+    max_timeout: float = 120  # seconds
+
+    class Config:
+        env_prefix = "DEADLINE_"
+
+
+deadline_settings = DeadlineSettings()  # type: ignore
+
+
 class CORSSettings(BaseSettings):
     """Allows control of the CORS middleware, mostly for the FE folk"""
 
@@ -0,0 +1,412 @@
+""" Bulk import of users from CSV or XLSX files """
+
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from multiprocessing import get_context
+from pathlib import Path
+from typing import BinaryIO, Iterator
+from uuid import uuid4
+
+import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import settings
+from app.db.bulk import copy_rows, reserve_ids
+from app.db.models import (
+    AuthMode,
+    AuthRole,
+    Group,
+    PasswordHistory,
+    User,
+    user_group,
+)
+from app.utils import encrypt_password
+
+IMPORT_FORMATS = ("csv", "xlsx")
+REQUIRED_COLUMNS = ("name", "email", "password")
+OPTIONAL_COLUMNS = ("first_name", "last_name")
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+PASSWORD_MIN_LENGTH = 12
+
+USER_COLUMNS = (
+    "id",
+    "name",
+    "email",
+    "email_verified",
+    "first_name",
+    "last_name",
+    "enabled",
+    "password",
+    "created_on",
+    "refresh_token_uid",
+    "auth_mode",
+    "data_last_accessed",
+    "failed_login_attempts",
+    "deleted",
+    "notifications",
+)
+PASSWORD_HISTORY_COLUMNS = ("user_id", "encrypted_password", "created_on")
+
+
+@dataclass
+class ImportIssue:
+    """
+    A rejected row of the imported file, `row` being its line number.
+    """
+
+    row: int
+    field: str
+    message: str
+
+
+@dataclass
+class UserImportReport:
+    """
+    Outcome of a bulk import.
+    """
+
+    imported: int = 0
+    rejected: int = 0
+    seconds: float = 0
+    issues: list[ImportIssue] = field(default_factory=list)
+
+
+def read_chunks(
+    source: str | Path | BinaryIO,
+    chunk_size: int,
+    file_format: str | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads a CSV or XLSX file `chunk_size` rows at a time, as string
+    columns indexed by line number.
+    """
+    if file_format is None:
+        file_format = Path(str(source)).suffix.lstrip(".").lower()
+
+    if file_format == "csv":
+        chunks = pd.read_csv(
+            source, chunksize=chunk_size, dtype=str, keep_default_na=False
+        )
+        for chunk in chunks:
+            # the header is line 1
+            chunk.index += 2
+            yield chunk
+    elif file_format == "xlsx":
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(name) for name in next(rows, ())]
+            line = 2
+            while batch := list(islice(rows, chunk_size)):
+                chunk = pd.DataFrame(
+                    batch,
+                    columns=header,
+                    index=range(line, line + len(batch)),
+                    dtype=object,
+                )
+                line += len(batch)
+                yield chunk.fillna("").astype(str)
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Unsupported file format: {file_format}")
+
+
+def validate_chunk(
+    chunk: pd.DataFrame, seen_names: set[str], seen_emails: set[str]
+) -> tuple[pd.DataFrame, list[ImportIssue]]:
+    """
+    Applies the registration rules to a chunk with vectorized checks.
+
+    Returns the valid rows and the issues of the rejected ones. The names
+    and emails of the valid rows are added to the `seen_` sets, to reject
+    duplicates across chunks.
+    """
+    chunk = chunk.rename(columns=lambda name: name.strip().lower())
+    missing = [name for name in REQUIRED_COLUMNS if name not in chunk]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    for name in OPTIONAL_COLUMNS:
+        if name not in chunk:
+            chunk[name] = ""
+    chunk = chunk[[*REQUIRED_COLUMNS, *OPTIONAL_COLUMNS]].apply(
+        lambda column: column.str.strip()
+    )
+    # same as registration: a name equal to the email is shortened
+    same = chunk["name"] == chunk["email"]
+    chunk.loc[same, "name"] = chunk.loc[same, "email"].str.split("@").str[0]
+
+    # names and emails are unique regardless of the case
+    names = chunk["name"].str.lower()
+    emails = chunk["email"].str.lower()
+    password = chunk["password"]
+    character_classes = (
+        password.str.contains(r"[A-Z]").astype(int)
+        + password.str.contains(r"[a-z]").astype(int)
+        + password.str.contains(r"\d").astype(int)
+        + password.str.contains(r'[!@#\$%^&*(),.?":{}|<>]').astype(int)
+    )
+    checks = [
+        ("name", chunk["name"] == "", "Name is required."),
+        (
+            "email",
+            ~chunk["email"].str.match(EMAIL_PATTERN),
+            "Invalid email address.",
+        ),
+        (
+            "password",
+            password.str.len() < PASSWORD_MIN_LENGTH,
+            "Password must be at least 12 characters long.",
+        ),
+        (
+            "password",
+            (password == chunk["name"]) | (password == chunk["email"]),
+            "Password must not be the same as the username or email.",
+        ),
+        (
+            "password",
+            character_classes < 2,
+            "Password should contain two of the following: uppercase letter,"
+            " lowercase letter, number or punctuation marks.",
+        ),
+        (
+            "name",
+            names.duplicated() | names.isin(seen_names),
+            "Duplicated name in the file.",
+        ),
+        (
+            "email",
+            emails.duplicated() | emails.isin(seen_emails),
+            "Duplicated email in the file.",
+        ),
+    ]
+
+    rejected = pd.Series(False, index=chunk.index)
+    issues = []
+    for column, mask, message in checks:
+        # report the first issue of a row only
+        mask = mask & ~rejected
+        issues += [
+            ImportIssue(int(row), column, message) for row in chunk.index[mask]
+        ]
+        rejected |= mask
+
+    valid = chunk[~rejected]
+    seen_names.update(names[~rejected])
+    seen_emails.update(emails[~rejected])
+    return valid, issues
+
+
+async def reject_existing(
+    session: AsyncSession, chunk: pd.DataFrame
+) -> tuple[pd.DataFrame, list[ImportIssue]]:
+    """
+    Rejects the rows whose name or email is already taken, with a single
+    query for the whole chunk.
+    """
+    if chunk.empty:
+        return chunk, []
+    names = chunk["name"].str.lower()
+    emails = chunk["email"].str.lower()
+    result = await session.execute(
+        select(func.lower(User.name), func.lower(User.email)).where(
+            or_(
+                func.lower(User.name).in_(names.tolist()),
+                func.lower(User.email).in_(emails.tolist()),
+            )
+        )
+    )
+    taken_names, taken_emails = set(), set()
+    for name, email in result.all():
+        taken_names.add(name)
+        taken_emails.add(email)
+
+    taken_name = names.isin(taken_names)
+    taken_email = emails.isin(taken_emails) & ~taken_name
+    issues = [
+        ImportIssue(int(row), "name", "User already exists.")
+        for row in chunk.index[taken_name]
+    ] + [
+        ImportIssue(int(row), "email", "Email already in use.")
+        for row in chunk.index[taken_email]
+    ]
+    return chunk[~(taken_name | taken_email)], issues
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """
+    Hashes a list of passwords, in a worker process.
+    """
+    return [encrypt_password(password) for password in passwords]
+
+
+class HashPool:
+    """
+    The processes hashing the imported passwords, started with the app and
+    shared by the imports of the worker, at most `max_imports` of them
+    running at once. Without processes the passwords are hashed in a
+    thread.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.BULK_IMPORT_HASH_WORKERS,
+        max_imports: int = settings.BULK_IMPORT_MAX_CONCURRENT,
+    ):
+        self.workers = workers
+        self.imports = asyncio.Semaphore(max_imports)
+        self.executor: Executor | None = None
+
+    def start(self) -> None:
+        if self.workers > 0 and self.executor is None:
+            # the processes are spawned on the first import
+            self.executor = ProcessPoolExecutor(
+                self.workers, mp_context=get_context("spawn")
+            )
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def hash(self, passwords: list[str]) -> list[str]:
+        """
+        Spreads the hashing of `passwords` over the processes.
+        """
+        if self.executor is None:
+            return await asyncio.to_thread(hash_passwords, passwords)
+        loop = asyncio.get_running_loop()
+        size = -(-len(passwords) // self.workers)
+        slices = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    self.executor, hash_passwords, passwords[i : i + size]
+                )
+                for i in range(0, len(passwords), size)
+            ]
+        )
+        return [hashed for hashes in slices for hashed in hashes]
+
+
+hash_pool = HashPool()
+
+
+async def import_users(
+    session: AsyncSession,
+    source: str | Path | BinaryIO,
+    *,
+    file_format: str | None = None,
+    group: str | None = AuthRole.DATA_EXPLORER,
+    chunk_size: int = settings.BULK_IMPORT_CHUNK_SIZE,
+    pool: HashPool = hash_pool,
+) -> UserImportReport:
+    """
+    Creates the users listed in a CSV or XLSX file.
+
+    The file needs `name`, `email` and `password` columns, `first_name`
+    and `last_name` are optional. Invalid rows are reported and skipped,
+    the valid ones are loaded with COPY (executemany on SQLite) and added
+    to `group`, all in one transaction. The passwords are hashed by
+    `pool`, the import waiting its turn when the pool runs enough of them.
+    """
+    async with pool.imports:
+        return await _import_users(
+            session, source, file_format, group, chunk_size, pool
+        )
+
+
+async def _import_users(
+    session: AsyncSession,
+    source: str | Path | BinaryIO,
+    file_format: str | None,
+    group: str | None,
+    chunk_size: int,
+    pool: HashPool,
+) -> UserImportReport:
+    started = time.perf_counter()
+    report = UserImportReport()
+
+    group_id = None
+    if group:
+        group_id = await session.scalar(
+            select(Group.id).where(Group.name == group)
+        )
+        if group_id is None:
+            raise ValueError(f"Group {group} does not exist.")
+
+    seen_names: set[str] = set()
+    seen_emails: set[str] = set()
+    memberships: list[tuple[int, int]] = []
+    chunks = read_chunks(source, chunk_size, file_format)
+    try:
+        # reading the file blocks, keep it off the event loop
+        while (
+            chunk := await asyncio.to_thread(next, chunks, None)
+        ) is not None:
+            valid, issues = validate_chunk(chunk, seen_names, seen_emails)
+            valid, existing = await reject_existing(session, valid)
+            report.issues += issues + existing
+            if valid.empty:
+                continue
+
+            hashes = await pool.hash(valid["password"].tolist())
+            ids = await reserve_ids(session, User.__table__, len(valid))
+            now = datetime.now()
+            users = [
+                (
+                    user_id,
+                    name,
+                    email,
+                    False,
+                    first_name or None,
+                    last_name or None,
+                    True,
+                    hashed,
+                    now,
+                    str(uuid4()),
+                    AuthMode.LOCAL.value,
+                    now,
+                    0,
+                    False,
+                    False,
+                )
+                for user_id, name, email, first_name, last_name, hashed in zip(
+                    ids,
+                    valid["name"],
+                    valid["email"],
+                    valid["first_name"],
+                    valid["last_name"],
+                    hashes,
+                )
+            ]
+            await copy_rows(session, User.__table__, USER_COLUMNS, users)
+            await copy_rows(
+                session,
+                PasswordHistory.__table__,
+                PASSWORD_HISTORY_COLUMNS,
+                [
+                    (user_id, hashed, now)
+                    for user_id, hashed in zip(ids, hashes)
+                ],
+            )
+            if group_id is not None:
+                memberships += [(user_id, group_id) for user_id in ids]
+            report.imported += len(users)
+
+        await copy_rows(
+            session, user_group, ("user_id", "group_id"), memberships
+        )
+        await session.commit()
+    finally:
+        chunks.close()
+
+    report.issues.sort(key=lambda issue: issue.row)
+    report.rejected = len(report.issues)
+    report.seconds = round(time.perf_counter() - started, 3)
+    return report
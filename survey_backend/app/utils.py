@@ -7,11 +7,20 @@ from jose.exceptions import JWTClaimsError, JWTError
 from jwt import DecodeError, ExpiredSignatureError
 from passlib.context import CryptContext
 from passlib.exc import UnknownHashError
-from sqlalchemy import select
+from sqlalchemy import (
+    Select,
+    case,
+    func,
+    literal,
+    select,
+    union_all,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app import settings
+from app.cache import Cache, mark_changed, track_invalidations
 from app.db.models import AuthMode, User
 
 from .schemas.token import (
@@ -24,6 +33,18 @@ from .schemas.token import (
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# login names and emails of the locked out accounts
+login_lockouts: Cache[bool] = Cache(
+    "login_lockout", ttl=settings.LOGIN_LOCKOUT_TTL
+)
+# the accounts enabled again can log in right away
+track_invalidations(
+    User, login_lockouts, key=lambda user: (user.name or "").lower()
+)
+track_invalidations(
+    User, login_lockouts, key=lambda user: (user.email or "").lower()
+)
+
 
 class LocalTokenVerificationError(Exception):
     """Custom exception for locally generated token verification errors"""
@@ -87,6 +108,32 @@ def create_refresh_token(data: RefreshTokenData) -> str:
     )
 
 
+def login_query(username: str) -> Select:
+    """
+    Returns the query of the user logging in with `username`, as an email
+    or a name regardless of the case.
+
+    The two lookups are separate index probes of the lowercase keys, an OR
+    of the two columns often being planned as a table scan. The user whose
+    email matches comes first.
+    """
+    username = username.lower()
+    matches = union_all(
+        select(User.id, literal(0).label("rank")).where(
+            func.lower(User.email) == username
+        ),
+        select(User.id, literal(1).label("rank")).where(
+            func.lower(User.name) == username
+        ),
+    ).subquery()
+    return (
+        select(User)
+        .join(matches, User.id == matches.c.id)
+        .order_by(matches.c.rank)
+        .limit(1)
+    )
+
+
 async def verify_local_token(token: str, session: AsyncSession) -> User | None:
     """
     Verifies a locally generated token
@@ -180,16 +227,49 @@ def is_local_token(token: str) -> bool:
 
 
 
+async def is_locked_out(username: str) -> bool:
+    """
+    Checks if the login was rejected for a locked out account, without
+    reading the database or hashing the password.
+    """
+    if not settings.CACHE_ENABLED:
+        return False
+    return await login_lockouts.get(username.lower()) is True
+
+
+async def remember_lockout(username: str) -> None:
+    """
+    Rejects the next attempts of `username` before the database lookup.
+    """
+    if settings.CACHE_ENABLED:
+        await login_lockouts.set(username.lower(), True)
+
+
 async def increment_login_attempts_and_get_error_message(
     user: User,
     session: AsyncSession,
     firebase_user: bool = False,
     blocked_by_firebase: bool = False,
 ):
-    # Increment failed login attempts for both user types.
-    if user.failed_login_attempts is None:
-        user.failed_login_attempts = 0
-    user.failed_login_attempts += 1
+    # Increment failed login attempts for both user types, in a single
+    # statement so concurrent attempts never lose an increment.
+    attempts = func.coalesce(User.failed_login_attempts, 0) + 1
+    values = {User.failed_login_attempts: attempts}
+    if not firebase_user:
+        # Local users are blocked in our database.
+        values[User.enabled] = case(
+            (attempts >= settings.PASSWORD_MAX_LOGIN_ATTEMPTS, False),
+            else_=User.enabled,
+        )
+    result = await session.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(values)
+        .returning(User.enabled)
+        .execution_options(synchronize_session="fetch")
+    )
+    enabled = result.scalar_one()
+    mark_changed(session, user)
     await session.commit()
 
     error_message = {
@@ -197,23 +277,9 @@ async def increment_login_attempts_and_get_error_message(
     }
 
     # Firebase users are blocked by Firebase, so we check if it's blocked and return appropriate message.
-    if firebase_user:
-        if blocked_by_firebase:
-            error_message = {
-                "password": (
-                    "You have entered the wrong password too many times. "
-                    "Please try again later use this {{LINK}} if you have forgotten your password."
-                ),
-                "disable_login": True,
-            }
-
-        return error_message
-
-    # Local users are blocked in our database.
-    if user.failed_login_attempts >= settings.PASSWORD_MAX_LOGIN_ATTEMPTS:
-        user.enabled = False
-        await session.commit()
-
+    if (firebase_user and blocked_by_firebase) or (
+        not firebase_user and enabled is False
+    ):
         error_message = {
             "password": (
                 "You have entered the wrong password too many times. "
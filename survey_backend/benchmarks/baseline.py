@@ -0,0 +1,154 @@
+""" Benchmark baselines and their comparison """
+
+import math
+import platform
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+
+# metrics whose increase is a regression, the others regress on decrease
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "error_rate")
+
+
+def percentile(samples: list[float], rank: float) -> float:
+    """
+    Returns the `rank` percentile (0-100) of `samples`, with the nearest
+    rank method, so the value is one of the samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+@dataclass
+class LatencyStats:
+    """
+    Throughput and latency percentiles of a benchmark, in milliseconds.
+    """
+
+    requests: int
+    errors: int
+    seconds: float
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+    @classmethod
+    def from_samples(
+        cls, samples: list[float], errors: int, seconds: float
+    ) -> "LatencyStats":
+        """
+        Summarizes the durations in seconds of the requests of a run taking
+        `seconds` overall.
+        """
+        milliseconds = [sample * 1000 for sample in samples]
+        return cls(
+            requests=len(samples),
+            errors=errors,
+            seconds=round(seconds, 6),
+            throughput=round(len(samples) / seconds, 3) if seconds else 0.0,
+            p50_ms=round(percentile(milliseconds, 50), 6),
+            p95_ms=round(percentile(milliseconds, 95), 6),
+            p99_ms=round(percentile(milliseconds, 99), 6),
+        )
+
+
+@dataclass
+class Regression:
+    """
+    Metric of a benchmark worse than its baseline beyond the threshold.
+    """
+
+    benchmark: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        if not self.baseline:
+            return math.inf
+        return (self.current - self.baseline) / self.baseline
+
+    def __str__(self) -> str:
+        return (
+            f"{self.benchmark} {self.metric}: {self.baseline:g} ->"
+            f" {self.current:g} ({self.change:+.1%})"
+        )
+
+
+@dataclass
+class Baseline:
+    """
+    Results of a benchmark suite along with the run configuration.
+    """
+
+    suite: str
+    results: dict[str, LatencyStats]
+    config: dict[str, Any] = field(default_factory=dict)
+    created_at: str = field(
+        default_factory=lambda: datetime.now(timezone.utc).isoformat()
+    )
+    machine: dict[str, str] = field(
+        default_factory=lambda: {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        }
+    )
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(
+            orjson.dumps(
+                asdict(self), option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+            )
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "Baseline":
+        data = orjson.loads(path.read_bytes())
+        data["results"] = {
+            name: LatencyStats(**stats)
+            for name, stats in data["results"].items()
+        }
+        return cls(**data)
+
+
+def compare(
+    baseline: Baseline,
+    current: Baseline,
+    threshold: float = 0.1,
+    metrics: tuple[str, ...] = ("throughput",) + LOWER_IS_BETTER,
+) -> list[Regression]:
+    """
+    Lists the metrics of `current` worse than in `baseline` by more than
+    `threshold` (0.1 being 10%). Benchmarks missing on either side are
+    ignored.
+    """
+    regressions = []
+    for name, stats in current.results.items():
+        baseline_stats = baseline.results.get(name)
+        if baseline_stats is None:
+            continue
+        for metric in metrics:
+            before = getattr(baseline_stats, metric)
+            after = getattr(stats, metric)
+            if metric in LOWER_IS_BETTER:
+                worse = after > before * (1 + threshold)
+            else:
+                worse = after < before * (1 - threshold)
+            if worse:
+                regressions.append(Regression(name, metric, before, after))
+    return regressions
@@ -0,0 +1,414 @@
+""" HTTP load test of the API """
+
+import asyncio
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, List, Optional
+
+import httpx
+import typer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing_extensions import Annotated
+
+from app import settings
+from app.db.database import DBManager
+from app.db.engines import run_and_dispose
+from app.db.models import SME, AuthRole, Group, Module, Startups, User
+from app.utils import encrypt_password
+
+from .baseline import BASELINES_DIR, Baseline, LatencyStats, compare
+
+# create CLI app
+app = typer.Typer()
+
+USER_PREFIX = "benchmark_user_"
+PASSWORD = "B3nchmark-passw0rd"
+MODULE_NAME = "benchmark"
+QUESTIONS = 20
+
+
+@dataclass
+class BenchmarkData:
+    """
+    Rows the scenarios work on, seeded in the database beforehand.
+    """
+
+    users: list[str]
+    module_id: int
+    sme_ids: list[int]
+    startup_ids: list[int]
+
+
+@dataclass
+class Worker:
+    """
+    Client of a benchmark user. Each worker logs in as its own user, since
+    a login or a refresh revokes the previous refresh token of the user.
+    """
+
+    client: httpx.AsyncClient
+    username: str
+    access_token: str = ""
+    refresh_token: str = ""
+    iteration: int = 0
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    def update_tokens(self, response: httpx.Response) -> None:
+        if response.is_success:
+            tokens = response.json()
+            self.access_token = tokens["access_token"]
+            self.refresh_token = tokens["refresh_token"]
+
+
+@dataclass
+class Scenario:
+    """
+    Request sent repeatedly by the workers.
+
+    `request` returns the keyword arguments of `httpx.AsyncClient.request`
+    for a worker, and `after` sees the responses, to keep the worker tokens
+    up to date.
+    """
+
+    name: str
+    request: Callable[[Worker, BenchmarkData], dict[str, Any]]
+    after: Callable[[Worker, httpx.Response], None] | None = None
+
+
+def _login(worker: Worker, _: BenchmarkData) -> dict[str, Any]:
+    return {
+        "method": "POST",
+        "url": "/token",
+        "data": {"username": worker.username, "password": PASSWORD},
+    }
+
+
+def _refresh(worker: Worker, _: BenchmarkData) -> dict[str, Any]:
+    return {
+        "method": "POST",
+        "url": "/token/refresh",
+        "json": {"refresh_token": worker.refresh_token},
+    }
+
+
+def _get(url: str, **params: Any):
+    def request(worker: Worker, data: BenchmarkData) -> dict[str, Any]:
+        return {
+            "method": "GET",
+            "url": url,
+            "headers": worker.headers,
+            "params": {
+                name: value(data) if callable(value) else value
+                for name, value in params.items()
+            },
+        }
+
+    return request
+
+
+def _save_sme(worker: Worker, data: BenchmarkData) -> dict[str, Any]:
+    worker.iteration += 1
+    return {
+        "method": "POST",
+        "url": "/module/save_sme_value",
+        "headers": worker.headers,
+        "json": [
+            {"sme_id": sme_id, "value": worker.iteration % 5}
+            for sme_id in data.sme_ids
+        ],
+    }
+
+
+def _save_startup(worker: Worker, data: BenchmarkData) -> dict[str, Any]:
+    worker.iteration += 1
+    return {
+        "method": "POST",
+        "url": "/module/save_startup_value",
+        "headers": worker.headers,
+        "json": [
+            {"startup_id": startup_id, "value": worker.iteration % 3}
+            for startup_id in data.startup_ids
+        ],
+    }
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("token", _login, Worker.update_tokens),
+        Scenario("token_refresh", _refresh, Worker.update_tokens),
+        Scenario("users", _get("/users", limit=100)),
+        Scenario("current_user", _get("/users/current_user")),
+        Scenario(
+            "module_sme",
+            _get("/module/sme", module_id=lambda data: data.module_id),
+        ),
+        Scenario("save_sme_value", _save_sme),
+        Scenario("save_startup_value", _save_startup),
+    )
+}
+
+
+async def seed_benchmark_data(
+    session: AsyncSession, workers: int
+) -> BenchmarkData:
+    """
+    Creates the admin users of the workers and a module with its questions,
+    reusing those of a previous run. The users log in with `PASSWORD`, the
+    database must be a disposable one.
+    """
+    group = await session.scalar(select(Group).filter_by(name=AuthRole.ADMIN))
+    if group is None:
+        group = Group(name=AuthRole.ADMIN, description="Administrators")
+        session.add(group)
+
+    names = [f"{USER_PREFIX}{i}" for i in range(workers)]
+    existing = set(
+        await session.scalars(select(User.name).where(User.name.in_(names)))
+    )
+    password = encrypt_password(PASSWORD)
+    for name in names:
+        if name not in existing:
+            session.add(User(name=name, password=password, groups=[group]))
+    await session.flush()
+
+    module = await session.scalar(
+        select(Module).filter_by(module_name=MODULE_NAME)
+    )
+    if module is None:
+        owner = await session.scalar(select(User).filter_by(name=names[0]))
+        module = Module(user_id=owner.id, module_name=MODULE_NAME)
+        session.add(module)
+        await session.flush()
+        session.add_all(
+            SME(
+                module_id=module.id,
+                heading=f"Heading {i // 5}",
+                question=f"Question {i}",
+                value="1, 2, 3, 4, 5",
+            )
+            for i in range(QUESTIONS)
+        )
+        session.add_all(
+            Startups(
+                module_id=module.id,
+                question=f"Question {i}",
+                option_1="A",
+                option_2="B",
+                option_3="C",
+            )
+            for i in range(QUESTIONS)
+        )
+    await session.commit()
+
+    sme_ids = await session.scalars(
+        select(SME.id).filter_by(module_id=module.id).order_by(SME.id)
+    )
+    startup_ids = await session.scalars(
+        select(Startups.id)
+        .filter_by(module_id=module.id)
+        .order_by(Startups.id)
+    )
+    return BenchmarkData(names, module.id, list(sme_ids), list(startup_ids))
+
+
+async def run_scenario(
+    scenario: Scenario,
+    workers: list[Worker],
+    data: BenchmarkData,
+    requests: int,
+    warmup: int = 0,
+) -> LatencyStats:
+    """
+    Sends `requests` requests of `scenario` with the workers running
+    concurrently, after `warmup` requests left out of the measures.
+    """
+    samples: list[float] = []
+    errors = 0
+    remaining = warmup + requests
+    # the throughput is measured from the end of the warmup
+    measure_start: float | None = None
+
+    async def work(worker: Worker) -> None:
+        nonlocal errors, remaining, measure_start
+        while remaining > 0:
+            remaining -= 1
+            measured = remaining < requests
+            start = perf_counter()
+            if measured and measure_start is None:
+                measure_start = start
+            try:
+                response = await worker.client.request(
+                    **scenario.request(worker, data)
+                )
+            except httpx.HTTPError:
+                failed = True
+            else:
+                failed = response.is_error
+                if scenario.after is not None:
+                    scenario.after(worker, response)
+            if measured:
+                samples.append(perf_counter() - start)
+                errors += failed
+
+    await asyncio.gather(*(work(worker) for worker in workers))
+    seconds = perf_counter() - measure_start if samples else 0.0
+    return LatencyStats.from_samples(samples, errors, seconds)
+
+
+@dataclass
+class LoadTest:
+    """
+    Runs the scenarios one after the other against the app in-process, or
+    against the server at `url`.
+    """
+
+    url: str | None = None
+    concurrency: int = 8
+    requests: int = 200
+    warmup: int = 20
+    scenarios: list[str] = field(default_factory=lambda: list(SCENARIOS))
+
+    def _client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.concurrency)
+        if self.url:
+            return httpx.AsyncClient(base_url=self.url, limits=limits)
+        # pylint: disable = import-outside-toplevel
+        from app.main import app as asgi_app
+
+        return httpx.AsyncClient(
+            app=asgi_app, base_url="http://benchmark", limits=limits
+        )
+
+    async def run(self, data: BenchmarkData) -> Baseline:
+        results = {}
+        async with self._client() as client:
+            workers = [
+                Worker(client, username)
+                for username in data.users[: self.concurrency]
+            ]
+            # every scenario but the login one needs the tokens
+            for worker in workers:
+                worker.update_tokens(
+                    await client.request(**_login(worker, data))
+                )
+            for name in self.scenarios:
+                results[name] = await run_scenario(
+                    SCENARIOS[name],
+                    workers,
+                    data,
+                    self.requests,
+                    self.warmup,
+                )
+        return Baseline(
+            suite="http",
+            results=results,
+            config={
+                "target": self.url or "in-process",
+                "concurrency": self.concurrency,
+                "requests": self.requests,
+                "warmup": self.warmup,
+            },
+        )
+
+
+def print_results(baseline: Baseline) -> None:
+    print(
+        f"{'scenario':<20} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9}"
+        f" {'p99 ms':>9} {'errors':>7}"
+    )
+    for name, stats in baseline.results.items():
+        print(
+            f"{name:<20} {stats.throughput:>10.1f} {stats.p50_ms:>9.2f}"
+            f" {stats.p95_ms:>9.2f} {stats.p99_ms:>9.2f} {stats.errors:>7}"
+        )
+
+
+async def async_run(load_test: LoadTest) -> Baseline:
+    db_manager = DBManager()
+    async with db_manager.get_session() as session:
+        data = await seed_benchmark_data(session, load_test.concurrency)
+    return await load_test.run(data)
+
+
+@app.command()
+def run(
+    url: Annotated[
+        str, typer.Option(help="Server URL, the app runs in-process if empty")
+    ] = "",
+    concurrency: int = 8,
+    requests: Annotated[
+        int, typer.Option(help="Measured requests per scenario")
+    ] = 200,
+    warmup: int = 20,
+    # typer 0.9 does not read the `X | None` unions of its parameters
+    scenario: Annotated[
+        Optional[List[str]],
+        typer.Option(help="Scenarios to run, all if omitted"),
+    ] = None,
+    output: Path = BASELINES_DIR / "http.json",
+    baseline: Annotated[
+        Optional[Path], typer.Option(help="Baseline to compare the run with")
+    ] = None,
+    threshold: float = 0.1,
+) -> None:
+    """
+    Benchmarks the API endpoints and saves the results as a baseline.
+
+    The benchmark users and module are created in the configured database,
+    which the server at `url` must share. Its admin users log in with a
+    published password, so BENCHMARK_DATABASE must confirm the database is
+    a disposable one.
+    """
+    if not settings.BENCHMARK_DATABASE:
+        raise typer.BadParameter(
+            "the benchmark creates admin users with a published password,"
+            " set BENCHMARK_DATABASE=true if the configured database is a"
+            " disposable one"
+        )
+    scenario = scenario or list(SCENARIOS)
+    unknown = set(scenario) - SCENARIOS.keys()
+    if unknown:
+        raise typer.BadParameter(f"unknown scenarios {', '.join(unknown)}")
+    load_test = LoadTest(
+        url=url or None,
+        concurrency=concurrency,
+        requests=requests,
+        warmup=warmup,
+        scenarios=scenario,
+    )
+    results = asyncio.run(run_and_dispose(async_run(load_test)))
+    print_results(results)
+    results.save(output)
+    print(f"Results saved to {output}")
+    if baseline is not None:
+        _report(Baseline.load(baseline), results, threshold)
+
+
+@app.command("compare")
+def compare_baselines(
+    baseline: Path, current: Path, threshold: float = 0.1
+) -> None:
+    """
+    Compares two result files, failing on the metrics of `current` worse
+    than in `baseline` by more than `threshold` (0.1 being 10%).
+    """
+    _report(Baseline.load(baseline), Baseline.load(current), threshold)
+
+
+def _report(baseline: Baseline, current: Baseline, threshold: float) -> None:
+    regressions = compare(baseline, current, threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        raise typer.Exit(code=1)
+    print(f"No regression beyond {threshold:.0%}")
+
+
+if __name__ == "__main__":
+    app()
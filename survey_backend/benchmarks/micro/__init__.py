@@ -0,0 +1 @@
+""" Microbenchmarks of the hot functions """
@@ -0,0 +1,205 @@
+""" Microbenchmark configuration """
+
+import asyncio
+import inspect
+from dataclasses import replace
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Generator
+
+import pytest
+import pytest_asyncio
+from pytest import Config, FixtureRequest, Parser, Session
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db.database import Base
+
+from ..baseline import Baseline, LatencyStats, compare
+
+# pylint: disable = redefined-outer-name
+
+# metrics the regression gate checks, the tail latencies being too noisy
+# for calls of a few microseconds
+GATE_METRICS = ("throughput", "p50_ms")
+results: dict[str, LatencyStats] = {}
+regressions: list = []
+
+
+def pytest_addoption(parser: Parser) -> None:
+    group = parser.getgroup("micro", "microbenchmarks")
+    group.addoption(
+        "--micro-save",
+        type=Path,
+        help="Save the results as a baseline to this file",
+    )
+    group.addoption(
+        "--micro-compare",
+        type=Path,
+        help="Fail on the results worse than this baseline",
+    )
+    group.addoption(
+        "--micro-threshold",
+        type=float,
+        default=0.2,
+        help="Tolerated slowdown against the baseline (0.2 being 20%%)",
+    )
+    group.addoption(
+        "--micro-max-time",
+        type=float,
+        default=1.0,
+        help="Seconds spent measuring each function",
+    )
+
+
+class Benchmark:
+    """
+    Times a function, in the way of pytest-benchmark. The fixture and options
+    are named apart from those of pytest-benchmark, which may be installed.
+
+    Calls are grouped in rounds lasting at least `min_round_time`, so the
+    timer resolution does not matter, and rounds are repeated until
+    `max_rounds` or `max_time`. Coroutine functions are awaited in the
+    event loop, the calls of a round within a single task.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loop: asyncio.AbstractEventLoop,
+        max_time: float = 1.0,
+        min_round_time: float = 0.001,
+        max_rounds: int = 1000,
+        min_rounds: int = 5,
+    ):
+        self.name = name
+        self.loop = loop
+        self.max_time = max_time
+        self.min_round_time = min_round_time
+        self.max_rounds = max_rounds
+        self.min_rounds = min_rounds
+
+    def _time(
+        self, function: Callable, args: tuple, kwargs: dict, number: int
+    ) -> float:
+        if inspect.iscoroutinefunction(function):
+
+            async def run() -> float:
+                start = perf_counter()
+                for _ in range(number):
+                    await function(*args, **kwargs)
+                return perf_counter() - start
+
+            return self.loop.run_until_complete(run())
+
+        start = perf_counter()
+        for _ in range(number):
+            function(*args, **kwargs)
+        return perf_counter() - start
+
+    def __call__(self, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        # calibrate the calls per round, warming up on the way
+        number = 1
+        while (
+            elapsed := self._time(function, args, kwargs, number)
+        ) < self.min_round_time:
+            number *= 10
+        samples = [elapsed / number]
+        total = elapsed
+        while len(samples) < self.max_rounds and (
+            total < self.max_time or len(samples) < self.min_rounds
+        ):
+            elapsed = self._time(function, args, kwargs, number)
+            samples.append(elapsed / number)
+            total += elapsed
+
+        stats = LatencyStats.from_samples(samples, 0, total)
+        # rounds of `number` calls
+        results[self.name] = replace(
+            stats,
+            requests=len(samples) * number,
+            throughput=round(len(samples) * number / total, 3),
+        )
+
+        if inspect.iscoroutinefunction(function):
+            return self.loop.run_until_complete(function(*args, **kwargs))
+        return function(*args, **kwargs)
+
+
+@pytest.fixture(scope="session")
+def event_loop() -> Generator:
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def bench(
+    request: FixtureRequest, event_loop: asyncio.AbstractEventLoop
+) -> Benchmark:
+    """
+    Times the function it is called with, recording the results of the test.
+    """
+    return Benchmark(
+        request.node.name,
+        event_loop,
+        max_time=request.config.getoption("--micro-max-time"),
+    )
+
+
+@pytest_asyncio.fixture(name="session")
+async def session():
+    """
+    Session of an in-memory database
+    """
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        yield db
+    await engine.dispose()
+
+
+def pytest_sessionfinish(session: Session, exitstatus: int) -> None:
+    if not results:
+        return
+    config = session.config
+    current = Baseline(
+        suite="micro",
+        results=dict(sorted(results.items())),
+        config={"max_time": config.getoption("--micro-max-time")},
+    )
+    save_path = config.getoption("--micro-save")
+    if save_path:
+        current.save(save_path)
+    compare_path = config.getoption("--micro-compare")
+    if compare_path:
+        regressions.extend(
+            compare(
+                Baseline.load(compare_path),
+                current,
+                config.getoption("--micro-threshold"),
+                GATE_METRICS,
+            )
+        )
+        if regressions and exitstatus == 0:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, config: Config) -> None:
+    if not results:
+        return
+    terminalreporter.section("benchmarks")
+    terminalreporter.write_line(
+        f"{'benchmark':<45} {'calls/s':>12} {'p50 us':>10} {'p95 us':>10}"
+    )
+    for name, stats in sorted(results.items()):
+        terminalreporter.write_line(
+            f"{name:<45} {stats.throughput:>12.0f}"
+            f" {stats.p50_ms * 1000:>10.2f} {stats.p95_ms * 1000:>10.2f}"
+        )
+    for regression in regressions:
+        terminalreporter.write_line(f"REGRESSION {regression}", red=True)
+    if config.getoption("--micro-save"):
+        terminalreporter.write_line(
+            f"Results saved to {config.getoption('--micro-save')}"
+        )
@@ -0,0 +1,27 @@
+""" Microbenchmarks of the password checks """
+
+from app.routers.utils import is_valid_password
+from app.utils import check_password, encrypt_password
+
+PASSWORD = "B3nchmark-passw0rd"
+
+
+def test_is_valid_password(bench):
+    assert (
+        bench(is_valid_password, PASSWORD, "benchmark", True, "b@x.io")
+        is None
+    )
+
+
+def test_is_valid_password_too_short(bench):
+    assert bench(is_valid_password, "short", "benchmark")
+
+
+def test_check_password(bench):
+    hashed = encrypt_password(PASSWORD)
+
+    assert bench(check_password, PASSWORD, hashed)
+
+
+def test_check_password_unknown_hash(bench):
+    assert not bench(check_password, PASSWORD, "not a hash")
@@ -0,0 +1,105 @@
+""" Microbenchmarks of the validation and serialization """
+
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+from starlette.requests import Request
+
+from app.schemas.sme import SmeRequest, SmeValueResponse
+from app.schemas.token import Token
+from app.schemas.user import PaginatedUserGet, UserCreate, UserGet
+from app.schemas.validation_exception_handler import (
+    validation_exception_handler,
+)
+
+USER = {
+    "id": 1,
+    "name": "benchmark",
+    "first_name": "Bench",
+    "last_name": "Mark",
+    "email": "benchmark@example.com",
+    "enabled": True,
+    "created_on": datetime(2024, 1, 1),
+    "last_access": None,
+    "data_last_accessed": datetime(2024, 1, 2),
+    "groups": [{"id": 1, "name": "admin", "description": "Administrators"}],
+    "auth_mode": "LOCAL",
+}
+PAGE = {
+    "start": 0,
+    "end": 100,
+    "total": 1000,
+    "items": [USER | {"id": i, "name": f"user{i}"} for i in range(100)],
+}
+
+
+def test_user_get_parse(bench):
+    assert bench(UserGet.parse_obj, USER).name == "benchmark"
+
+
+def test_paginated_users_parse(bench):
+    assert len(bench(PaginatedUserGet.parse_obj, PAGE).items) == 100
+
+
+def test_paginated_users_json(bench):
+    page = PaginatedUserGet.parse_obj(PAGE)
+
+    assert bench(page.json)
+
+
+def test_user_create_parse(bench):
+    data = {
+        "name": "benchmark",
+        "email": "benchmark@example.com",
+        "password": "B3nchmark-passw0rd",
+    }
+
+    assert bench(UserCreate.parse_obj, data).email == data["email"]
+
+
+def test_sme_parse(bench):
+    data = [
+        {
+            "module_id": 1,
+            "heading": "CONSUMER VALUE",
+            "question": f"Question {i}",
+            "value": "BY > 5%,By 2-5%,By 0-5%,FLAT SHARE",
+            "selected_value": "2",
+        }
+        for i in range(20)
+    ]
+
+    assert len(bench(lambda: [SmeRequest(**row) for row in data])) == 20
+
+
+def test_token_json(bench):
+    token = Token(
+        access_token="a" * 200,
+        refresh_token="r" * 220,
+        token_type="bearer",
+        email_verified=True,
+    )
+
+    assert bench(token.json)
+
+
+@pytest.fixture(name="validation_error")
+def validation_error_fixture() -> ValidationError:
+    try:
+        SmeValueResponse.parse_obj({"sme_id": "one", "value": "two"})
+    except ValidationError as err:
+        return err
+    raise AssertionError("the data is valid")
+
+
+def test_validation_exception_handler(
+    bench, validation_error: ValidationError
+):
+    request = Request({"type": "http", "method": "POST", "headers": []})
+
+    response = bench(
+        validation_exception_handler, request, validation_error
+    )
+
+    assert response.status_code == 422
@@ -0,0 +1,89 @@
+""" Microbenchmarks of the token handling """
+
+from datetime import datetime, timedelta
+
+import pytest
+from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import settings
+from app.db.models import User
+from app.schemas.token import (
+    AccessTokenData,
+    RefreshTokenData,
+    TokenValidationErrorEnum,
+)
+from app.utils import (
+    LocalTokenVerificationError,
+    create_access_token,
+    create_refresh_token,
+    is_local_token,
+    verify_local_token,
+)
+
+NOW = datetime.now().replace(microsecond=0)
+
+
+@pytest.fixture(name="token_data")
+def token_data_fixture() -> AccessTokenData:
+    return AccessTokenData(
+        sub="benchmark", iat=NOW, exp=NOW + settings.JWT_EXPIRATION_DELTA
+    )
+
+
+def test_create_access_token(bench, token_data: AccessTokenData):
+    token = bench(create_access_token, token_data)
+
+    assert jwt.get_unverified_claims(token)["sub"] == "benchmark"
+
+
+def test_create_refresh_token(bench):
+    data = RefreshTokenData(
+        sub="benchmark",
+        iat=NOW,
+        exp=NOW + settings.REFRESH_TOKEN_EXPIRATION_DELTA,
+        uid="b3nchmark",
+    )
+
+    assert bench(create_refresh_token, data)
+
+
+def test_is_local_token(bench, token_data: AccessTokenData):
+    assert bench(is_local_token, create_access_token(token_data))
+
+
+def test_is_local_token_invalid(bench):
+    assert not bench(is_local_token, "not.a.token")
+
+
+def test_verify_local_token(
+    bench, token_data: AccessTokenData, session: AsyncSession, event_loop
+):
+    session.add(User(name="benchmark", token_iat=NOW))
+    event_loop.run_until_complete(session.commit())
+
+    user = bench(
+        verify_local_token, create_access_token(token_data), session
+    )
+
+    assert user.name == "benchmark"
+
+
+def test_verify_local_token_expired(bench):
+    token = create_access_token(
+        AccessTokenData(
+            sub="benchmark",
+            iat=NOW - timedelta(days=2),
+            exp=NOW - timedelta(days=1),
+        )
+    )
+
+    async def verify() -> TokenValidationErrorEnum | None:
+        try:
+            # rejected before any query
+            await verify_local_token(token, None)
+        except LocalTokenVerificationError as err:
+            return err.code
+        return None
+
+    assert bench(verify) is not None
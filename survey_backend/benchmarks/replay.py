@@ -0,0 +1,253 @@
+""" Replay of the recorded traffic """
+
+import asyncio
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Iterable, List, Optional
+
+import httpx
+import orjson
+import typer
+from typing_extensions import Annotated
+
+from app.middleware.recorder import FORM_CONTENT_TYPE, REDACTED
+
+from .baseline import LOWER_IS_BETTER, Baseline, LatencyStats, compare
+
+# create CLI app
+app = typer.Typer()
+
+# the throughput of a replay depends on its speed
+REPLAY_METRICS = LOWER_IS_BETTER
+PLACEHOLDERS = {"str": "x", "int": 0, "float": 0.0, "bool": False}
+
+
+def read_traces(paths: Iterable[Path]) -> list[dict[str, Any]]:
+    """
+    Reads the traces of the files, or of the rotated files of the
+    directories, in time order.
+    """
+    traces = []
+    for path in paths:
+        files = sorted(path.glob("*.ndjson*")) if path.is_dir() else [path]
+        for trace_file in files:
+            with open(trace_file, "rb") as f_trace:
+                traces += [orjson.loads(line) for line in f_trace if line]
+    return sorted(traces, key=lambda trace: trace["ts"])
+
+
+def from_shape(value: Any) -> Any:
+    """
+    Builds a placeholder value of the recorded shape, for the traces
+    recorded without their bodies.
+    """
+    if isinstance(value, dict):
+        if value.keys() == {"length", "item"}:
+            return [from_shape(value["item"])] * value["length"]
+        return {key: from_shape(item) for key, item in value.items()}
+    return PLACEHOLDERS.get(value)
+
+
+def _unredact(value: Any, secrets: dict[str, str]) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: secrets.get(key, item)
+            if item == REDACTED
+            else _unredact(item, secrets)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_unredact(item, secrets) for item in value]
+    return value
+
+
+def build_request(
+    trace: dict[str, Any],
+    token: str | None = None,
+    secrets: dict[str, str] | None = None,
+) -> dict[str, Any]:
+    """
+    Returns the keyword arguments of `httpx.AsyncClient.request` sending
+    the request of `trace`. The redacted values are taken from `secrets`
+    by field name, and the bearer token is `token`.
+    """
+    secrets = secrets or {}
+    request: dict[str, Any] = {
+        "method": trace["method"],
+        "url": trace["path"],
+        "params": _unredact(trace["query"], secrets),
+        "headers": {},
+    }
+    if trace["auth"] == "bearer" and token:
+        request["headers"]["Authorization"] = f"Bearer {token}"
+    elif trace["auth"] == "api_key" and "access_key" in secrets:
+        request["headers"]["access_key"] = secrets["access_key"]
+
+    body = trace["body"]
+    if body is None and trace["shape"] is not None:
+        body = from_shape(trace["shape"])
+    if body is not None:
+        body = _unredact(body, secrets)
+        if trace["content_type"] == FORM_CONTENT_TYPE:
+            request["data"] = body
+        else:
+            request["json"] = body
+    return request
+
+
+def _key(trace: dict[str, Any]) -> str:
+    return f"{trace['method']} {trace['route'] or trace['path']}"
+
+
+def summarize(
+    durations: dict[str, list[float]], errors: dict[str, int], seconds: float
+) -> dict[str, LatencyStats]:
+    return {
+        key: LatencyStats.from_samples(samples, errors.get(key, 0), seconds)
+        for key, samples in sorted(durations.items())
+    }
+
+
+def recorded_stats(traces: list[dict[str, Any]]) -> dict[str, LatencyStats]:
+    """
+    Latencies of the traced requests, per route. Server errors count as
+    errors, the other statuses being part of the traffic.
+    """
+    durations: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    for trace in traces:
+        key = _key(trace)
+        durations.setdefault(key, []).append(trace["duration_ms"] / 1000)
+        errors[key] = errors.get(key, 0) + (trace["status"] >= 500)
+    seconds = traces[-1]["ts"] - traces[0]["ts"] if traces else 0
+    return summarize(durations, errors, seconds)
+
+
+@dataclass
+class Replay:
+    """
+    Sends the traced requests with their recorded inter-arrival times,
+    divided by `speed`. A speed of 0 sends them as fast as `concurrency`
+    allows.
+    """
+
+    client: httpx.AsyncClient
+    speed: float = 1.0
+    concurrency: int = 100
+    token: str | None = None
+    secrets: dict[str, str] = field(default_factory=dict)
+
+    async def _send(
+        self, trace: dict[str, Any], semaphore: asyncio.Semaphore
+    ) -> tuple[str, float, bool]:
+        async with semaphore:
+            start = perf_counter()
+            try:
+                response = await self.client.request(
+                    **build_request(trace, self.token, self.secrets)
+                )
+            except httpx.HTTPError:
+                failed = True
+            else:
+                failed = response.status_code >= 500
+            return _key(trace), perf_counter() - start, failed
+
+    async def run(
+        self, traces: list[dict[str, Any]]
+    ) -> dict[str, LatencyStats]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        start = perf_counter()
+        for trace in traces:
+            if self.speed > 0:
+                offset = (trace["ts"] - traces[0]["ts"]) / self.speed
+                delay = start + offset - perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self._send(trace, semaphore)))
+
+        durations: dict[str, list[float]] = {}
+        errors: dict[str, int] = {}
+        for key, duration, failed in await asyncio.gather(*tasks):
+            durations.setdefault(key, []).append(duration)
+            errors[key] = errors.get(key, 0) + failed
+        return summarize(durations, errors, perf_counter() - start)
+
+
+def print_comparison(
+    recorded: dict[str, LatencyStats], replayed: dict[str, LatencyStats]
+) -> None:
+    print(
+        f"{'route':<40} {'requests':>8}"
+        "  p50/p95/p99 ms recorded -> replayed"
+    )
+    for key, stats in replayed.items():
+        before = recorded[key]
+        print(
+            f"{key:<40} {stats.requests:>8}"
+            f"  {before.p50_ms:.1f}/{before.p95_ms:.1f}/{before.p99_ms:.1f}"
+            f" -> {stats.p50_ms:.1f}/{stats.p95_ms:.1f}/{stats.p99_ms:.1f}"
+        )
+
+
+async def async_replay(
+    traces: list[dict[str, Any]], url: str, **options: Any
+) -> dict[str, LatencyStats]:
+    async with httpx.AsyncClient(base_url=url) as client:
+        return await Replay(client, **options).run(traces)
+
+
+@app.command()
+def replay(
+    traces: Annotated[
+        list[Path], typer.Argument(help="Trace files or directories")
+    ],
+    url: Annotated[str, typer.Option(help="URL of the test instance")],
+    speed: Annotated[
+        float, typer.Option(help="Speed factor, 0 for no pauses")
+    ] = 1.0,
+    concurrency: int = 100,
+    token: Annotated[
+        str, typer.Option(help="Bearer token of the authenticated requests")
+    ] = "",
+    # typer 0.9 does not read the `X | None` unions of its parameters
+    secret: Annotated[
+        Optional[List[str]],
+        typer.Option(help="Value of a redacted field, as name=value"),
+    ] = None,
+    output: Optional[Path] = None,
+    threshold: float = 0.2,
+) -> None:
+    """
+    Replays recorded traffic against a test instance and compares the
+    latencies per route with the recorded ones.
+    """
+    secret = secret or []
+    traces_read = read_traces(traces)
+    replayed = asyncio.run(
+        async_replay(
+            traces_read,
+            url,
+            speed=speed,
+            concurrency=concurrency,
+            token=token or None,
+            secrets=dict(item.split("=", 1) for item in secret),
+        )
+    )
+    recorded = recorded_stats(traces_read)
+    print_comparison(recorded, replayed)
+    current = Baseline("replay", replayed, config={"speed": speed})
+    if output is not None:
+        current.save(output)
+    regressions = compare(
+        Baseline("recorded", recorded), current, threshold, REPLAY_METRICS
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
@@ -2,11 +2,16 @@ import asyncio
 import os
 import subprocess
 import traceback
+from pathlib import Path
 
 import typer
 from sqlalchemy.sql import text
+from typing_extensions import Annotated
 
+from app import settings
 from app.db.database import DBManager
+from app.db.dump import DEFAULT_CHUNK_SIZE, dump_database, restore_database
+from app.db.engines import run_and_dispose
 from app.db.models import AuthRole
 from cli.manage_db import async_create_all, async_create_user, async_drop_all
 from cli.manage_forms import async_create
@@ -192,11 +197,71 @@ def db_dump(path: str):
 
     """
     try:
-        asyncio.run(async_db_dump(path))
+        asyncio.run(run_and_dispose(async_db_dump(path)))
         print("success")
     except Exception:
         traceback.print_exc()
 
 
+@app.command()
+def dump(
+    directory: Path,
+    database_uri: str = typer.Option(
+        None, help="Defaults to the leader database of the settings"
+    ),
+    table: Annotated[list[str], typer.Option()] = [],
+    jobs: int = 4,
+    compression: str = typer.Option(None, help="zstd or gzip"),
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    """
+    Dump the database tables into a directory.
+
+    Postgres tables are streamed with binary COPY in parallel, from one
+    snapshot. Each table is written to compressed chunk files listed in
+    the manifest.json of the directory.
+    """
+    manifest = asyncio.run(
+        run_and_dispose(
+            dump_database(
+                database_uri or settings.LIVE_DATABASE_LEADER_URI,
+                directory,
+                tables=table,
+                jobs=jobs,
+                compression=compression,
+                chunk_size=chunk_size,
+            )
+        )
+    )
+    for entry in manifest["tables"]:
+        print(f"{entry['name']}: {entry['rows']} rows")
+
+
+@app.command()
+def restore(
+    directory: Path,
+    database_uri: str = typer.Option(
+        None, help="Defaults to the leader database of the settings"
+    ),
+    jobs: int = 4,
+    truncate: bool = True,
+):
+    """
+    Restore the tables of a dump directory, replacing their content.
+    """
+    manifest = asyncio.run(
+        run_and_dispose(
+            restore_database(
+                database_uri or settings.LIVE_DATABASE_LEADER_URI,
+                directory,
+                jobs=jobs,
+                truncate=truncate,
+            )
+        )
+    )
+    for entry in manifest["tables"]:
+        print(f"{entry['name']}: {entry['rows']} rows")
+
+
 if __name__ == "__main__":
     app()
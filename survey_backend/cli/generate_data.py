@@ -0,0 +1,399 @@
+""" Generator of synthetic data at production volumes """
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable
+from uuid import UUID
+
+import typer
+from sqlalchemy import Table, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing_extensions import Annotated
+
+from app.catalog import bump_catalog_version
+from app.db.bulk import copy_rows, reserve_ids
+from app.db.database import Base
+from app.db.engines import get_engine, run_and_dispose
+from app.db.models import (
+    SME,
+    AuthMode,
+    AuthRole,
+    CurrentSituation,
+    Group,
+    Module,
+    PasswordHistory,
+    Startups,
+    User,
+    user_group,
+)
+from app.db.seed import read_fixtures
+from app.user_import import PASSWORD_HISTORY_COLUMNS, USER_COLUMNS
+
+# create CLI app
+app = typer.Typer()
+
+PASSWORD = "Synth3tic-passw0rd"
+# hash of PASSWORD with a fixed salt: hashing every password would take
+# hours at these volumes, and a random salt would break the determinism
+PASSWORD_HASH = "$2b$12$SyntheticDataSaltSalt.30WjJbPjtu1Z6RUsy6ycps3pJbKAu7C"
+EPOCH = datetime(2021, 1, 1)
+PERIOD = timedelta(days=3 * 365)
+FIRST_NAMES = (
+    "Alice", "Ben", "Chloe", "David", "Emma", "Farid", "Giulia", "Hugo",
+    "Ines", "Jonas", "Kenji", "Laura", "Marco", "Nadia", "Oscar", "Priya",
+    "Quentin", "Rosa", "Samuel", "Tara", "Umar", "Vera", "Wei", "Yara",
+)  # fmt: skip
+LAST_NAMES = (
+    "Anderson", "Bianchi", "Costa", "Dubois", "Eriksson", "Fischer",
+    "Garcia", "Hansen", "Ivanova", "Jensen", "Kowalski", "Lopez", "Martin",
+    "Novak", "O'Brien", "Petrov", "Rossi", "Schmidt", "Tanaka", "Weber",
+)  # fmt: skip
+DOMAINS = ("example.com", "example.org", "example.net")
+
+# question columns copied from the fixtures, then the answer column
+ANSWER_COLUMNS = {
+    SME.__table__: (
+        ("heading", "question", "value"),
+        "selected_value",
+    ),
+    Startups.__table__: (
+        ("question", "option_1", "option_2", "option_3"),
+        "selected_option",
+    ),
+    CurrentSituation.__table__: (
+        ("heading", "sub_heading", "level_values"),
+        "selected_value",
+    ),
+}
+
+
+@dataclass
+class GeneratorConfig:
+    """
+    Volumes of the generated data. The same seed and volumes generate the
+    same rows, the ids aside.
+    """
+
+    users: int = 100_000
+    seed: int = 0
+    prefix: str = "synthetic"
+    chunk_size: int = 10_000
+    # the users log in with a published password, none is an admin unless
+    # asked for
+    admin_ratio: float = 0
+    max_password_history: int = 5
+    modules_per_user: float = 1.5
+
+
+@dataclass
+class GenerationReport:
+    """
+    Rows generated per table.
+    """
+
+    rows: dict[str, int] = field(default_factory=dict)
+    seconds: float = 0
+
+    def add(self, table: Table, count: int) -> None:
+        self.rows[table.name] = self.rows.get(table.name, 0) + count
+
+
+@dataclass
+class Question:
+    """
+    Question template from the seed fixtures, with the answer distribution
+    of the generated answers.
+    """
+
+    table: Table
+    values: tuple
+    options: int
+    # mode of the answers and share of unanswered questions
+    mode: float
+    unanswered: float
+
+    def answer(self, rng: random.Random) -> int | None:
+        if rng.random() < self.unanswered:
+            return None
+        return round(rng.triangular(0, self.options - 1, self.mode))
+
+
+def _questions(rng: random.Random) -> dict[str, list[Question]]:
+    """
+    Returns the questions of the seed fixtures per module name.
+    """
+    questions: dict[str, list[Question]] = {}
+    module_names = []
+    for fixture in read_fixtures():
+        table = Base.metadata.tables[fixture["table"]]
+        if table is Module.__table__:
+            module_names = [row["module_name"] for row in fixture["rows"]]
+        if table not in ANSWER_COLUMNS:
+            continue
+        columns, _ = ANSWER_COLUMNS[table]
+        for row in fixture["rows"]:
+            if table is Startups.__table__:
+                options = 3
+            else:
+                # comma separated options
+                options = len(row[columns[-1]].split(","))
+            questions.setdefault(row["module_id"], []).append(
+                Question(
+                    table=table,
+                    values=tuple(row[column] for column in columns),
+                    options=options,
+                    mode=rng.uniform(0, options - 1),
+                    unanswered=rng.uniform(0.02, 0.2),
+                )
+            )
+    return {name: questions.get(name, []) for name in module_names}
+
+
+def _created_on(rng: random.Random) -> datetime:
+    return EPOCH + timedelta(seconds=int(rng.uniform(0, PERIOD.days * 86400)))
+
+
+def _later(
+    rng: random.Random, start: datetime, mean_days: int = 20
+) -> datetime:
+    # exponential delays, most within days and a few after months
+    offset = rng.expovariate(1 / (mean_days * 86400))
+    return min(start + timedelta(seconds=int(offset)), EPOCH + PERIOD)
+
+
+async def _group_ids(session: AsyncSession) -> dict[AuthRole, int]:
+    result = await session.execute(
+        select(Group.name, Group.id).where(
+            Group.name.in_([AuthRole.ADMIN, AuthRole.DATA_EXPLORER])
+        )
+    )
+    group_ids = {AuthRole(name): group_id for name, group_id in result}
+    missing = {AuthRole.ADMIN, AuthRole.DATA_EXPLORER} - group_ids.keys()
+    if missing:
+        raise ValueError(
+            f"Group {', '.join(sorted(missing))} does not exist,"
+            " create the database first."
+        )
+    return group_ids
+
+
+async def _generate_chunk(
+    session: AsyncSession,
+    rng: random.Random,
+    config: GeneratorConfig,
+    start: int,
+    count: int,
+    group_ids: dict[AuthRole, int],
+    questions: dict[str, list[Question]],
+    report: GenerationReport,
+) -> None:
+    user_ids = await reserve_ids(session, User.__table__, count)
+    users, history, memberships, modules = [], [], [], []
+    for number, user_id in enumerate(user_ids, start):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        created_on = _created_on(rng)
+        enabled = rng.random() > 0.03
+        email = (
+            f"{first_name}.{last_name}.{config.prefix}{number}"
+            f"@{rng.choice(DOMAINS)}"
+        )
+        users.append(
+            (
+                user_id,
+                f"{config.prefix}_{number:08d}",
+                email.lower().replace("'", ""),
+                rng.random() < 0.85,
+                first_name,
+                last_name,
+                enabled,
+                PASSWORD_HASH,
+                created_on,
+                str(UUID(int=rng.getrandbits(128), version=4)),
+                AuthMode.LOCAL.value,
+                _later(rng, created_on),
+                0 if rng.random() < 0.9 else rng.randint(1, 9),
+                not enabled and rng.random() < 0.5,
+                rng.random() < 0.3,
+            )
+        )
+
+        changed_on = created_on
+        for _ in range(rng.randint(1, config.max_password_history)):
+            history.append((user_id, PASSWORD_HASH, changed_on))
+            changed_on = _later(rng, changed_on, mean_days=90)
+
+        memberships.append((user_id, group_ids[AuthRole.DATA_EXPLORER]))
+        if rng.random() < config.admin_ratio:
+            memberships.append((user_id, group_ids[AuthRole.ADMIN]))
+
+        module_count = min(
+            int(rng.expovariate(1 / config.modules_per_user)),
+            len(questions),
+        )
+        modules += [
+            (user_id, name)
+            for name in rng.sample(list(questions), module_count)
+        ]
+
+    module_ids = await reserve_ids(session, Module.__table__, len(modules))
+    answers: dict[Table, list[tuple]] = {}
+    for module_id, (_, name) in zip(module_ids, modules):
+        for question in questions[name]:
+            answers.setdefault(question.table, []).append(
+                (module_id, *question.values, question.answer(rng))
+            )
+
+    report.add(
+        User.__table__,
+        await copy_rows(session, User.__table__, USER_COLUMNS, users),
+    )
+    report.add(
+        PasswordHistory.__table__,
+        await copy_rows(
+            session,
+            PasswordHistory.__table__,
+            PASSWORD_HISTORY_COLUMNS,
+            history,
+        ),
+    )
+    report.add(
+        user_group,
+        await copy_rows(
+            session, user_group, ("user_id", "group_id"), memberships
+        ),
+    )
+    report.add(
+        Module.__table__,
+        await copy_rows(
+            session,
+            Module.__table__,
+            ("id", "user_id", "module_name"),
+            [
+                (module_id, user_id, name)
+                for module_id, (user_id, name) in zip(module_ids, modules)
+            ],
+        ),
+    )
+    for table, rows in answers.items():
+        columns, answer_column = ANSWER_COLUMNS[table]
+        report.add(
+            table,
+            await copy_rows(
+                session,
+                table,
+                ("module_id", *columns, answer_column),
+                rows,
+            ),
+        )
+    if answers:
+        await bump_catalog_version(session)
+
+
+async def generate_data(
+    session: AsyncSession,
+    config: GeneratorConfig,
+    progress: Callable[[int], Any] | None = None,
+) -> GenerationReport:
+    """
+    Generates the users of `config` with their password history, groups,
+    modules and answers, committing every `chunk_size` users.
+
+    Every value is drawn from a random generator seeded with `config.seed`
+    and the questions come from the seed fixtures, so the database must be
+    created first. `progress` is called with the number of users generated
+    so far after each chunk.
+    """
+    started = time.perf_counter()
+    rng = random.Random(config.seed)
+    report = GenerationReport()
+    group_ids = await _group_ids(session)
+    if await session.scalar(
+        select(User.id).where(User.name.startswith(f"{config.prefix}_"))
+    ):
+        raise ValueError(
+            f"Users named {config.prefix}_* exist already, use another prefix."
+        )
+    questions = _questions(rng)
+
+    for start in range(0, config.users, config.chunk_size):
+        count = min(config.chunk_size, config.users - start)
+        await _generate_chunk(
+            session, rng, config, start, count, group_ids, questions, report
+        )
+        await session.commit()
+        if progress is not None:
+            progress(start + count)
+
+    report.seconds = round(time.perf_counter() - started, 3)
+    return report
+
+
+async def async_generate(config: GeneratorConfig, database_uri: str) -> None:
+    """
+    Asynchronous generate.
+    """
+    engine = get_engine(database_uri)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        report = await generate_data(
+            session,
+            config,
+            progress=lambda users: print(f"{users}/{config.users} users"),
+        )
+
+    for table, rows in report.rows.items():
+        print(f"{table}: {rows} rows")
+    print(f"Generated in {report.seconds}s")
+
+
+@app.command()
+def generate(
+    database_uri: Annotated[
+        str,
+        typer.Option(
+            help="Database to fill, never a production one: its users log"
+            " in with a published password"
+        ),
+    ],
+    users: Annotated[int, typer.Option(help="Number of users")] = 100_000,
+    seed: int = 0,
+    prefix: Annotated[
+        str, typer.Option(help="Prefix of the user names")
+    ] = "synthetic",
+    chunk_size: Annotated[
+        int, typer.Option(help="Users loaded per transaction")
+    ] = 10_000,
+    admin_ratio: float = 0,
+    max_password_history: int = 5,
+    modules_per_user: Annotated[
+        float, typer.Option(help="Mean number of modules per user")
+    ] = 1.5,
+) -> None:
+    """
+    Fill the database with synthetic users, modules and answers
+    """
+
+    asyncio.run(
+        run_and_dispose(
+            async_generate(
+                GeneratorConfig(
+                    users=users,
+                    seed=seed,
+                    prefix=prefix,
+                    chunk_size=chunk_size,
+                    admin_ratio=admin_ratio,
+                    max_password_history=max_password_history,
+                    modules_per_user=modules_per_user,
+                ),
+                database_uri,
+            )
+        )
+    )
+
+
+if __name__ == "__main__":
+    # start CLI App
+    app()
@@ -1,12 +1,15 @@
 """ CLI commands for building forms """
 
+import asyncio
 import json
+from pathlib import Path
 
 import typer
 
 from app.db.database import DBManager
+from app.db.engines import run_and_dispose
 
-from app.migration_tools import FormMigrationDataBuilder
+from app.migration_tools import FormMigrationDataBuilder, load_migration_data
 
 
 # create CLI app
@@ -33,6 +36,61 @@ async def async_create(path: str) -> None:
         await builder.build(spec=form_spec, session=session)
 
 
+async def async_export_migration_data(data_dir: Path) -> None:
+    """
+    Asynchronous function to export the migration data.
+    """
+    db_manager = DBManager()
+    async with db_manager.get_session() as session:
+        builder = FormMigrationDataBuilder(data_dir=data_dir)
+        exports = await builder.save(session)
+
+    for export in exports.values():
+        print(
+            f"{export.table}: {export.rows} rows, {export.added} added,"
+            f" {export.updated} updated, {export.removed} removed"
+        )
+
+
+async def async_load_migration_data(data_dir: Path, replace: bool) -> None:
+    """
+    Asynchronous function to load the migration data.
+    """
+    db_manager = DBManager()
+    async with db_manager.get_session() as session:
+        loads = await load_migration_data(session, data_dir, replace=replace)
+
+    for load in loads:
+        print(
+            f"{load.table}: {load.rows} rows in {load.seconds:.2f}s"
+            f" ({load.rows_per_second} rows/s)"
+        )
+
+
+# COMMANDS
+
+
+@app.command()
+def export_migration_data(
+    data_dir: Path = FormMigrationDataBuilder.data_dir,
+) -> None:
+    """
+    Export the migration data as NDJSON, with the delta since the last
+    export.
+    """
+    asyncio.run(run_and_dispose(async_export_migration_data(data_dir)))
+
+
+@app.command()
+def load_migration_data_files(
+    data_dir: Path = FormMigrationDataBuilder.data_dir,
+    replace: bool = False,
+) -> None:
+    """
+    Load the migration data files into the database, in one transaction.
+    """
+    asyncio.run(run_and_dispose(async_load_migration_data(data_dir, replace)))
+
 
 if __name__ == "__main__":
     # start CLI App
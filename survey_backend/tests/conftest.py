@@ -1,5 +1,6 @@
 """ Unit testing configuration """
 
+import asyncio
 import os
 from asyncio import current_task, get_event_loop_policy
 from typing import AsyncIterator, Generator
@@ -15,7 +16,10 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 
+from app import settings
+from app.cache import clear_caches
 from app.db.database import Base, DBManager
+from app.db.faults import FaultInjector
 from app.dependencies import _close_sessions, get_db_manager
 from app.main import app
 from app.settings import TEST_DATABASE_URI
@@ -23,6 +27,16 @@ from app.settings import TEST_DATABASE_URI
 # pylint: disable = redefined-outer-name, unused-argument, invalid-name
 
 from sqlalchemy.exc import SQLAlchemyError
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--update-query-plans",
+        action="store_true",
+        help="Save the current query plans as the snapshots",
+    )
+
+
 @pytest.fixture(scope="session")
 def event_loop(request: FixtureRequest) -> Generator:
     """
@@ -61,6 +75,9 @@ async def session():
     engine = create_async_engine(
         TEST_DATABASE_URI, connect_args={"check_same_thread": False}
     )
+    if settings.db_fault_settings.enabled:
+        # run the tests against a slow database
+        FaultInjector.from_settings().attach(engine)
     # init connection to test DB
     async with engine.connect() as conn:
         await conn.begin()
@@ -111,6 +128,80 @@ async def session():
         await _close_sessions(sessions)
         await conn.rollback()
         app.dependency_overrides.clear()
+        # cached rows may belong to the rolled back transaction
+        clear_caches()
+
+
+class LocalSMTPServer:
+    """
+    Minimal SMTP server collecting the received messages, standing in for
+    the mail provider.
+    """
+
+    def __init__(self):
+        self.messages: list[dict] = []
+        self.connections = 0
+        # recipients rejected with a permanent error
+        self.refused: set[str] = set()
+        self.server = None
+        self.port = 0
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 localhost ESMTP\r\n")
+        mail_from, rcpt_to = None, []
+        while line := await reader.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                writer.write(b"250 localhost\r\n")
+            elif verb == "MAIL":
+                mail_from, rcpt_to = command[10:], []
+                writer.write(b"250 OK\r\n")
+            elif verb == "RCPT":
+                recipient = command[8:].strip("<>")
+                if recipient in self.refused:
+                    writer.write(b"550 No such user\r\n")
+                else:
+                    rcpt_to.append(recipient)
+                    writer.write(b"250 OK\r\n")
+            elif verb == "DATA":
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                await writer.drain()
+                data = await reader.readuntil(b"\r\n.\r\n")
+                self.messages.append(
+                    {"from": mail_from, "to": rcpt_to, "data": data.decode()}
+                )
+                writer.write(b"250 OK\r\n")
+            elif verb == "QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                # RSET, NOOP
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+@pytest_asyncio.fixture(name="smtp_server")
+async def smtp_server_fixture(monkeypatch):
+    """
+    Start a local SMTP server
+    """
+    monkeypatch.setattr(settings, "EMAIL_FROM", "noreply@mail.com")
+    server = LocalSMTPServer()
+    await server.start()
+    yield server
+    await server.stop()
 
 
 @pytest_asyncio.fixture(name="client")
@@ -0,0 +1,151 @@
+""" Test the admission control """
+
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.responses import PlainTextResponse
+
+from app.db.engines import get_engine
+from app.db.pool import (
+    SliceAsyncQueuePool,
+    TimedAsyncQueuePool,
+    pool_wait,
+)
+from app.middleware import (
+    AdmissionController,
+    AdmissionMiddleware,
+    LoopLagMonitor,
+)
+from app.settings import TEST_DATABASE_URI, AdmissionSettings
+
+
+class TestAdmission:
+    """
+    Unit tests for the admission control and its load signals
+    """
+
+    def test_engines_time_pool_waits(self):
+        """
+        The queue pools of the engines record their waits
+        """
+        engine = get_engine(TEST_DATABASE_URI, pool_size=3)
+
+        assert isinstance(engine.pool, TimedAsyncQueuePool)
+
+    @pytest.mark.asyncio
+    async def test_pool_wait(self, tmp_path):
+        """
+        The checkouts waiting for a connection show in the pool wait
+        """
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path}/pool.db",
+            poolclass=TimedAsyncQueuePool,
+            pool_size=1,
+            max_overflow=0,
+        )
+        waits = engine.pool.waits
+
+        async def query() -> None:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            waiting = asyncio.create_task(query())
+            await asyncio.sleep(0.05)
+            assert waits.waiting == 1
+            assert pool_wait() >= 0.05
+        await waiting
+        await engine.dispose()
+
+        assert waits.waiting == 0
+        assert waits.checkouts == 2
+        assert waits.current() >= 0.01
+
+    @pytest.mark.asyncio
+    async def test_slice_wait_ignored(self, tmp_path):
+        """
+        The requests queuing on a pool slice do not overload the worker
+        """
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path}/slice.db",
+            poolclass=SliceAsyncQueuePool,
+            pool_size=1,
+            max_overflow=0,
+        )
+
+        async def query() -> None:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            waiting = asyncio.create_task(query())
+            await asyncio.sleep(0.05)
+            assert engine.pool.waits.waiting == 1
+            assert pool_wait() < 0.05
+        await waiting
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_loop_lag(self):
+        """
+        Blocking the event loop shows in the lag
+        """
+        monitor = LoopLagMonitor(interval=0.01, smoothing=1)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)
+        # the monitor runs once, before its next interval
+        await asyncio.sleep(0.005)
+
+        assert monitor.lag >= 0.05
+        await monitor.stop()
+        assert monitor.lag == 0
+
+    @pytest.mark.asyncio
+    async def test_middleware(self):
+        """
+        Past the thresholds, only the priority routes are served
+        """
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            if scope["path"] == "/slow":
+                await release.wait()
+            await PlainTextResponse("ok")(scope, receive, send)
+
+        wait = 0.0
+        controller = AdmissionController(
+            AdmissionSettings(max_in_flight=1, max_priority_in_flight=2),
+            pool_wait=lambda: wait,
+        )
+        middleware = AdmissionMiddleware(app, controller)
+
+        async with AsyncClient(app=middleware, base_url="http://t") as client:
+            slow = asyncio.create_task(client.get("/slow"))
+            await asyncio.sleep(0.01)
+            rejected = await client.get("/users")
+            refresh = await client.post("/token/refresh")
+            release.set()
+            await slow
+            wait = 1.0
+            waiting = await client.get("/users")
+            save = await client.post("/module/save_sme_value")
+
+        assert rejected.status_code == 503
+        assert rejected.headers["Retry-After"] == "5"
+        assert refresh.status_code == 200
+        assert waiting.status_code == 503
+        assert save.status_code == 200
+        assert controller.metrics() == {
+            "in_flight": 0,
+            "pool_wait_ms": 1000.0,
+            "loop_lag_ms": 0.0,
+            "admitted": 3,
+            "rejected": {"in_flight": 1, "pool_wait": 1},
+        }
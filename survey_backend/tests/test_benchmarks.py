@@ -0,0 +1,88 @@
+""" Test the benchmark suites """
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.baseline import Baseline, LatencyStats, compare, percentile
+from benchmarks.http_load import SCENARIOS, LoadTest, seed_benchmark_data
+
+
+def _stats(throughput: float, p99_ms: float, errors: int = 0):
+    return LatencyStats(
+        requests=100,
+        errors=errors,
+        seconds=1.0,
+        throughput=throughput,
+        p50_ms=1.0,
+        p95_ms=2.0,
+        p99_ms=p99_ms,
+    )
+
+
+class TestBenchmarks:
+    """
+    Unit tests for the benchmark suites
+    """
+
+    def test_percentile(self):
+        """
+        Percentiles are samples picked with the nearest rank method
+        """
+        samples = [float(i) for i in range(100, 0, -1)]
+
+        assert percentile(samples, 50) == 50
+        assert percentile(samples, 95) == 95
+        assert percentile(samples, 99) == 99
+        assert percentile([3.0], 99) == 3
+        assert percentile([], 50) == 0
+
+    def test_compare(self, tmp_path):
+        """
+        Only the metrics worse than the threshold are regressions
+        """
+        # arrange
+        Baseline(
+            "http",
+            {
+                "fast": _stats(1000, 10),
+                "slow": _stats(100, 50),
+                "removed": _stats(1, 1),
+            },
+        ).save(tmp_path / "baseline.json")
+        current = Baseline(
+            "http",
+            {
+                # within the threshold
+                "fast": _stats(950, 10.5),
+                "slow": _stats(80, 60, errors=1),
+                "added": _stats(1, 1),
+            },
+        )
+
+        # act
+        regressions = compare(
+            Baseline.load(tmp_path / "baseline.json"), current, threshold=0.1
+        )
+
+        # assert
+        assert [(r.benchmark, r.metric) for r in regressions] == [
+            ("slow", "throughput"),
+            ("slow", "p99_ms"),
+            ("slow", "error_rate"),
+        ]
+        assert str(regressions[0]) == "slow throughput: 100 -> 80 (-20.0%)"
+
+    @pytest.mark.asyncio
+    async def test_http_load(self, session: AsyncSession):
+        """
+        Every scenario runs without errors against the app in-process
+        """
+        data = await seed_benchmark_data(session, workers=1)
+
+        # the test session shares one connection, requests run one by one
+        results = await LoadTest(concurrency=1, requests=4, warmup=1).run(data)
+
+        assert results.results.keys() == SCENARIOS.keys()
+        for name, stats in results.results.items():
+            assert (name, stats.requests, stats.errors) == (name, 4, 0)
+            assert stats.p50_ms <= stats.p95_ms <= stats.p99_ms
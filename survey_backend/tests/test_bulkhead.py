@@ -0,0 +1,157 @@
+""" Test the bulkheads """
+
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from starlette.responses import PlainTextResponse
+
+from app.db.database import DBHost, DBManager
+from app.db.engines import get_slice_engine, pool_slice
+from app.middleware import BulkheadMiddleware, Bulkheads
+from app.middleware.bulkhead import Bulkhead
+from app.settings import BulkheadClass, BulkheadSettings
+
+
+class TestBulkhead:
+    """
+    Unit tests for the bulkheads and their pool slices
+    """
+
+    def test_classify(self):
+        """
+        Requests take the first class matching their route
+        """
+        bulkheads = Bulkheads(BulkheadSettings())
+
+        assert bulkheads.classify("POST", "/token").name == "auth"
+        assert bulkheads.classify("GET", "/users").name == "bulk"
+        assert bulkheads.classify("GET", "/users/me").name == (
+            "interactive_read"
+        )
+        assert bulkheads.classify("POST", "/module/save_sme_value").name == (
+            "interactive_write"
+        )
+
+    @pytest.mark.asyncio
+    async def test_middleware(self):
+        """
+        A saturated class queues then rejects its requests, while the other
+        classes are still served
+        """
+        release = asyncio.Event()
+        slices = []
+
+        async def app(scope, receive, send):
+            slices.append(pool_slice.get())
+            if scope["path"] == "/users":
+                await release.wait()
+            await PlainTextResponse("ok")(scope, receive, send)
+
+        bulkheads = Bulkheads(
+            BulkheadSettings(
+                classes={
+                    "bulk": BulkheadClass(
+                        routes=["GET /users"],
+                        max_concurrency=1,
+                        max_queue=1,
+                        queue_timeout=0.05,
+                        pool_size=1,
+                    ),
+                    "other": BulkheadClass(routes=["* *"], max_concurrency=8),
+                }
+            )
+        )
+        middleware = BulkheadMiddleware(app, bulkheads)
+
+        async with AsyncClient(app=middleware, base_url="http://t") as client:
+            slow = asyncio.create_task(client.get("/users"))
+            await asyncio.sleep(0.01)
+            queued = asyncio.create_task(client.get("/users"))
+            await asyncio.sleep(0.01)
+            rejected = await client.get("/users")
+            other = await client.get("/modules")
+            timed_out = await queued
+            release.set()
+            await slow
+
+        assert rejected.status_code == 503
+        assert rejected.headers["Retry-After"] == "1"
+        assert timed_out.status_code == 503
+        assert other.status_code == 200
+        assert (await slow).status_code == 200
+        assert slices == ["bulk", None]
+        assert pool_slice.get() is None
+        metrics = bulkheads.metrics()["bulk"]
+        assert metrics["active"] == 0
+        assert metrics["waiting"] == 0
+        assert metrics["peak_active"] == 1
+        assert metrics["admitted"] == 1
+        assert metrics["rejected"] == 1
+        assert metrics["timeouts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_no_permit_lost(self):
+        """
+        Waits timing out or cancelled as a slot frees up keep the permits
+        """
+        bulkhead = Bulkhead(
+            "test",
+            BulkheadClass(
+                routes=["* *"],
+                max_concurrency=1,
+                max_queue=1,
+                queue_timeout=0.01,
+            ),
+        )
+        loop = asyncio.get_running_loop()
+
+        for cancel in (False, True) * 10:
+            assert await bulkhead.acquire()
+            waiter = asyncio.create_task(bulkhead.acquire())
+            await asyncio.sleep(0)
+            # free the slot as the wait ends
+            loop.call_later(0.01, bulkhead.release)
+            if cancel:
+                loop.call_later(0.01, waiter.cancel)
+            try:
+                if await waiter:
+                    bulkhead.release()
+            except asyncio.CancelledError:
+                pass
+            await asyncio.sleep(0.01)
+
+        assert bulkhead.active == 0
+        assert await bulkhead.acquire()
+        assert bulkhead._semaphore.locked()
+        bulkhead.release()
+        assert not bulkhead._semaphore.locked()
+
+    @pytest.mark.asyncio
+    async def test_pool_slice(self):
+        """
+        The leader sessions of a class with a pool slice use its engine
+        """
+
+        async def get_bind(host: DBHost, slice_name: str | None):
+            pool_slice.set(slice_name)
+            manager = DBManager(host)
+            session = manager.get_session()
+            bind = session.bind
+            await manager.scoped_session.remove()
+            return bind
+
+        bulk = get_slice_engine("bulk")
+
+        assert bulk.pool.size() == 2
+        assert await asyncio.create_task(get_bind(DBHost.LEADER, "bulk")) is (
+            bulk
+        )
+        assert (
+            await asyncio.create_task(get_bind(DBHost.LEADER, None))
+            is not bulk
+        )
+        assert (
+            await asyncio.create_task(get_bind(DBHost.FOLLOWER, "bulk"))
+            is not bulk
+        )
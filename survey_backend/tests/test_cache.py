@@ -0,0 +1,208 @@
+""" Test cache package """
+
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import (
+    MISSING,
+    Cache,
+    InMemoryBroker,
+    InMemoryRedis,
+    LocalBus,
+    LocalLRU,
+    RedisBackend,
+    start_invalidation_bus,
+)
+from app.db.models import AuthRole, Group, User
+from app.routers.utils import find_user, user_cache
+
+
+class TestCache:
+    """
+    Unit tests for the tiered cache
+    """
+
+    def test_local_lru_bounds(self):
+        """
+        The LRU evicts the least recently used entries past its bounds
+        """
+        lru = LocalLRU(max_entries=2, max_bytes=10)
+        lru.set("a", b"1234", ttl=60)
+        lru.set("b", b"1234", ttl=60)
+        lru.get("a")
+        lru.set("c", b"1234", ttl=60)
+
+        assert lru.get("b") is None
+        assert lru.get("a") == b"1234"
+        assert lru.size == 8
+
+        lru.set("d", b"1234", ttl=-1)
+        assert lru.get("d") is None
+
+    @pytest.mark.asyncio
+    async def test_single_flight_and_negative_caching(self):
+        """
+        Concurrent misses share one load, missing values are cached
+        """
+        cache: Cache[dict] = Cache("test_single_flight")
+        loads = 0
+
+        async def loader():
+            nonlocal loads
+            loads += 1
+            await asyncio.sleep(0.01)
+            return {"id": 1}
+
+        results = await asyncio.gather(
+            *[cache.get_or_load("1", loader) for _ in range(10)]
+        )
+
+        assert loads == 1
+        assert results == [{"id": 1}] * 10
+        assert cache.stats.coalesced == 9
+
+        async def missing_loader():
+            nonlocal loads
+            loads += 1
+
+        assert await cache.get_or_load("2", missing_loader) is None
+        assert await cache.get_or_load("2", missing_loader) is None
+        assert loads == 2
+        assert cache.stats.negative_hits == 1
+
+    @pytest.mark.asyncio
+    async def test_single_flight_leader_cancelled(self):
+        """
+        The followers of a cancelled load retry it instead of failing
+        """
+        cache: Cache[dict] = Cache("test_single_flight_cancel")
+        loads = 0
+
+        async def loader():
+            nonlocal loads
+            loads += 1
+            await asyncio.sleep(0.05)
+            return {"id": loads}
+
+        leader = asyncio.create_task(cache.get_or_load("1", loader))
+        await asyncio.sleep(0.01)
+        followers = [
+            asyncio.create_task(cache.get_or_load("1", loader))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+
+        assert leader.cancelled()
+        assert results == [{"id": 2}] * 3
+        assert loads == 2
+        assert cache._flight.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_remote_tier(self):
+        """
+        Values stored by another worker are served from the shared tier
+        """
+        remote = RedisBackend(InMemoryRedis())
+        worker_1: Cache[int] = Cache("test_remote_1", remote=remote)
+        worker_2: Cache[int] = Cache("test_remote_1", remote=remote)
+
+        await worker_1.set("key", 42)
+
+        assert await worker_2.get("key") == 42
+        assert worker_2.stats.remote_hits == 1
+
+        await worker_1.delete("key")
+        worker_2.clear()
+        assert await worker_2.get("key") is MISSING
+
+    @pytest.mark.asyncio
+    async def test_flush_remote_tier(self):
+        """
+        Flushing a cache drops the entries of the shared tier too
+        """
+        remote = RedisBackend(InMemoryRedis())
+        worker_1: Cache[int] = Cache("test_flush", remote=remote)
+        worker_2: Cache[int] = Cache("test_flush", remote=remote)
+        await worker_1.set("key", 42)
+        assert await worker_2.get("key") == 42
+
+        await worker_1.flush()
+        # what the invalidation bus does on the other workers
+        worker_2.clear()
+        worker_2.forget_generation()
+
+        assert await worker_1.get("key") is MISSING
+        assert await worker_2.get("key") is MISSING
+        await worker_2.set("key", 43)
+        assert await worker_1.get("key") == 43
+
+    @pytest.mark.asyncio
+    async def test_cached_loader_merges_orm_instances(
+        self, session: AsyncSession
+    ):
+        """
+        Cached users are attached to the caller session with their groups
+        """
+        group = Group(name=AuthRole.DATA_EXPLORER)
+        user = User(name="cacheduser", password="")
+        user.groups.append(group)
+        session.add(user)
+        await session.commit()
+        session.expunge_all()
+
+        first = await find_user(user.id, session)
+        session.expunge_all()
+        second = await find_user(user.id, session)
+
+        assert user_cache.stats.hits >= 1
+        assert second is not first
+        assert second in session
+        assert second.name == "cacheduser"
+        assert [g.name for g in second.groups] == [AuthRole.DATA_EXPLORER]
+
+    @pytest.mark.asyncio
+    async def test_invalidation_bus(self):
+        """
+        Events published by a worker evict the entries of the others
+        """
+        broker = InMemoryBroker()
+        worker_1, worker_2 = LocalBus(broker), LocalBus(broker)
+        cache_2: Cache[int] = Cache("test_bus")
+        cache_2.local.set("1", b"stale", ttl=60)
+        worker_2.subscribe(lambda event: cache_2.evict_local(event.key))
+        await worker_1.start()
+        await worker_2.start()
+
+        await worker_1.publish(worker_1.events([("test_bus", "1")]))
+
+        assert cache_2.local.get("1") is None
+        assert worker_2.received == 1
+        assert worker_1.received == 0
+
+    @pytest.mark.asyncio
+    async def test_local_bus_refused_for_several_workers(self):
+        """
+        The local bus cannot keep the caches of several workers in line
+        """
+        with pytest.raises(ValueError, match="2 workers"):
+            await start_invalidation_bus("local", workers=2)
+
+    @pytest.mark.asyncio
+    async def test_commit_evicts_cached_user(self, session: AsyncSession):
+        """
+        Committing a change to a user drops its cached row
+        """
+        user = User(name="evicteduser", password="")
+        session.add(user)
+        await session.commit()
+        await find_user(user.id, session)
+        assert user_cache.local.get(str(user.id)) is not None
+
+        user.first_name = "Changed"
+        await session.commit()
+
+        assert user_cache.local.get(str(user.id)) is None
@@ -0,0 +1,167 @@
+""" Test question catalog """
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import catalog as catalog_module
+from app.catalog import (
+    QuestionCatalog,
+    bump_catalog_version,
+    catalog_changed,
+    get_questions,
+)
+from app.db.models import SME, Module
+
+
+class TestQuestionCatalog:
+    """
+    Unit tests for the question catalog snapshot
+    """
+
+    @pytest.mark.asyncio
+    async def test_sync_builds_and_rebuilds_snapshot(
+        self, session: AsyncSession, tmp_path
+    ):
+        """
+        The snapshot is built on first sync and rebuilt on version change
+        """
+        # arrange
+        module = Module(module_name="sme")
+        session.add(module)
+        await session.flush()
+        session.add(
+            SME(
+                module_id=module.id,
+                heading="CONSUMER VALUE",
+                question="Has your market share grown?",
+                value="BY > 5%,FLAT SHARE",
+            )
+        )
+        await bump_catalog_version(session)
+        await session.commit()
+
+        catalog = QuestionCatalog(tmp_path / "catalog.bin")
+        catalog.enabled = True
+
+        # act
+        await catalog.sync(session)
+
+        # assert
+        assert catalog.version == 1
+        rows = catalog.rows("sme", module.id)
+        assert [row["question"] for row in rows] == [
+            "Has your market share grown?"
+        ]
+        assert catalog.rows("sme", module.id + 1) == []
+
+        # a write bumps the version and the next sync rebuilds the snapshot
+        session.add(
+            SME(
+                module_id=module.id,
+                heading="CONSUMER VALUE",
+                question="Are you winning versus your key competition?",
+                value="BY > 5%,FLAT SHARE",
+            )
+        )
+        await bump_catalog_version(session)
+        await session.commit()
+        await catalog.sync(session)
+
+        assert catalog.version == 2
+        assert len(catalog.rows("sme", module.id)) == 2
+
+        # other workers map the same snapshot without touching the DB
+        other = QuestionCatalog(tmp_path / "catalog.bin")
+        other.enabled = True
+        assert len(other.rows("sme", module.id)) == 2
+        assert other.version == 2
+
+        catalog.close()
+        other.close()
+
+    @pytest.mark.asyncio
+    async def test_answers_read_from_db(
+        self, session: AsyncSession, tmp_path, monkeypatch
+    ):
+        """
+        The snapshot holds the questions only, the answers saved after it
+        was built are read from the DB
+        """
+        # arrange
+        module = Module(module_name="sme")
+        session.add(module)
+        await session.flush()
+        sme = SME(
+            module_id=module.id,
+            heading="CONSUMER VALUE",
+            question="Has your market share grown?",
+            value="BY > 5%,FLAT SHARE",
+        )
+        session.add(sme)
+        await bump_catalog_version(session)
+        await session.commit()
+
+        catalog = QuestionCatalog(tmp_path / "catalog.bin")
+        catalog.enabled = True
+        await catalog.sync(session)
+        monkeypatch.setattr(catalog_module, "question_catalog", catalog)
+
+        # act
+        sme.selected_value = 2
+        await session.commit()
+        rows = await get_questions(session, "sme", module.id)
+
+        # assert
+        assert "selected_value" not in catalog.rows("sme", module.id)[0]
+        assert rows[0]["question"] == "Has your market share grown?"
+        assert rows[0]["selected_value"] == 2
+        catalog.close()
+
+    @pytest.mark.asyncio
+    async def test_changed_module_read_from_db(
+        self, session: AsyncSession, tmp_path, monkeypatch
+    ):
+        """
+        The questions of a changed module are read from the DB until the
+        snapshot is rebuilt in the background
+        """
+        # arrange
+        module = Module(module_name="sme")
+        session.add(module)
+        await session.flush()
+        session.add(
+            SME(
+                module_id=module.id,
+                heading="CONSUMER VALUE",
+                question="Has your market share grown?",
+                value="BY > 5%,FLAT SHARE",
+            )
+        )
+        await bump_catalog_version(session)
+        await session.commit()
+        catalog = QuestionCatalog(tmp_path / "catalog.bin")
+        catalog.enabled = True
+        await catalog.sync(session)
+        monkeypatch.setattr(catalog_module, "question_catalog", catalog)
+
+        # act
+        session.add(
+            SME(
+                module_id=module.id,
+                heading="CONSUMER VALUE",
+                question="Are you winning versus your key competition?",
+                value="BY > 5%,FLAT SHARE",
+            )
+        )
+        version = await bump_catalog_version(session)
+        await session.commit()
+        catalog_changed({module.id}, version)
+
+        # assert
+        assert version == catalog.version + 1
+        assert catalog.rows("sme", module.id) is None
+        assert len(await get_questions(session, "sme", module.id)) == 2
+
+        await catalog.sync(session)
+        assert len(catalog.rows("sme", module.id)) == 2
+        catalog.close()
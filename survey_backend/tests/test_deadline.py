@@ -0,0 +1,189 @@
+""" Test the request deadlines """
+
+import asyncio
+from time import monotonic
+
+import pytest
+from httpx import AsyncClient
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse
+
+from app.db.deadlines import remaining, request_deadline, statement_timeout
+from app.middleware import DeadlineMiddleware, Deadlines
+from app.settings import DeadlineSettings
+
+
+class TestDeadline:
+    """
+    Unit tests for the deadlines and the cancellation of the handlers
+    """
+
+    def test_timeout(self):
+        """
+        The timeout comes from the route, or from the header of the client
+        up to the maximum
+        """
+        deadlines = Deadlines(DeadlineSettings())
+
+        def timeout(method, path, headers=None):
+            return deadlines.timeout(method, path, Headers(headers or {}))
+
+        assert timeout("GET", "/users") == 60
+        assert timeout("GET", "/users/1") == 30
+        assert timeout("POST", "/module/save_sme_value") == 30
+        assert timeout("GET", "/users", {"X-Request-Timeout": "2.5"}) == 2.5
+        assert timeout("GET", "/users", {"X-Request-Timeout": "900"}) == 120
+        assert timeout("GET", "/users", {"X-Request-Timeout": "soon"}) == 60
+        assert timeout("GET", "/users", {"X-Request-Timeout": "0"}) == 60
+
+    @pytest.mark.asyncio
+    async def test_statement_timeout(self):
+        """
+        The statements get the time left until the deadline
+        """
+        assert remaining() is None
+        assert statement_timeout() is None
+
+        token = request_deadline.set(monotonic() + 2)
+        try:
+            assert 1900 < statement_timeout() <= 2000
+        finally:
+            request_deadline.reset(token)
+        token = request_deadline.set(monotonic() - 1)
+        try:
+            assert statement_timeout() == 1
+        finally:
+            request_deadline.reset(token)
+
+    @pytest.mark.asyncio
+    async def test_timeout_cancels(self):
+        """
+        Past its deadline, the handler is cancelled and the client gets a
+        504
+        """
+        cancelled = []
+        deadlines_seen = []
+
+        async def app(scope, receive, send):
+            deadlines_seen.append(remaining())
+            if scope["path"] == "/slow":
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(scope["path"])
+                    raise
+            await PlainTextResponse("ok")(scope, receive, send)
+
+        deadlines = Deadlines(DeadlineSettings(routes={"GET /slow": 0.05}))
+        middleware = DeadlineMiddleware(app, deadlines)
+
+        async with AsyncClient(app=middleware, base_url="http://t") as client:
+            slow = await client.get("/slow")
+            fast = await client.post("/fast", json={"a": 1})
+
+        assert slow.status_code == 504
+        assert slow.json() == {
+            "detail": {"global": "The request took too long, try again later."}
+        }
+        assert fast.status_code == 200
+        assert cancelled == ["/slow"]
+        assert 0 < deadlines_seen[0] <= 0.05
+        assert 29 < deadlines_seen[1] <= 30
+        assert deadlines.metrics() == {"timeouts": 1, "disconnects": 0}
+
+    @pytest.mark.asyncio
+    async def test_disconnect_cancels(self):
+        """
+        The handler of a client that disconnects is cancelled
+        """
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+        disconnect = asyncio.Event()
+        sent = []
+
+        async def app(scope, receive, send):
+            assert (await receive())["body"] == b"data"
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        messages = [{"type": "http.request", "body": b"data"}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        deadlines = Deadlines(DeadlineSettings())
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/users/import",
+            "headers": [],
+        }
+        request = asyncio.create_task(
+            DeadlineMiddleware(app, deadlines)(scope, receive, send)
+        )
+        await started.wait()
+        disconnect.set()
+        await asyncio.wait_for(request, 1)
+
+        assert cancelled.is_set()
+        assert sent == []
+        assert deadlines.metrics() == {"timeouts": 0, "disconnects": 1}
+
+    @pytest.mark.asyncio
+    async def test_body_streamed(self):
+        """
+        The body reaches the handler as it reads it, not buffered ahead
+        """
+        reads = []
+        read_ahead = []
+
+        async def app(scope, receive, send):
+            body = b""
+            more_body = True
+            while more_body:
+                message = await receive()
+                body += message["body"]
+                more_body = message["more_body"]
+                await asyncio.sleep(0.01)
+                read_ahead.append(len(reads) - len(body))
+            await PlainTextResponse(body.decode())(scope, receive, send)
+
+        async def receive():
+            if len(reads) < 5:
+                reads.append(1)
+                return {
+                    "type": "http.request",
+                    "body": b"x",
+                    "more_body": len(reads) < 5,
+                }
+            await asyncio.sleep(10)
+            return {"type": "http.disconnect"}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/users/import",
+            "headers": [],
+        }
+        await DeadlineMiddleware(app, Deadlines(DeadlineSettings()))(
+            scope, receive, send
+        )
+
+        assert sent[1]["body"] == b"xxxxx"
+        # one message in the queue and one waiting to be put at most
+        assert max(read_ahead) <= 2
@@ -0,0 +1,64 @@
+""" Test database dump and restore """
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.db.database import Base
+from app.db.dump import dump_database, read_manifest, restore_database
+from app.db.engines import get_engine
+from app.db.models import AuthRole, Group, User
+
+
+class TestDump:
+    """
+    Unit tests for the database dump and restore
+    """
+
+    @pytest.mark.asyncio
+    async def test_dump_and_restore(self, tmp_path):
+        """
+        A restored database holds the dumped rows
+        """
+        # arrange
+        source = f"sqlite+aiosqlite:///{tmp_path / 'source.db'}"
+        target = f"sqlite+aiosqlite:///{tmp_path / 'target.db'}"
+        for url in (source, target):
+            async with get_engine(url).begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(get_engine(source))() as session:
+            group = Group(name=AuthRole.ADMIN)
+            for i in range(25):
+                user = User(name=f"dumped{i}", password="")
+                user.groups.append(group)
+                session.add(user)
+            await session.commit()
+        async with async_sessionmaker(get_engine(target))() as session:
+            session.add(User(name="replaced", password=""))
+            await session.commit()
+
+        # act
+        manifest = await dump_database(
+            source, tmp_path / "dump", compression="gzip", chunk_size=1024
+        )
+        await restore_database(target, tmp_path / "dump")
+
+        # assert
+        assert read_manifest(tmp_path / "dump") == manifest
+        users = next(t for t in manifest["tables"] if t["name"] == "wis_user")
+        assert users["rows"] == 25
+        assert len(users["chunks"]) > 1
+        levels = {t["name"]: t["level"] for t in manifest["tables"]}
+        assert levels["wis_user"] < levels["wis_user_group"]
+
+        async with async_sessionmaker(get_engine(target))() as session:
+            names = (await session.scalars(select(User.name))).all()
+            assert sorted(names) == sorted(f"dumped{i}" for i in range(25))
+            user = await session.scalar(
+                select(User).where(User.name == "dumped0")
+            )
+            assert user.created_on is not None
+            assert (
+                await session.scalar(select(func.count()).select_from(Group))
+                == 1
+            )
@@ -0,0 +1,36 @@
+""" Test engine registry """
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.engines import get_engine, get_session_engine, pool_metrics
+from app.routers.utils import get_engine_from_session
+from app.settings import TEST_DATABASE_URI
+
+
+class TestEngines:
+    """
+    Unit tests for the engine registry
+    """
+
+    def test_engines_are_shared(self):
+        """
+        Engines are created once per URL and options
+        """
+        engine = get_engine(TEST_DATABASE_URI, echo=False)
+
+        assert get_engine(TEST_DATABASE_URI, echo=False) is engine
+        assert get_engine(TEST_DATABASE_URI, echo=True) is not engine
+        assert any(
+            name.startswith("sqlite+aiosqlite") for name in pool_metrics()
+        )
+
+    @pytest.mark.asyncio
+    async def test_session_engine_is_reused(self, session: AsyncSession):
+        """
+        Asking the engine of a session does not open a new pool
+        """
+        engine = get_engine_from_session(session)
+
+        assert get_engine_from_session(session) is engine
+        assert get_session_engine(session) is engine
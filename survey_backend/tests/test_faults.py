@@ -0,0 +1,75 @@
+""" Test the database fault injection """
+
+import asyncio
+from time import perf_counter
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.faults import FaultInjector, fault_metrics
+
+
+@pytest_asyncio.fixture(name="engine")
+async def engine_fixture():
+    """
+    Engine of an in-memory database
+    """
+    engine = create_async_engine("sqlite+aiosqlite://")
+    yield engine
+    await engine.dispose()
+
+
+class TestFaultInjector:
+    """
+    Unit tests for the database fault injection
+    """
+
+    @pytest.mark.asyncio
+    async def test_latency(self, engine):
+        """
+        Statements are delayed without blocking the other tasks
+        """
+        injector = FaultInjector(latency=0.05, connect_latency=0.01)
+        injector.attach(engine)
+
+        async def query():
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                await connection.execute(text("SELECT 2"))
+
+        start = perf_counter()
+        await asyncio.gather(query(), query())
+        elapsed = perf_counter() - start
+
+        # two statements in a row, in parallel in both tasks
+        assert 0.11 <= elapsed < 0.2
+        assert injector.stats["statements"] == 4
+        assert injector.stats["checkouts"] == 2
+        assert str(engine.url) in fault_metrics()
+
+        injector.detach(engine)
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        assert injector.stats["statements"] == 4
+        assert str(engine.url) not in fault_metrics()
+
+    @pytest.mark.asyncio
+    async def test_disconnect(self, engine):
+        """
+        Dropped connections fail the statement and are discarded
+        """
+        injector = FaultInjector(disconnect_rate=1).attach(engine)
+
+        async with engine.connect() as connection:
+            with pytest.raises(OperationalError) as err:
+                await connection.execute(text("SELECT 1"))
+            assert err.value.connection_invalidated
+            assert connection.invalidated
+
+        injector.disconnect_rate = 0
+        async with engine.connect() as connection:
+            assert await connection.scalar(text("SELECT 1")) == 1
+        assert injector.stats["disconnects"] == 1
@@ -0,0 +1,89 @@
+""" Test the synthetic data generator """
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import SME, AuthRole, Group, Module, User, user_group
+from app.utils import check_password
+from cli.generate_data import PASSWORD, GeneratorConfig, generate_data
+
+
+async def _answers(session: AsyncSession, prefix: str) -> list[tuple]:
+    result = await session.execute(
+        select(
+            User.first_name,
+            User.last_name,
+            Module.module_name,
+            SME.question,
+            SME.selected_value,
+        )
+        .join(Module, Module.user_id == User.id)
+        .join(SME, SME.module_id == Module.id)
+        .where(User.name.startswith(prefix))
+        .order_by(User.name, Module.id, SME.id)
+    )
+    return result.all()
+
+
+class TestGenerateData:
+    """
+    Unit tests for the synthetic data generator
+    """
+
+    @pytest.mark.asyncio
+    async def test_generate_data(self, session: AsyncSession):
+        """
+        The same seed generates the same data
+        """
+        # arrange
+        session.add_all(
+            [Group(name=AuthRole.ADMIN), Group(name=AuthRole.DATA_EXPLORER)]
+        )
+        await session.commit()
+        config = GeneratorConfig(
+            users=40, seed=7, prefix="first", chunk_size=15
+        )
+        progress = []
+
+        # act
+        report = await generate_data(session, config, progress.append)
+        config.prefix = "second"
+        await generate_data(session, config)
+
+        # assert
+        assert progress == [15, 30, 40]
+        assert report.rows["wis_user"] == 40
+        assert report.rows["wis_user_group"] >= 40
+        assert (
+            await session.scalar(select(func.count()).select_from(user_group))
+            == 2 * report.rows["wis_user_group"]
+        )
+        assert (
+            await session.scalar(select(func.count(SME.id)))
+            == 2 * report.rows["wis_sme"]
+        )
+
+        first = await _answers(session, "first_")
+        assert first and first == await _answers(session, "second_")
+        assert {value for *_, value in first} <= {None, *range(7)}
+
+        user = await session.scalar(
+            select(User).filter_by(name="first_00000000")
+        )
+        assert check_password(PASSWORD, user.password)
+
+    @pytest.mark.asyncio
+    async def test_existing_prefix(self, session: AsyncSession):
+        """
+        Generating users named like existing ones fails
+        """
+        session.add_all(
+            [Group(name=AuthRole.ADMIN), Group(name=AuthRole.DATA_EXPLORER)]
+        )
+        await session.commit()
+        config = GeneratorConfig(users=1)
+        await generate_data(session, config)
+
+        with pytest.raises(ValueError):
+            await generate_data(session, config)
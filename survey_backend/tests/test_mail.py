@@ -0,0 +1,234 @@
+""" Test email outbox """
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import EmailOutbox, EmailStatusEnum, Notification, User
+from app.mail import (
+    OutboxWorker,
+    SMTPTransport,
+    create_notification,
+    delivery_status,
+    enqueue_email,
+    fan_out,
+    fan_out_chunk,
+)
+
+
+class TestEmailOutbox:
+    """
+    Unit tests for the email outbox worker
+    """
+
+    @pytest.mark.asyncio
+    async def test_drain_delivers_batch_over_one_connection(
+        self, session: AsyncSession, smtp_server
+    ):
+        """
+        A batch is delivered over a single SMTP connection
+        """
+        # arrange
+        for i in range(3):
+            enqueue_email(session, f"user{i}@mail.com", "Welcome", "Hello")
+        await session.commit()
+        transport = SMTPTransport("127.0.0.1", smtp_server.port, use_ssl=False)
+        worker = OutboxWorker(transport, batch_size=10)
+
+        # act
+        processed = await worker.drain(session)
+        await transport.close()
+
+        # assert
+        assert processed == 3
+        assert smtp_server.connections == 1
+        assert [m["to"] for m in smtp_server.messages] == [
+            ["user0@mail.com"],
+            ["user1@mail.com"],
+            ["user2@mail.com"],
+        ]
+        emails = (await session.execute(select(EmailOutbox))).scalars().all()
+        assert {e.status for e in emails} == {EmailStatusEnum.SENT.value}
+
+    @pytest.mark.asyncio
+    async def test_failed_deliveries_are_retried_then_dead_lettered(
+        self, session: AsyncSession, smtp_server
+    ):
+        """
+        Transient failures are retried later, permanent ones dead-lettered
+        """
+        # arrange
+        refused = enqueue_email(session, "nobody@mail.com", "Hi", "Hello")
+        unreachable = enqueue_email(session, "user@mail.com", "Hi", "Hello")
+        await session.commit()
+        smtp_server.refused.add("nobody@mail.com")
+        worker = OutboxWorker(
+            SMTPTransport("127.0.0.1", smtp_server.port, use_ssl=False),
+            max_attempts=3,
+        )
+        await worker.drain(session)
+        await worker.close()
+
+        assert refused.status == EmailStatusEnum.DEAD.value
+        assert unreachable.status == EmailStatusEnum.SENT.value
+
+        # an unreachable server makes deliveries fail
+        unreachable.status = EmailStatusEnum.PENDING.value
+        unreachable.next_attempt_at = datetime.now()
+        await session.commit()
+        worker.transports[0].port = 1
+
+        # act
+        await worker.drain(session)
+
+        # assert
+        assert unreachable.status == EmailStatusEnum.PENDING.value
+        assert unreachable.attempts == 2
+        assert unreachable.next_attempt_at > datetime.now()
+        assert unreachable.last_error
+
+        # the retry is due, the last attempt fails too
+        unreachable.next_attempt_at = datetime.now()
+        await session.commit()
+        await worker.drain(session)
+
+        assert unreachable.status == EmailStatusEnum.DEAD.value
+        assert worker.dead == 2
+
+    @pytest.mark.asyncio
+    async def test_sends_outside_transactions(self, session: AsyncSession):
+        """
+        The emails are sent without a transaction open, and the results
+        already saved survive a failure to save another one
+        """
+
+        class Transport(SMTPTransport):
+            async def send(self, message):
+                in_transaction.append(session.in_transaction())
+
+        in_transaction: list[bool] = []
+        first = enqueue_email(session, "first@mail.com", "Hi", "Hello")
+        second = enqueue_email(session, "second@mail.com", "Hi", "Hello")
+        await session.commit()
+        worker = OutboxWorker(Transport("127.0.0.1", 1), lease=60)
+        record = worker._record
+        saved = []
+
+        async def failing_record(_session, email_id, values):
+            if saved:
+                # fails to compile
+                values = values | {"unknown_column": 1}
+            saved.append(email_id)
+            await record(_session, email_id, values)
+
+        worker._record = failing_record
+
+        # act
+        processed = await worker.drain(session)
+
+        # assert
+        assert processed == 2
+        assert in_transaction == [False, False]
+        await session.refresh(first)
+        await session.refresh(second)
+        assert first.status == EmailStatusEnum.SENT.value
+        # claimed until its lease ends, then delivered again
+        assert second.status == EmailStatusEnum.PENDING.value
+        assert second.attempts == 1
+        assert second.next_attempt_at > datetime.now()
+
+    @pytest.mark.asyncio
+    async def test_fan_out_to_opted_in_users(
+        self, session: AsyncSession, smtp_server
+    ):
+        """
+        Notifications reach the opted-in users only, over parallel
+        connections
+        """
+        # arrange
+        for i in range(5):
+            session.add(
+                User(
+                    name=f"opted{i}",
+                    email=f"opted{i}@mail.com",
+                    notifications=True,
+                )
+            )
+        session.add(User(name="optedout", email="out@mail.com"))
+        session.add(
+            User(
+                name="deleted",
+                email="deleted@mail.com",
+                notifications=True,
+                deleted=True,
+            )
+        )
+        session.add(User(name="noemail", notifications=True))
+        await session.commit()
+        progress = []
+
+        # act
+        notification = await fan_out(
+            session,
+            "News",
+            "Hello",
+            chunk_size=2,
+            on_progress=lambda p: progress.append(p.enqueued),
+        )
+        worker = OutboxWorker(
+            [
+                SMTPTransport("127.0.0.1", smtp_server.port, use_ssl=False)
+                for _ in range(2)
+            ]
+        )
+        await worker.drain(session)
+        await worker.close()
+
+        # assert
+        assert notification.recipients == 5
+        assert progress == [2, 4, 5]
+        assert smtp_server.connections == 2
+        assert sorted(m["to"][0] for m in smtp_server.messages) == [
+            f"opted{i}@mail.com" for i in range(5)
+        ]
+        assert await delivery_status(session, notification.id) == {
+            "pending": 0,
+            "sent": 5,
+            "dead": 0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_fan_out_progress(self, session: AsyncSession):
+        """
+        Queued notifications are fanned out a committed chunk at a time
+        """
+        # arrange
+        for i in range(3):
+            session.add(
+                User(
+                    name=f"chunked{i}",
+                    email=f"chunked{i}@mail.com",
+                    notifications=True,
+                )
+            )
+        await session.commit()
+        notification = await create_notification(session, "News", "Hello")
+        assert notification.status == "queued"
+
+        # act
+        first = await fan_out_chunk(session, chunk_size=2)
+        session.expunge_all()
+        queued = await session.get(Notification, notification.id)
+
+        # assert
+        assert (first.enqueued, first.done) == (2, False)
+        assert (queued.status, queued.recipients) == ("running", 2)
+
+        last = await fan_out_chunk(session, chunk_size=2)
+        assert (last.enqueued, last.done) == (3, True)
+        assert await fan_out_chunk(session, chunk_size=2) is None
+        assert (await delivery_status(session, notification.id))[
+            "pending"
+        ] == 3
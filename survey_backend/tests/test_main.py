@@ -6,8 +6,9 @@ from fastapi import status
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import settings
 from app.db.models import AuthRole, Group, User
-from app.utils import encrypt_password
+from app.utils import encrypt_password, is_locked_out
 
 
 class TestMain:
@@ -42,6 +43,87 @@ class TestMain:
         assert j_resp["refresh_token"]
         assert j_resp["token_type"] == "bearer"
 
+    @pytest.mark.asyncio
+    async def test_get_token_any_case(
+        self, client: AsyncClient, session: AsyncSession
+    ):
+        """
+        Test "Get Token" API with the email or name in another case
+        """
+        encrypted_pwd = encrypt_password(self.user_pass)
+        session.add(
+            User(
+                name="TestUser",
+                email="Test@Mail.com",
+                password=encrypted_pwd,
+            )
+        )
+        await session.commit()
+
+        for username in ("TEST@mail.com", "testuser", "TESTUSER"):
+            response = await client.post(
+                "/token",
+                data={"username": username, "password": self.user_pass},
+            )
+            assert response.status_code == 200, response.text
+
+        response = await client.post(
+            "/token", data={"username": "test", "password": self.user_pass}
+        )
+        assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_get_token_lockout(
+        self, client: AsyncClient, session: AsyncSession, monkeypatch
+    ):
+        """
+        Test "Get Token" API locking the account out after failed attempts
+        """
+        monkeypatch.setattr(settings, "PASSWORD_MAX_LOGIN_ATTEMPTS", 3)
+        user = User(
+            name=self.user_name, password=encrypt_password(self.user_pass)
+        )
+        session.add(user)
+        await session.commit()
+
+        details = []
+        for _ in range(3):
+            response = await client.post(
+                "/token",
+                data={"username": self.user_name, "password": "wrong"},
+            )
+            assert response.status_code == 401
+            details.append(response.json()["detail"])
+
+        assert [detail.get("disable_login") for detail in details] == [
+            None,
+            None,
+            True,
+        ]
+        await session.refresh(user)
+        assert user.failed_login_attempts == 3
+        assert user.enabled is False
+
+        # the first rejected attempt skips the lookup of the next ones
+        assert not await is_locked_out(self.user_name)
+        for _ in range(2):
+            response = await client.post(
+                "/token",
+                data={"username": self.user_name, "password": self.user_pass},
+            )
+            assert response.status_code == 401
+            assert response.json()["detail"]["disable_login"] is True
+        assert await is_locked_out(self.user_name.upper())
+
+        user.enabled = True
+        await session.commit()
+        assert not await is_locked_out(self.user_name)
+        response = await client.post(
+            "/token",
+            data={"username": self.user_name, "password": self.user_pass},
+        )
+        assert response.status_code == 200, response.text
+
     @pytest.mark.asyncio
     async def test_refresh_token_local(
         self, client: AsyncClient, session: AsyncSession
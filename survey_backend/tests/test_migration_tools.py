@@ -0,0 +1,128 @@
+""" Test migration data tools """
+
+import shutil
+
+import orjson
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app import settings
+from app.db.models import AuthRole, Group, User
+from app.migration_tools import (
+    FormMigrationDataBuilder,
+    MigrationDataError,
+    load_migration_data,
+)
+
+
+def read_ndjson(path):
+    return [orjson.loads(line) for line in path.read_bytes().splitlines()]
+
+
+class TestMigrationTools:
+    """
+    Unit tests for the migration data export
+    """
+
+    @pytest.mark.asyncio
+    async def test_incremental_export(self, session: AsyncSession, tmp_path):
+        """
+        Re-exports only list the rows changed since the previous export
+        """
+        # arrange
+        group = Group(name=AuthRole.ADMIN)
+        users = [User(name=f"exported{i}", password="") for i in range(3)]
+        users[0].groups.append(group)
+        session.add_all(users)
+        await session.commit()
+        builder = FormMigrationDataBuilder(data_dir=tmp_path, chunk_size=2)
+
+        # act
+        first = await builder.save(session)
+        unchanged = await builder.save(session)
+        users[1].first_name = "Changed"
+        await session.delete(users[2])
+        session.add(User(name="exported3", password=""))
+        await session.commit()
+        second = await builder.save(session)
+
+        # assert
+        assert first["wis_user"].added == first["wis_user"].rows
+        assert not any(export.changed for export in unchanged.values())
+        assert unchanged["wis_user"].sha256 == first["wis_user"].sha256
+
+        exported = second["wis_user"]
+        assert (exported.added, exported.removed, exported.updated) == (
+            1,
+            1,
+            1,
+        )
+        assert not second["wis_group"].changed
+        delta = read_ndjson(tmp_path / "wis_user.delta.ndjson")
+        assert [d["op"] for d in delta] == ["change", "remove", "add"]
+        assert delta[0]["row"] == [["change", "first_name", [None, "Changed"]]]
+        rows = read_ndjson(tmp_path / "wis_user.ndjson")
+        assert len(rows) == exported.rows
+        assert rows[-1][1]["name"] == "exported3"
+
+    @pytest.mark.asyncio
+    async def test_load_migration_data(self, session: AsyncSession, tmp_path):
+        """
+        Data files are validated and loaded in one transaction
+        """
+        # arrange
+        shutil.copy(
+            settings.BASE_DIR / "migration_tools/data/wis_group.json", tmp_path
+        )
+        user = {
+            "id": 100,
+            "name": "migrated",
+            "enabled": True,
+            "auth_mode": "LOCAL",
+            "failed_login_attempts": 0,
+            "deleted": False,
+            "notifications": True,
+        }
+        (tmp_path / "wis_user.ndjson").write_bytes(
+            orjson.dumps([[100], user]) + b"\n"
+        )
+        (tmp_path / "wis_user_group.json").write_bytes(
+            orjson.dumps([{"user_id": 100, "group_id": 2}])
+        )
+
+        # act
+        loads = await load_migration_data(session, tmp_path, batch_size=1)
+
+        # assert
+        assert [(load.table, load.rows) for load in loads] == [
+            ("wis_group", 2),
+            ("wis_user", 1),
+            ("wis_user_group", 1),
+        ]
+        migrated = await session.scalar(
+            select(User)
+            .where(User.id == 100)
+            .options(selectinload(User.groups))
+        )
+        assert migrated.email_verified is False
+        assert [g.name for g in migrated.groups] == [AuthRole.DATA_EXPLORER]
+
+    @pytest.mark.asyncio
+    async def test_invalid_migration_data(
+        self, session: AsyncSession, tmp_path
+    ):
+        """
+        Invalid records are reported and nothing is loaded
+        """
+        (tmp_path / "wis_group.json").write_bytes(
+            orjson.dumps([{"id": 1, "name": "admin"}, {"id": 2}])
+        )
+
+        with pytest.raises(MigrationDataError) as err:
+            await load_migration_data(session, tmp_path)
+
+        assert err.value.table == "wis_group"
+        assert [i for i, _ in err.value.errors] == [1]
+        assert await session.scalar(select(Group)) is None
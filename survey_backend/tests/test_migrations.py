@@ -0,0 +1,189 @@
+""" Tests of the Alembic migrations """
+
+import io
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+
+from app.db.database import Base
+from app.db.models import User
+from cli.manage_db import _create_tables
+
+SCRIPT_LOCATION = Path(__file__).parents[1] / "app/alembic/alembic"
+
+# tables created by the migrations, after the first one
+MIGRATED_TABLES = {
+    "wis_email_outbox",
+    "wis_notification",
+    "wis_catalog_version",
+}
+
+
+def _config(path: Path) -> Config:
+    config = Config()
+    config.set_main_option("script_location", str(SCRIPT_LOCATION))
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{path}")
+    return config
+
+
+def _indexes(path: Path) -> set[str]:
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        # the implicit indexes of the unique constraints have no SQL
+        names = connection.execute(
+            text(
+                "SELECT name FROM sqlite_master"
+                " WHERE type = 'index' AND sql IS NOT NULL"
+            )
+        ).scalars()
+        indexes = set(names)
+    engine.dispose()
+    return indexes
+
+
+class TestMigrations:
+    """
+    Tests of the migrations against the tables created from the models
+    """
+
+    def test_lookup_indexes(self, tmp_path: Path):
+        path = tmp_path / "migrations.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        engine.dispose()
+        model_indexes = {
+            index.name
+            for table in Base.metadata.tables.values()
+            for index in table.indexes
+        }
+        assert _indexes(path) == model_indexes
+
+        config = _config(path)
+        command.stamp(config, "head")
+        command.downgrade(config, "base")
+        dropped = model_indexes - _indexes(path)
+        assert "ix_wis_sme_module_id" in dropped
+        assert "uq_wis_user_email_lower" in dropped
+
+        command.upgrade(config, "head")
+        assert _indexes(path) == model_indexes
+
+    def test_lookup_indexes_exist(self, tmp_path: Path):
+        # the databases created from the models before the migrations have
+        # the indexes already
+        path = tmp_path / "created.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(
+            engine,
+            tables=[
+                table
+                for name, table in Base.metadata.tables.items()
+                if name not in MIGRATED_TABLES
+            ],
+        )
+        engine.dispose()
+        model_indexes = {
+            index.name
+            for table in Base.metadata.tables.values()
+            for index in table.indexes
+        }
+
+        command.upgrade(_config(path), "head")
+        assert _indexes(path) == model_indexes
+
+    def test_create_all_stamps(self, tmp_path: Path):
+        path = tmp_path / "stamped.db"
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.begin() as connection:
+            _create_tables(connection)
+        with engine.connect() as connection:
+            revision = connection.execute(
+                text("SELECT version_num FROM alembic_version")
+            ).scalar()
+        head = ScriptDirectory(str(SCRIPT_LOCATION)).get_current_head()
+        assert revision == head
+        command.upgrade(_config(path), "head")
+
+        # the existing databases are left to the migrations
+        with engine.begin() as connection:
+            connection.execute(text("DELETE FROM alembic_version"))
+            _create_tables(connection)
+            stamps = connection.execute(
+                text("SELECT count(*) FROM alembic_version")
+            ).scalar()
+        engine.dispose()
+        assert stamps == 0
+
+    def test_lowercase_keys_duplicates(self, tmp_path: Path):
+        path = tmp_path / "duplicates.db"
+        config = _config(path)
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        engine.dispose()
+        command.stamp(config, "head")
+        command.downgrade(config, "5f3c1a9e2b7d")
+
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.begin() as connection:
+            connection.execute(
+                User.__table__.insert(),
+                [
+                    {"name": "jane", "email": "Jane@example.com"},
+                    {"name": "jane2", "email": "jane@example.com"},
+                ],
+            )
+        engine.dispose()
+
+        with pytest.raises(ValueError, match="jane@example.com"):
+            command.upgrade(config, "head")
+        assert "uq_wis_user_email_lower" not in _indexes(path)
+
+    def test_notification_fan_out_progress(self, tmp_path: Path):
+        path = tmp_path / "notifications.db"
+        config = _config(path)
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        engine.dispose()
+        command.stamp(config, "head")
+        command.downgrade(config, "e6a1f03d9b54")
+
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO wis_notification"
+                    " (subject, body, recipients, created_on)"
+                    " VALUES ('News', 'Hello', 3, '2024-01-01')"
+                )
+            )
+        engine.dispose()
+        command.upgrade(config, "head")
+
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.connect() as connection:
+            row = connection.execute(
+                text("SELECT status, last_user_id FROM wis_notification")
+            ).one()
+        engine.dispose()
+        # fanned out in their request before the upgrade
+        assert tuple(row) == ("done", 0)
+
+    def test_postgres_concurrently(self):
+        buffer = io.StringIO()
+        config = Config(output_buffer=buffer)
+        config.set_main_option("script_location", str(SCRIPT_LOCATION))
+        config.set_main_option(
+            "sqlalchemy.url", "postgresql+asyncpg://user@localhost/db"
+        )
+        command.upgrade(config, "head", sql=True)
+        sql = buffer.getvalue()
+        assert "COMMIT" in sql
+        assert (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_wis_user_email_lower"
+            " ON wis_user (lower(email))" in sql
+        )
+        assert "ON wis_user (notifications, id) WHERE deleted IS false" in sql
@@ -0,0 +1,94 @@
+""" Test module APIs """
+
+import asyncio
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import SME
+from app.routers.coalescing import _flights, coalescing_metrics
+
+
+class TestModule:
+    """
+    Unit tests for module APIs
+    """
+
+    @pytest.mark.asyncio
+    async def test_list_sme_coalesces_concurrent_reads(
+        self, client: AsyncClient, session: AsyncSession
+    ):
+        """
+        Concurrent identical reads share one execution and its response
+        """
+        # arrange
+        session.add(
+            SME(
+                module_id=1,
+                heading="CONSUMER VALUE",
+                question="Has your market share grown?",
+                value="BY > 5%,FLAT SHARE",
+            )
+        )
+        await session.commit()
+        before = coalescing_metrics()["list_sme"]
+
+        # act
+        responses = await asyncio.gather(
+            *[client.get("/module/sme?module_id=1") for _ in range(5)]
+        )
+
+        # assert
+        after = coalescing_metrics()["list_sme"]
+        assert all(r.status_code == status.HTTP_200_OK for r in responses)
+        assert len({r.text for r in responses}) == 1
+        assert responses[0].json()[0]["question"] == (
+            "Has your market share grown?"
+        )
+        assert after["calls"] - before["calls"] == 5
+        assert after["coalesced"] > before["coalesced"]
+
+    @pytest.mark.asyncio
+    async def test_list_sme_read_after_save(
+        self, client: AsyncClient, session: AsyncSession
+    ):
+        """
+        A read issued after a save does not join a read started before it
+        """
+        # arrange
+        sme = SME(
+            module_id=1,
+            heading="CONSUMER VALUE",
+            question="Has your market share grown?",
+            value="BY > 5%,FLAT SHARE",
+        )
+        session.add(sme)
+        await session.commit()
+        release = asyncio.Event()
+
+        async def stale_read():
+            await release.wait()
+            return b"[]"
+
+        # a read of the module started before the save, still running
+        stale = asyncio.create_task(_flights["list_sme"].do(1, stale_read))
+        await asyncio.sleep(0)
+
+        # act
+        save = await client.post(
+            "/module/save_sme_value",
+            json=[{"sme_id": sme.id, "value": 2}],
+        )
+        response = await asyncio.wait_for(
+            client.get("/module/sme?module_id=1"), timeout=5
+        )
+        release.set()
+
+        # assert
+        assert save.status_code == status.HTTP_200_OK
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()[0]["selected_value"] == "2"
+        assert await stale == (b"[]", True)
+        assert _flights["list_sme"].in_flight == 0
@@ -0,0 +1,150 @@
+""" Test the rate limiting middleware """
+
+import pytest
+from httpx import AsyncClient
+from jose import jwt
+from redis.exceptions import ConnectionError as RedisConnectionError
+from starlette.responses import PlainTextResponse
+
+from app.cache import InMemoryRedis
+from app.middleware import (
+    LocalBuckets,
+    RateLimiter,
+    RateLimitMiddleware,
+    RedisBuckets,
+)
+from app.middleware.ratelimit import refill
+from app.settings import HASH_ALGORITHM, SECRET_KEY, RateLimitRule
+
+
+async def hello(scope, receive, send):
+    await PlainTextResponse("hello")(scope, receive, send)
+
+
+def _bearer(subject: str, key: str = SECRET_KEY) -> dict[str, str]:
+    token = jwt.encode({"sub": subject}, key, algorithm=HASH_ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
+
+
+class FailingRedis:
+    """
+    Redis client whose scripts fail
+    """
+
+    def register_script(self, script):
+        async def run(keys=(), args=(), client=None):
+            raise RedisConnectionError("Connection refused")
+
+        return run
+
+
+class TestRateLimit:
+    """
+    Unit tests for the token buckets and the middleware
+    """
+
+    def test_refill(self):
+        """
+        Buckets refill at their rate up to their burst
+        """
+        assert refill(0, 0, 1, rate=2, burst=5) == (True, 1, 0)
+        assert refill(0, 0, 0.25, rate=2, burst=5) == (False, 0.5, 0.25)
+        assert refill(4, 0, 100, rate=2, burst=5) == (True, 4, 0)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "backend",
+        [LocalBuckets(), RedisBuckets(InMemoryRedis())],
+        ids=["local", "redis"],
+    )
+    async def test_buckets(self, backend):
+        """
+        The requests past the burst wait for the refill
+        """
+        results = [await backend.take("ip:1", rate=0.5, burst=2)]
+        results.append(await backend.take("ip:1", rate=0.5, burst=2))
+        allowed, retry_after = await backend.take("ip:1", rate=0.5, burst=2)
+
+        assert results == [(True, 0.0), (True, 0.0)]
+        assert not allowed
+        assert 1.9 < retry_after <= 2
+        assert await backend.take("ip:2", rate=0.5, burst=2) == (True, 0.0)
+
+    @pytest.mark.asyncio
+    async def test_local_buckets_bound(self):
+        """
+        The least recently used buckets are dropped
+        """
+        backend = LocalBuckets(max_buckets=2)
+        for key in ("a", "b", "a", "c"):
+            await backend.take(key, rate=0.001, burst=1)
+
+        # b was dropped, so full again
+        assert (await backend.take("b", rate=0.001, burst=1))[0]
+        assert not (await backend.take("c", rate=0.001, burst=1))[0]
+
+    @pytest.mark.asyncio
+    async def test_redis_failure(self):
+        """
+        The requests are let through when Redis fails
+        """
+        backend = RedisBuckets(FailingRedis())
+
+        assert await backend.take("ip:1", rate=1, burst=1) == (True, 0.0)
+        assert backend.errors == 1
+
+    @pytest.mark.asyncio
+    async def test_middleware(self):
+        """
+        The requests over their limits get a 429 with Retry-After
+        """
+        limiter = RateLimiter(
+            [
+                RateLimitRule(method="POST", path="/token", rate=0.1, burst=2),
+                RateLimitRule(
+                    method="POST",
+                    path="/module/save_*",
+                    scope="user",
+                    rate=0.1,
+                    burst=2,
+                ),
+            ]
+        )
+        app = RateLimitMiddleware(hello, limiter)
+
+        async with AsyncClient(app=app, base_url="http://tests") as client:
+            tokens = [(await client.post("/token")) for _ in range(3)]
+            other_method = await client.get("/token")
+            saves = [
+                await client.post("/module/save_sme_value", headers=headers)
+                for headers in (
+                    _bearer("alice"),
+                    _bearer("alice"),
+                    _bearer("alice"),
+                    _bearer("bob"),
+                    # forged and anonymous requests share the IP bucket
+                    _bearer("mallory", key="forged"),
+                    _bearer("eve", key="forged"),
+                    {},
+                )
+            ]
+
+        assert [r.status_code for r in tokens] == [200, 200, 429]
+        assert tokens[2].headers["Retry-After"] == "10"
+        assert tokens[2].json() == {
+            "detail": {"global": "Too many requests, try again later."}
+        }
+        assert other_method.status_code == 200
+        assert [r.status_code for r in saves] == [
+            200,
+            200,
+            429,
+            200,
+            200,
+            200,
+            429,
+        ]
+        assert limiter.metrics()["rules"] == {
+            "POST /token ip": {"allowed": 2, "rejected": 1},
+            "POST /module/save_* user": {"allowed": 5, "rejected": 2},
+        }
@@ -0,0 +1,103 @@
+""" Test the traffic recorder and its replay """
+
+import orjson
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import settings
+from app.db.models import User
+from app.main import app
+from app.middleware import (
+    TrafficRecorderMiddleware,
+    start_recorder,
+    stop_recorder,
+)
+from app.utils import encrypt_password
+from benchmarks.replay import Replay, build_request, read_traces
+
+
+@pytest.fixture(name="trace_path")
+def trace_path_fixture(tmp_path):
+    """
+    Records the requests to a temporary trace file
+    """
+    path = tmp_path / "traffic.ndjson"
+    start_recorder(settings.TrafficRecorderSettings(path=path))
+    yield path
+    stop_recorder()
+
+
+class TestTrafficRecorder:
+    """
+    Unit tests for the traffic recorder
+    """
+
+    @pytest.mark.asyncio
+    async def test_record_and_replay(
+        self, session: AsyncSession, trace_path, tmp_path
+    ):
+        """
+        Requests are recorded sanitized, and replayed with the secrets
+        """
+        # arrange
+        session.add(User(name="recorded", password=encrypt_password("pw")))
+        await session.commit()
+        recorder = TrafficRecorderMiddleware(app)
+
+        # act
+        async with AsyncClient(app=recorder, base_url="http://tests") as cl:
+            login = await cl.post(
+                "/token", data={"username": "recorded", "password": "pw"}
+            )
+            await cl.get(
+                "/users/current_user",
+                params={"page": "1", "api_key": "k3y"},
+                headers={
+                    "Authorization": f"Bearer {login.json()['access_token']}"
+                },
+            )
+        stop_recorder()
+
+        # assert
+        raw = trace_path.read_bytes()
+        assert b"pw" not in raw and b"k3y" not in raw
+        login_trace, user_trace = read_traces([tmp_path])
+        assert login_trace["route"] == "/token"
+        assert login_trace["status"] == 200
+        assert login_trace["body"] == {
+            "username": "recorded",
+            "password": "***",
+        }
+        assert login_trace["shape"] == {"username": "str", "password": "str"}
+        assert user_trace["route"] == "/users/current_user"
+        assert user_trace["auth"] == "bearer"
+        assert user_trace["query"] == {"page": "1", "api_key": "***"}
+        assert user_trace["duration_ms"] > 0
+
+        assert build_request(login_trace, secrets={"password": "pw"}) == {
+            "method": "POST",
+            "url": "/token",
+            "params": {},
+            "headers": {},
+            "data": {"username": "recorded", "password": "pw"},
+        }
+        async with AsyncClient(app=app, base_url="http://tests") as client:
+            replayed = await Replay(
+                client, speed=0, secrets={"password": "pw"}
+            ).run([login_trace])
+        assert replayed["POST /token"].requests == 1
+        assert replayed["POST /token"].errors == 0
+
+    def test_shape_only(self):
+        """
+        Bodies recorded by shape are replayed with placeholders
+        """
+        trace = orjson.loads(
+            b'{"ts": 1, "method": "POST", "path": "/module/save_sme_value",'
+            b' "route": "/module/save_sme_value", "query": {}, "auth": null,'
+            b' "content_type": "application/json", "body": null,'
+            b' "shape": {"length": 2, "item": {"sme_id": "int"}}}'
+        )
+
+        assert build_request(trace)["json"] == [{"sme_id": 0}, {"sme_id": 0}]
@@ -0,0 +1,114 @@
+""" Test seed loader """
+
+import shutil
+
+import orjson
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.db.models import SME, Module, User
+from app.db.seed import FIXTURES_DIR, load_fixtures
+
+
+class TestSeed:
+    """
+    Unit tests for the seed loader
+    """
+
+    @pytest.mark.asyncio
+    async def test_load_fixtures(self, session: AsyncSession):
+        """
+        Fixtures are loaded with their foreign keys resolved
+        """
+        results = await load_fixtures(session)
+        await session.commit()
+
+        assert all(result.inserted for result in results)
+        admin = await session.scalar(
+            select(User)
+            .where(User.name == "testadmin")
+            .options(selectinload(User.groups))
+        )
+        assert [g.name for g in admin.groups] == ["admin"]
+        module = await session.scalar(
+            select(Module).where(Module.module_name == "sme")
+        )
+        assert module.user_id == admin.id
+        assert (
+            await session.scalar(
+                select(func.count()).where(SME.module_id == module.id)
+            )
+            == 6
+        )
+
+    @pytest.mark.asyncio
+    async def test_reload_applies_differences(
+        self, session: AsyncSession, tmp_path
+    ):
+        """
+        Loading the fixtures again only updates the changed rows
+        """
+        fixtures = tmp_path / "fixtures"
+        shutil.copytree(FIXTURES_DIR, fixtures)
+        await load_fixtures(session, fixtures)
+        await session.commit()
+
+        results = await load_fixtures(session, fixtures)
+        assert not any(r.inserted or r.updated for r in results)
+
+        path = fixtures / "05_sme.json"
+        fixture = orjson.loads(path.read_bytes())
+        fixture["rows"][0]["heading"] = "CHANGED"
+        fixture["rows"].append(
+            {
+                "module_id": "sme",
+                "heading": "NEW",
+                "question": "New question?",
+                "value": "YES,NO",
+            }
+        )
+        path.write_bytes(orjson.dumps(fixture))
+
+        results = await load_fixtures(session, fixtures)
+        await session.commit()
+
+        sme = next(r for r in results if r.table == "wis_sme")
+        assert (sme.inserted, sme.updated, sme.unchanged) == (1, 1, 5)
+        assert (
+            await session.scalar(
+                select(SME.heading).where(
+                    SME.question == fixture["rows"][0]["question"]
+                )
+            )
+            == "CHANGED"
+        )
+
+    @pytest.mark.asyncio
+    async def test_reload_ignores_user_modules(self, session: AsyncSession):
+        """
+        Loading the fixtures again leaves the modules of the users alone,
+        even when they have the name of a seed module
+        """
+        await load_fixtures(session)
+        await session.commit()
+        user = User(name="moduleowner", password="")
+        session.add(user)
+        await session.flush()
+        user_module = Module(user_id=user.id, module_name="sme")
+        session.add(user_module)
+        await session.commit()
+
+        results = await load_fixtures(session)
+        await session.commit()
+
+        assert not any(r.inserted or r.updated for r in results)
+        await session.refresh(user_module)
+        assert user_module.user_id == user.id
+        assert (
+            await session.scalar(
+                select(func.count()).where(SME.module_id == user_module.id)
+            )
+            == 0
+        )
@@ -0,0 +1,135 @@
+""" Test bulk user import """
+
+import asyncio
+
+import pytest
+from openpyxl import Workbook
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.db.models import AuthRole, Group, PasswordHistory, User
+from app.user_import import HashPool, import_users
+from app.utils import check_password
+
+PASSWORD = "Imported-pass1"
+
+
+class TestUserImport:
+    """
+    Unit tests for the bulk user import
+    """
+
+    @pytest.mark.asyncio
+    async def test_import_csv(self, session: AsyncSession, tmp_path):
+        """
+        Valid rows are loaded with their group, invalid ones reported
+        """
+        # arrange
+        session.add(Group(name=AuthRole.DATA_EXPLORER))
+        session.add(User(name="taken", email="taken@mail.com"))
+        await session.commit()
+        path = tmp_path / "users.csv"
+        path.write_text(
+            "name,email,password,first_name\n"
+            f"alice,alice@mail.com,{PASSWORD},Alice\n"
+            f"bob,bob@mail.com,{PASSWORD},\n"
+            f"carol,not-an-email,{PASSWORD},\n"
+            "dave,dave@mail.com,short,\n"
+            f"taken,other@mail.com,{PASSWORD},\n"
+            f"erin,alice@mail.com,{PASSWORD},\n"
+            f"frank@mail.com,frank@mail.com,{PASSWORD},\n"
+        )
+
+        pool = HashPool(workers=2)
+        pool.start()
+
+        # act
+        try:
+            report = await import_users(session, path, chunk_size=2, pool=pool)
+        finally:
+            pool.shutdown()
+
+        # assert
+        assert report.imported == 3
+        assert [(i.row, i.field) for i in report.issues] == [
+            (4, "email"),
+            (5, "password"),
+            (6, "name"),
+            (7, "email"),
+        ]
+        users = (
+            await session.scalars(
+                select(User)
+                .where(User.name.in_(["alice", "bob", "frank"]))
+                .order_by(User.name)
+                .options(selectinload(User.groups))
+            )
+        ).all()
+        assert [u.name for u in users] == ["alice", "bob", "frank"]
+        assert users[0].first_name == "Alice"
+        assert users[1].first_name is None
+        assert check_password(PASSWORD, users[0].password)
+        assert all(
+            [g.name for g in u.groups] == [AuthRole.DATA_EXPLORER]
+            for u in users
+        )
+        history = await session.scalars(
+            select(PasswordHistory.user_id).where(
+                PasswordHistory.user_id.in_([u.id for u in users])
+            )
+        )
+        assert len(history.all()) == 3
+
+    @pytest.mark.asyncio
+    async def test_import_xlsx(self, session: AsyncSession, tmp_path):
+        """
+        XLSX files are read like CSV files
+        """
+        # arrange
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["Name", "Email", "Password"])
+        sheet.append(["xlsxuser", "xlsx@mail.com", PASSWORD])
+        sheet.append(["xlsxuser", "xlsx2@mail.com", PASSWORD])
+        path = tmp_path / "users.xlsx"
+        workbook.save(path)
+
+        # act
+        report = await import_users(
+            session, path, group=None, pool=HashPool(workers=0)
+        )
+
+        # assert
+        assert report.imported == 1
+        assert [(i.row, i.message) for i in report.issues] == [
+            (3, "Duplicated name in the file.")
+        ]
+        user = await session.scalar(
+            select(User).where(User.name == "xlsxuser")
+        )
+        assert user.email == "xlsx@mail.com"
+
+    @pytest.mark.asyncio
+    async def test_imports_bounded(self, session: AsyncSession, tmp_path):
+        """
+        An import past the bound of the pool waits for a running one
+        """
+        # arrange
+        path = tmp_path / "users.csv"
+        path.write_text(f"name,email,password\nq,q@mail.com,{PASSWORD}\n")
+        pool = HashPool(workers=0, max_imports=1)
+        await pool.imports.acquire()
+
+        # act
+        waiting = asyncio.create_task(
+            import_users(session, path, group=None, pool=pool)
+        )
+        await asyncio.sleep(0.05)
+        started = waiting.done()
+        pool.imports.release()
+        report = await asyncio.wait_for(waiting, 5)
+
+        # assert
+        assert not started
+        assert report.imported == 1